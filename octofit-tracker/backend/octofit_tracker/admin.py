@@ -1,7 +1,24 @@
 from django.contrib import admin
+from django.db.models import Q
+from . import export, search
 from .models import User, Team, Activity, Leaderboard, Workout
 
 
+class IndexedSearchMixin:
+    """Answer the admin search box from the full-text index instead of icontains scans"""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        matches = search.search(self.search_kind, search_term, limit=search.MAX_CANDIDATES)
+        return queryset.filter(self.search_filter(search_term, [object_id for object_id, _ in matches])), False
+
+    def search_filter(self, search_term, object_ids):
+        """Return the filter selecting the matched documents"""
+        return Q(_id__in=object_ids)
+
+
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     """Admin interface for User model"""
@@ -31,10 +48,13 @@ class UserAdmin(admin.ModelAdmin):
 @admin.register(Team)
 class TeamAdmin(admin.ModelAdmin):
     """Admin interface for Team model"""
-    list_display = ['name', 'captain_id', 'total_points', 'created_at']
+    list_display = ['name', 'captain_id', 'member_count', 'total_points', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name', 'description']
-    readonly_fields = ['_id', 'created_at']
+    readonly_fields = [
+        '_id', 'created_at',
+        'total_points', 'total_activities', 'total_duration', 'total_calories', 'member_count'
+    ]
     
     fieldsets = (
         ('Team Information', {
@@ -44,7 +64,7 @@ class TeamAdmin(admin.ModelAdmin):
             'fields': ('member_ids',)
         }),
         ('Statistics', {
-            'fields': ('total_points',)
+            'fields': ('member_count', 'total_points', 'total_activities', 'total_duration', 'total_calories')
         }),
         ('Timestamps', {
             'fields': ('created_at',),
@@ -54,11 +74,13 @@ class TeamAdmin(admin.ModelAdmin):
 
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(IndexedSearchMixin, admin.ModelAdmin):
     """Admin interface for Activity model"""
     list_display = ['activity_type', 'user_id', 'duration', 'distance', 'calories', 'points', 'date']
     list_filter = ['activity_type', 'date', 'created_at']
     search_fields = ['user_id', 'activity_type', 'notes']
+    search_kind = search.ACTIVITY
+    actions = ['export_csv', 'export_ndjson']
     readonly_fields = ['_id', 'created_at']
     date_hierarchy = 'date'
     
@@ -79,6 +101,31 @@ class ActivityAdmin(admin.ModelAdmin):
         }),
     )
 
+    def search_filter(self, search_term, object_ids):
+        """Also match a user's activities by their exact user_id"""
+        return super().search_filter(search_term, object_ids) | Q(user_id=search_term.strip())
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        search.index_objects(search.ACTIVITY, [obj])
+
+    def delete_model(self, request, obj):
+        search.unindex(search.ACTIVITY, [obj._id])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        search.unindex(search.ACTIVITY, queryset.values_list('_id', flat=True))
+        super().delete_queryset(request, queryset)
+
+    @admin.action(description='Export selected activities as CSV')
+    def export_csv(self, request, queryset):
+        """Stream the selection; "select all" with the list filters exports a date range"""
+        return export.export_response(queryset, export.CSV, 'activities')
+
+    @admin.action(description='Export selected activities as NDJSON')
+    def export_ndjson(self, request, queryset):
+        return export.export_response(queryset, export.NDJSON, 'activities')
+
 
 @admin.register(Leaderboard)
 class LeaderboardAdmin(admin.ModelAdmin):
@@ -104,11 +151,12 @@ class LeaderboardAdmin(admin.ModelAdmin):
 
 
 @admin.register(Workout)
-class WorkoutAdmin(admin.ModelAdmin):
+class WorkoutAdmin(IndexedSearchMixin, admin.ModelAdmin):
     """Admin interface for Workout model"""
     list_display = ['name', 'fitness_level', 'activity_type', 'duration', 'calories_estimate', 'created_at']
     list_filter = ['fitness_level', 'activity_type', 'created_at']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'description', 'instructions']
+    search_kind = search.WORKOUT
     readonly_fields = ['_id', 'created_at']
     
     fieldsets = (
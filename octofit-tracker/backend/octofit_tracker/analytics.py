@@ -0,0 +1,307 @@
+"""
+Columnar snapshot of the activities for ad-hoc analytics.
+
+``write_snapshot()`` copies every Activity into typed column files in a new
+directory under ``OCTOFIT_ANALYTICS_DIR``:
+
+* the measures: ``duration``, ``calories`` and ``points`` as int32 and
+  ``distance`` as float64, NaN when missing;
+* ``date`` as int64 seconds since the epoch;
+* ``activity_type`` and, from the activity's user, ``fitness_level`` and
+  ``cohort`` (the month the user joined) as small integer codes into the
+  dictionaries kept in ``manifest.json``.
+
+Activities are read from a replica when one is configured and written out a
+batch at a time. The ``CURRENT`` file then switches readers to the new
+snapshot at once; the previous one is kept for readers still using it.
+
+Readers memory-map the column files, so a snapshot takes no heap memory and
+is shared by every worker through the page cache. ``Snapshot.summarize()``
+answers group-by and percentile queries over the columns, vectorized with
+NumPy. Without NumPy (it is in requirements.txt) the same results come from
+a much slower scan in plain Python over the mapped buffers.
+"""
+import array
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Activity, User
+from .replicas import replica_reads
+from .stats import date_range
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - slow plain-Python scan of the mapped columns
+    numpy = None
+
+# Column name -> array typecode (also a NumPy dtype character)
+COLUMNS = {
+    'date': 'q',
+    'duration': 'i',
+    'calories': 'i',
+    'points': 'i',
+    'distance': 'd',
+    'activity_type': 'H',
+    'fitness_level': 'B',
+    'cohort': 'H'
+}
+METRICS = ('duration', 'calories', 'points', 'distance')
+GROUPS = ('activity_type', 'fitness_level', 'cohort')
+MAX_PERCENTILES = 10
+BATCH_SIZE = 10000
+# Snapshot directories kept, the current one included
+KEEP_SNAPSHOTS = 2
+# Seconds a replica may trail the primary and still feed a snapshot
+MAX_STALENESS = 3600
+POINTER = 'CURRENT'
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def analytics_dir():
+    """Return the directory holding the snapshots"""
+    return Path(getattr(settings, 'OCTOFIT_ANALYTICS_DIR', settings.BASE_DIR / 'analytics'))
+
+
+def write_snapshot(directory=None, batch_size=BATCH_SIZE):
+    """
+    Snapshot every activity into a new set of column files and make it
+    current. Returns the manifest of the new snapshot.
+    """
+    root = Path(directory) if directory is not None else analytics_dir()
+    name = timezone.now().strftime('snapshot-%Y%m%dT%H%M%S%f')
+    target = root / name
+    target.mkdir(parents=True)
+
+    dictionaries = {group: {} for group in GROUPS}
+    rows = 0
+    with replica_reads(MAX_STALENESS):
+        users = {
+            user_id: (
+                _encode(dictionaries['fitness_level'], fitness_level or ''),
+                _encode(dictionaries['cohort'], timezone.localtime(created_at).strftime('%Y-%m') if created_at else '')
+            )
+            for user_id, fitness_level, created_at in (
+                User.objects.values_list('_id', 'fitness_level', 'created_at').iterator(chunk_size=batch_size)
+            )
+        }
+        activities = Activity.objects.values_list(
+            'user_id', 'activity_type', 'date', 'duration', 'calories', 'points', 'distance'
+        ).iterator(chunk_size=batch_size)
+
+        files = {column: open(target / f'{column}.col', 'wb') for column in COLUMNS}
+        try:
+            batch = {column: array.array(typecode) for column, typecode in COLUMNS.items()}
+            for user_id, activity_type, date, duration, calories, points, distance in activities:
+                user = users.get(user_id)
+                if user is None:
+                    # The user was deleted; their activities go to the '' groups
+                    user = users[user_id] = (
+                        _encode(dictionaries['fitness_level'], ''), _encode(dictionaries['cohort'], '')
+                    )
+                fitness_level, cohort = user
+                batch['date'].append(int(date.timestamp()))
+                batch['duration'].append(duration)
+                batch['calories'].append(calories)
+                batch['points'].append(points)
+                batch['distance'].append(math.nan if distance is None else distance)
+                batch['activity_type'].append(_encode(dictionaries['activity_type'], activity_type))
+                batch['fitness_level'].append(fitness_level)
+                batch['cohort'].append(cohort)
+                rows += 1
+                if rows % batch_size == 0:
+                    _flush(batch, files)
+            _flush(batch, files)
+        finally:
+            for file in files.values():
+                file.close()
+
+    manifest = {
+        'rows': rows,
+        'created_at': timezone.now().isoformat(),
+        'byteorder': sys.byteorder,
+        'columns': COLUMNS,
+        'dictionaries': {group: list(codes) for group, codes in dictionaries.items()}
+    }
+    (target / 'manifest.json').write_text(json.dumps(manifest))
+
+    pointer = root / f'{POINTER}.tmp'
+    pointer.write_text(name)
+    os.replace(pointer, root / POINTER)
+    # Unlinked files stay readable by the processes that mapped them
+    for old in sorted(path for path in root.glob('snapshot-*') if path.is_dir())[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def current_snapshot():
+    """Return the current snapshot, mapped once per process, or None before the first one"""
+    global _current
+    root = analytics_dir()
+    try:
+        name = (root / POINTER).read_text().strip()
+    except FileNotFoundError:
+        return None
+    with _current_lock:
+        if _current is None or _current[0] != (root, name):
+            _current = ((root, name), Snapshot(root / name))
+        return _current[1]
+
+
+class Snapshot:
+    """The memory-mapped columns of one snapshot"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        manifest = json.loads((self.path / 'manifest.json').read_text())
+        if manifest['byteorder'] != sys.byteorder:
+            raise ValueError(f'{self.path} was written on a {manifest["byteorder"]}-endian machine')
+        self.rows = manifest['rows']
+        self.created_at = manifest['created_at']
+        self.dictionaries = manifest['dictionaries']
+        self.columns = {column: self._map(column, typecode) for column, typecode in manifest['columns'].items()}
+
+    def _map(self, column, typecode):
+        if not self.rows:
+            return numpy.empty(0, typecode) if numpy is not None else memoryview(array.array(typecode))
+        with open(self.path / f'{column}.col', 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if numpy is not None:
+            return numpy.frombuffer(mapped, dtype=typecode)
+        return memoryview(mapped).cast(typecode)
+
+    def summarize(self, by, metric, percentiles=(), start=None, end=None, where=None):
+        """
+        Return the count, sum, mean, extremes and ``percentiles`` of
+        ``metric`` for each value of the ``by`` group, in label order.
+
+        ``start`` and ``end`` bound the dates in epoch seconds (``end``
+        excluded); ``where`` maps group columns to the label they must have.
+        """
+        filters = {}
+        for column, label in (where or {}).items():
+            if label not in self.dictionaries[column]:
+                return []
+            filters[column] = self.dictionaries[column].index(label)
+
+        summarize = self._groups_numpy if numpy is not None else self._groups_python
+        groups = summarize(by, metric, start, end, filters)
+        labels = self.dictionaries[by]
+        integral = COLUMNS[metric] != 'd'
+        results = [
+            {by: labels[code], **_describe(values, percentiles, integral)}
+            for code, values in groups.items()
+        ]
+        return sorted(results, key=lambda result: result[by])
+
+    def _groups_python(self, by, metric, start, end, filters):
+        """Sorted metric values per group code, scanning the mapped buffers"""
+        keys, values, dates = self.columns[by], self.columns[metric], self.columns['date']
+        wanted = list(filters.values())
+        filter_columns = [self.columns[column] for column in filters]
+        low = -math.inf if start is None else start
+        high = math.inf if end is None else end
+        groups = {}
+        for key, value, when, *others in zip(keys, values, dates, *filter_columns):
+            if low <= when < high and value == value and others == wanted:
+                groups.setdefault(key, []).append(value)
+        for values in groups.values():
+            values.sort()
+        return groups
+
+    def _groups_numpy(self, by, metric, start, end, filters):
+        """Sorted metric values per group code, as slices of one sorted array"""
+        keys, values, dates = self.columns[by], self.columns[metric], self.columns['date']
+        mask = ~numpy.isnan(values) if values.dtype.kind == 'f' else numpy.ones(self.rows, dtype=bool)
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates < end
+        for column, code in filters.items():
+            mask &= self.columns[column] == code
+        keys, values = keys[mask], values[mask]
+        order = numpy.lexsort((values, keys))
+        keys, values = keys[order], values[order]
+        codes, starts = numpy.unique(keys, return_index=True)
+        ends = [*starts[1:], len(keys)]
+        return {int(code): values[low:high] for code, low, high in zip(codes, starts, ends)}
+
+
+def parse_summary(query_params):
+    """
+    Read a summary query: ``?by=`` (default activity_type), ``?metric=``
+    (default calories), ``?percentiles=`` (comma-separated, default 50,90,99),
+    ``?from=&to=`` and a filter per group column, e.g. ``?fitness_level=``.
+    Returns the keyword arguments of ``Snapshot.summarize()``.
+    """
+    by = query_params.get('by', 'activity_type')
+    if by not in GROUPS:
+        raise serializers.ValidationError({'by': f"Expected one of: {', '.join(GROUPS)}."})
+    metric = query_params.get('metric', 'calories')
+    if metric not in METRICS:
+        raise serializers.ValidationError({'metric': f"Expected one of: {', '.join(METRICS)}."})
+
+    try:
+        percentiles = [float(value) for value in query_params.get('percentiles', '50,90,99').split(',') if value]
+    except ValueError:
+        percentiles = None
+    if percentiles is None or len(percentiles) > MAX_PERCENTILES or not all(0 <= p <= 100 for p in percentiles):
+        raise serializers.ValidationError(
+            {'percentiles': f'Expected up to {MAX_PERCENTILES} comma-separated numbers from 0 to 100.'}
+        )
+
+    start, end = date_range(query_params)
+    return {
+        'by': by,
+        'metric': metric,
+        'percentiles': percentiles,
+        'start': None if start is None else int(start.timestamp()),
+        'end': None if end is None else math.ceil(end.timestamp()),
+        'where': {column: query_params[column] for column in GROUPS if column in query_params}
+    }
+
+
+def percentile(ordered, fraction):
+    """Linearly interpolated percentile of sorted values, NumPy's default method"""
+    position = (len(ordered) - 1) * fraction
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return float(ordered[low]) + (float(ordered[high]) - float(ordered[low])) * (position - low)
+
+
+def _describe(values, percentiles, integral):
+    count = len(values)
+    total = values.sum() if numpy is not None else sum(values)
+    total = int(total) if integral else float(total)
+    return {
+        'count': count,
+        'sum': total if integral else round(total, 3),
+        'mean': round(total / count, 3),
+        'min': int(values[0]) if integral else float(values[0]),
+        'max': int(values[-1]) if integral else float(values[-1]),
+        'percentiles': {f'p{p:g}': round(percentile(values, p / 100), 3) for p in percentiles}
+    }
+
+
+def _encode(codes, label):
+    code = codes.get(label)
+    if code is None:
+        code = codes[label] = len(codes)
+    return code
+
+
+def _flush(batch, files):
+    for column, values in batch.items():
+        values.tofile(files[column])
+        del values[:]
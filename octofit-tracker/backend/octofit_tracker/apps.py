@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class OctofitTrackerConfig(AppConfig):
+    """App configuration for OctoFit Tracker"""
+    name = 'octofit_tracker'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import install
+        install()
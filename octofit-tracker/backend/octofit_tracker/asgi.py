@@ -2,6 +2,8 @@
 ASGI config for octofit_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with e.g. ``uvicorn octofit_tracker.asgi:application`` to serve the
+native async endpoints under /api/async/ without a thread per request.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -14,3 +16,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
 application = get_asgi_application()
+
+# Load the leaderboard rank index now rather than on the first rank request
+from octofit_tracker.rank_index import board  # noqa: E402
+
+board.warm()
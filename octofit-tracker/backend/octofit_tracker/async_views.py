@@ -0,0 +1,212 @@
+"""
+Native async versions of the read-heavy endpoints.
+
+The ASGI application serves these under ``/api/async/``. On MongoDB they
+query through motor, so one worker keeps hundreds of slow requests in flight
+on its event loop instead of tying up a thread per blocking djongo query.
+Responses are byte-for-byte those of the matching viewset actions, headers
+included. The database each query reads from is picked by the replica
+router, which never waits on the server (see ``replicas.replica_lag()``).
+
+On other backends (e.g. in tests) each view hands the request to its
+synchronous viewset action in a worker thread.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotFound
+from rest_framework.request import Request
+
+from . import leaderboard_windows, team_rollups
+from .cache import content_etag, not_modified
+from .fast_serializers import FastJSONRenderer, fast_serializer
+from .models import Activity, Leaderboard, Team, User
+from .mongo import get_async_collection
+from .pagination import ActivityCursorPagination
+from .replicas import max_staleness
+from .serializers import ActivitySerializer, LeaderboardSerializer
+from .stats import date_range, fold_groups
+from .views import ActivityViewSet, LeaderboardViewSet, TeamViewSet, UserViewSet
+
+
+def sync_action(viewset, action):
+    """Return a viewset's read-only action as a coroutine run in a worker thread"""
+    return sync_to_async(viewset.as_view({'get': action}))
+
+
+def async_action(viewset, action, model):
+    """
+    Declare the async version of a read-only viewset action.
+
+    The decorated view runs when ``model`` lives on MongoDB; otherwise the
+    viewset action serves the request from a worker thread.
+    """
+    sync_view = sync_action(viewset, action)
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if get_async_collection(model) is None:
+                return await sync_view(request, *args, **kwargs)
+            try:
+                if request.method != 'GET':
+                    raise MethodNotAllowed(request.method)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return _json_response(detail, exc.status_code)
+        return wrapper
+    return decorator
+
+
+_period_top = sync_action(LeaderboardViewSet, 'top')
+
+
+@max_staleness(30)
+@async_action(LeaderboardViewSet, 'top', Leaderboard)
+async def leaderboard_top(request):
+    """
+    Get top 10 users on the leaderboard, with the ETag of the sync action.
+    A period's board (?window=day|week|month&period=) comes from the sync
+    action and its in-process rank index.
+    """
+    if request.GET.get('window', leaderboard_windows.ALL_TIME) != leaderboard_windows.ALL_TIME:
+        return await _period_top(request)
+
+    fast = fast_serializer(LeaderboardSerializer)
+    cursor = (
+        get_async_collection(Leaderboard)
+        .find({}, _projection(fast))
+        .sort('total_points', -1)
+        .limit(10)
+    )
+    data = fast.to_representation([_row(fast, document) async for document in cursor])
+    etag = content_etag(data)
+    if not_modified(request, etag):
+        response = HttpResponse(status=304)
+    else:
+        response = _json_response(data)
+    response['ETag'] = etag
+    return response
+
+
+@max_staleness(60)
+@async_action(UserViewSet, 'stats', User)
+async def user_stats(request, pk):
+    """Get statistics for a specific user"""
+    if await get_async_collection(User).find_one({'_id': pk}, {'_id': 1}) is None:
+        raise NotFound()
+
+    match = {'user_id': pk, **_date_match(request.GET)}
+    stats = await _activity_stats(match, request.GET.get('breakdown') == 'activity_type')
+    return _json_response(stats)
+
+
+@max_staleness(60)
+@async_action(TeamViewSet, 'stats', Team)
+async def team_stats(request, pk):
+    """Get statistics for a specific team"""
+    document = await get_async_collection(Team).find_one({'_id': pk})
+    if document is None:
+        raise NotFound()
+    team = _team(document)
+
+    breakdown = request.GET.get('breakdown') == 'activity_type'
+    if not (breakdown or 'from' in request.GET or 'to' in request.GET):
+        return _json_response(team_rollups.rollup_stats(team))
+
+    match = {'user_id': {'$in': team.member_ids}, **_date_match(request.GET)}
+    return _json_response({
+        'total_members': len(team.member_ids),
+        **await _activity_stats(match, breakdown)
+    })
+
+
+@async_action(ActivityViewSet, 'list', Activity)
+async def activity_list(request):
+    """Get a page of activities, newest first, optionally for one user_id"""
+    request = Request(request)
+    fast = fast_serializer(ActivitySerializer)
+    paginator = ActivityCursorPagination()
+    paginator.request = request
+    paginator.page_size = paginator.get_page_size(request)
+
+    query = {}
+    user_id = request.query_params.get('user_id')
+    if user_id is not None:
+        query['user_id'] = user_id
+    position = paginator.decode_cursor(request)
+    if position is not None:
+        date, pk = position
+        query['$or'] = [{'date': {'$lt': date}}, {'date': date, '_id': {'$lt': pk}}]
+
+    activities = get_async_collection(Activity)
+    cursor = (
+        activities.find(query, _projection(fast))
+        .sort([('date', -1), ('_id', -1)])
+        .limit(paginator.page_size + 1)
+    )
+    rows = [_row(fast, document) async for document in cursor]
+    paginator.has_next = len(rows) > paginator.page_size
+    paginator.page = rows[:paginator.page_size]
+
+    paginator.estimated_count = None
+    if request.query_params.get('count') == 'estimated':
+        if user_id is None:
+            paginator.estimated_count = await activities.estimated_document_count()
+        else:
+            entry = await get_async_collection(Leaderboard).find_one(
+                {'user_id': user_id}, {'total_activities': 1}
+            )
+            paginator.estimated_count = (entry or {}).get('total_activities') or 0
+
+    response = paginator.get_paginated_response(fast.to_representation(paginator.page))
+    return _json_response(response.data)
+
+
+async def _activity_stats(match, breakdown):
+    """Compute activity_stats() with one aggregation over motor"""
+    groups = get_async_collection(Activity).aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': '$activity_type',
+            'total_activities': {'$sum': 1},
+            'total_points': {'$sum': '$points'},
+            'total_duration': {'$sum': '$duration'},
+            'total_calories': {'$sum': '$calories'}
+        }}
+    ])
+    return fold_groups([{**group, 'activity_type': group['_id']} async for group in groups], breakdown)
+
+
+def _date_match(query_params):
+    start, end = date_range(query_params)
+    bounds = {}
+    if start is not None:
+        bounds['$gte'] = start
+    if end is not None:
+        bounds['$lt'] = end
+    return {'date': bounds} if bounds else {}
+
+
+def _team(document):
+    """Build an unsaved Team from a raw document, decoding member_ids"""
+    member_ids = Team._meta.get_field('member_ids').from_db_value(document.get('member_ids'), None, None)
+    return Team(
+        _id=document['_id'],
+        member_ids=member_ids or [],
+        **{field: document.get(field) or 0 for field in (*team_rollups.ROLLUP_FIELDS, 'member_count')}
+    )
+
+
+def _projection(fast):
+    return dict.fromkeys(fast.columns, 1)
+
+
+def _row(fast, document):
+    return {column: document.get(column) for column in fast.columns}
+
+
+def _json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
@@ -0,0 +1,186 @@
+"""
+In-process endpoint benchmarks.
+
+Every router endpoint and custom action is exercised through Django's test
+client against whatever data the database holds (see ``synthetic.populate``).
+Each scenario records latency percentiles, throughput and the database
+commands issued per request, and ``compare()`` checks the results against a
+stored baseline: a p95 slower than the baseline by more than the tolerance,
+or more database round trips than the baseline allowed, is a regression.
+
+Write scenarios create rows, so run the benchmarks against a throwaway
+database. The analytics scenario reads the current analytics snapshot.
+"""
+import itertools
+import json
+import time
+
+from django.test import Client
+from django.urls import reverse
+
+from .analytics import current_snapshot
+from .instrumentation import track_db
+from .models import Activity, Team, User, WindowedLeaderboard, Workout
+
+
+class Scenario:
+    """One endpoint call, repeated; ``body`` yields the JSON payload of each write"""
+
+    def __init__(self, name, method, url, body=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.body = body
+
+
+def build_scenarios(sample_size=20):
+    """Return the benchmark scenarios for the data currently in the database"""
+    user_ids = list(User.objects.values_list('_id', flat=True)[:sample_size])
+    team_id = Team.objects.values_list('_id', flat=True).first()
+    activity_id = Activity.objects.values_list('_id', flat=True).first()
+    workout = Workout.objects.values('_id', 'fitness_level').first()
+    weekly = WindowedLeaderboard.objects.filter(window='week').order_by('-period').values('user_id', 'period').first()
+    if not (user_ids and team_id and activity_id and workout and weekly):
+        raise ValueError('The database has no data to benchmark; populate it first')
+    if current_snapshot() is None:
+        raise ValueError('There is no analytics snapshot to benchmark; run snapshot_analytics first')
+    user_id = user_ids[0]
+    users = itertools.cycle(user_ids)
+    week = f"?window=week&period={weekly['period']}"
+
+    def new_activity():
+        return {
+            'user_id': next(users),
+            'activity_type': 'Running',
+            'duration': 30,
+            'distance': 5.0,
+            'calories': 300,
+            'points': 30,
+            'date': '2024-01-01T08:00:00Z'
+        }
+
+    return [
+        Scenario('users list', 'get', reverse('user-list')),
+        Scenario('users list (stats, rank)', 'get', reverse('user-list') + '?include=stats,rank'),
+        Scenario('users detail', 'get', reverse('user-detail', args=[user_id])),
+        Scenario('users activities', 'get', reverse('user-activities', args=[user_id])),
+        Scenario('users stats', 'get', reverse('user-stats', args=[user_id])),
+        Scenario('users trends', 'get', reverse('user-trends', args=[user_id])),
+        Scenario('users export_activities', 'get', reverse('user-export-activities', args=[user_id])),
+        Scenario('teams list', 'get', reverse('team-list')),
+        Scenario('teams list (stats, rank)', 'get', reverse('team-list') + '?include=stats,rank'),
+        Scenario('teams detail', 'get', reverse('team-detail', args=[team_id])),
+        Scenario('teams detail (members)', 'get', reverse('team-detail', args=[team_id]) + '?expand=members'),
+        Scenario('teams stats', 'get', reverse('team-stats', args=[team_id])),
+        Scenario('teams leaderboard', 'get', reverse('team-leaderboard')),
+        Scenario('teams leaderboard (average)', 'get', reverse('team-leaderboard') + '?metric=average'),
+        Scenario('teams add_member', 'post', reverse('team-add-member', args=[team_id]),
+                 lambda: {'user_id': next(users)}),
+        Scenario('activities list', 'get', reverse('activity-list')),
+        Scenario('activities detail', 'get', reverse('activity-detail', args=[activity_id])),
+        Scenario('activities recent', 'get', reverse('activity-recent')),
+        Scenario('activities search', 'get', reverse('activity-list') + '?q=running+session'),
+        Scenario('activities create', 'post', reverse('activity-list'), new_activity),
+        Scenario('leaderboard list', 'get', reverse('leaderboard-list')),
+        Scenario('leaderboard top', 'get', reverse('leaderboard-top')),
+        Scenario('leaderboard rank', 'get', reverse('leaderboard-rank', args=[user_id])),
+        Scenario('leaderboard top (week)', 'get', reverse('leaderboard-top') + week),
+        Scenario('leaderboard rank (week)', 'get',
+                 reverse('leaderboard-rank', args=[weekly['user_id']]) + week),
+        Scenario('leaderboard update_rankings', 'post', reverse('leaderboard-update-rankings'), dict),
+        Scenario('workouts list', 'get', reverse('workout-list')),
+        Scenario('workouts detail', 'get', reverse('workout-detail', args=[workout['_id']])),
+        Scenario('workouts search', 'get', reverse('workout-list') + '?q=interval'),
+        Scenario('workouts recommend', 'get',
+                 reverse('workout-recommend') + f"?fitness_level={workout['fitness_level']}"),
+        Scenario('workouts recommend (user)', 'get', reverse('workout-recommend') + f'?user_id={user_id}'),
+        Scenario('analytics summary', 'get', reverse('analytics-summary')),
+        Scenario('analytics summary (filtered)', 'get',
+                 reverse('analytics-summary') + '?by=cohort&metric=duration&fitness_level=beginner'),
+    ]
+
+
+def run_scenario(scenario, iterations=50, warmup=5):
+    """Time ``iterations`` requests of ``scenario`` after ``warmup`` untimed ones"""
+    client = Client(HTTP_HOST='localhost')
+    latencies = []
+    commands = []
+    db_seconds = 0.0
+    errors = 0
+
+    for index in range(warmup + iterations):
+        kwargs = {}
+        if scenario.body is not None:
+            kwargs = {'data': json.dumps(scenario.body()), 'content_type': 'application/json'}
+        with track_db() as db:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(scenario.url, **kwargs)
+            if response.streaming:
+                # A streamed body is produced while it is read
+                for _chunk in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - started
+        if index < warmup:
+            continue
+        latencies.append(elapsed)
+        commands.append(db.commands)
+        db_seconds += db.duration
+        if response.status_code >= 400:
+            errors += 1
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': total / len(latencies) * 1000,
+        'throughput': len(latencies) / total if total else 0.0,
+        'db_commands': max(commands),
+        'db_ms': db_seconds / len(latencies) * 1000,
+        'errors': errors
+    }
+
+
+def run(scenarios, iterations=50, warmup=5, only=None):
+    """Run the scenarios whose name contains ``only`` and return {name: metrics}"""
+    return {
+        scenario.name: run_scenario(scenario, iterations, warmup)
+        for scenario in scenarios
+        if only is None or only in scenario.name
+    }
+
+
+def compare(results, baseline, tolerance=0.25, noise_ms=1.0):
+    """
+    Return a message for every regression of ``results`` against ``baseline``.
+
+    A scenario regresses when its p95 exceeds the baseline's by more than
+    ``tolerance`` (and by more than ``noise_ms``, so sub-millisecond jitter on
+    cached endpoints is not reported), when it issues more database commands per request than
+    the baseline, or when it starts returning errors.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if metrics['p95_ms'] > max(previous['p95_ms'] * (1 + tolerance), previous['p95_ms'] + noise_ms):
+            regressions.append(
+                f"{name}: p95 {metrics['p95_ms']:.1f} ms over baseline {previous['p95_ms']:.1f} ms"
+            )
+        if metrics['db_commands'] > previous['db_commands']:
+            regressions.append(
+                f"{name}: {metrics['db_commands']} database commands per request, "
+                f"budget {previous['db_commands']}"
+            )
+        if metrics['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: {metrics['errors']} failed requests")
+    return regressions
+
+
+def percentile(ordered, fraction):
+    """Return the ``fraction`` percentile of sorted seconds, in milliseconds"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
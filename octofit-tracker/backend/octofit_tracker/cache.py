@@ -0,0 +1,225 @@
+"""
+Response cache for the hottest read-only actions.
+
+Cached actions store their response data under a key that embeds the current
+version of every namespace they depend on (``leaderboard``, ``workouts``).
+Writes bump the version of their namespace instead of hunting down keys, so
+every stale entry simply stops being addressed and ages out of the backend.
+Entries also expire after the backend's ``timeout``.
+
+Each cached response carries a content-hash ETag; a request whose
+``If-None-Match`` matches gets an empty 304.
+
+The backend is configured with ``OCTOFIT_RESPONSE_CACHE`` in settings and
+defaults to an in-process LRU of entries whose namespace versions are
+counter documents in the database (``CacheVersion``), so a write in one
+worker invalidates the entries of all of them. ``DjangoCacheBackend`` stores
+entries and versions in a Django cache (e.g. Redis) instead.
+
+Writes that touch a namespace many times, such as a bulk ingest, run inside
+``batched_invalidation()`` so each namespace is bumped once at the end.
+"""
+import contextlib
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils.module_loading import import_string
+from pymongo import ReturnDocument
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import CacheVersion
+from .mongo import get_collection
+from .replicas import replica_reads
+
+DEFAULT_BACKEND = 'octofit_tracker.cache.LRUBackend'
+
+
+class LRUBackend:
+    """
+    In-process least-recently-used cache of entries, each kept at most
+    ``timeout`` seconds; versions are the shared CacheVersion counters
+    """
+
+    def __init__(self, max_entries=1024, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            expires_at, value = self._entries[key]
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_version(self, namespace):
+        # The epoch keeps a counter that was deleted and recreated from
+        # addressing the entries of its previous life
+        collection = get_collection(CacheVersion)
+        if collection is not None:
+            document = collection.find_one({'_id': namespace}) or collection.find_one_and_update(
+                {'_id': namespace},
+                {'$setOnInsert': {'epoch': str(ObjectId()), 'version': 0}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return f"{document['epoch']}.{document['version']}"
+        counter, _ = CacheVersion.objects.get_or_create(pk=namespace, defaults={'epoch': str(ObjectId())})
+        return f'{counter.epoch}.{counter.version}'
+
+    def bump_version(self, namespace):
+        collection = get_collection(CacheVersion)
+        if collection is not None:
+            collection.update_one(
+                {'_id': namespace},
+                {'$inc': {'version': 1}, '$setOnInsert': {'epoch': str(ObjectId())}},
+                upsert=True
+            )
+            return
+        if not CacheVersion.objects.filter(pk=namespace).update(version=F('version') + 1):
+            CacheVersion.objects.get_or_create(pk=namespace, defaults={'epoch': str(ObjectId()), 'version': 1})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheBackend:
+    """Backend storing entries and versions in one of ``settings.CACHES``"""
+
+    def __init__(self, alias='default', timeout=300):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(f'response:{key}')
+
+    def set(self, key, value):
+        self.cache.set(f'response:{key}', value, self.timeout)
+
+    def get_version(self, namespace):
+        return self.cache.get_or_set(f'version:{namespace}', 0, None)
+
+    def bump_version(self, namespace):
+        try:
+            self.cache.incr(f'version:{namespace}')
+        except ValueError:
+            self.cache.set(f'version:{namespace}', 1, None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_batch = ContextVar('octofit_cache_invalidations', default=None)
+
+
+def get_response_cache():
+    """Return the configured cache backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'OCTOFIT_RESPONSE_CACHE', {})
+                backend_class = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+def invalidate(*namespaces):
+    """Invalidate every cached response depending on ``namespaces``"""
+    batch = _batch.get()
+    if batch is not None:
+        batch.update(namespaces)
+        return
+    cache = get_response_cache()
+    for namespace in namespaces:
+        cache.bump_version(namespace)
+
+
+@contextlib.contextmanager
+def batched_invalidation():
+    """Defer the invalidations made inside the block, bumping each namespace once when it ends"""
+    if _batch.get() is not None:
+        yield
+        return
+    namespaces = set()
+    token = _batch.set(namespaces)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        invalidate(*sorted(namespaces))
+
+
+def cached_response(*namespaces):
+    """
+    Cache a viewset action's 200 responses until ``namespaces`` change.
+
+    The key covers the action, the full request path (including the query
+    string) and the current namespace versions. Misses are computed from the
+    primary: a lagging replica could otherwise store data older than the
+    version it is cached under.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_response_cache()
+            with replica_reads(0):
+                versions = ','.join(str(cache.get_version(namespace)) for namespace in namespaces)
+                key = f'{view_method.__qualname__}:{versions}:{request.get_full_path()}'
+
+                entry = cache.get(key)
+                if entry is None:
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                    entry = (response.data, content_etag(response.data))
+                    cache.set(key, entry)
+
+            data, etag = entry
+            if not_modified(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+            return Response(data, headers={'ETag': etag})
+        return wrapper
+    return decorator
+
+
+def content_etag(data):
+    """Return the strong ETag of response data, a hash of its canonical JSON"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode('utf-8')
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+def not_modified(request, etag):
+    """Return whether the request's If-None-Match already holds ``etag``"""
+    if_none_match = _parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in if_none_match or '*' in if_none_match
+
+
+def _parse_etags(header):
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
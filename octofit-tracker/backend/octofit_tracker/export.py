@@ -0,0 +1,125 @@
+"""
+Streaming exports of activity history as CSV or NDJSON.
+
+Exports read the activities from a database cursor ``BATCH_SIZE`` rows at a
+time, oldest first, and encode each batch into one chunk of a
+StreamingHttpResponse. Only a single batch is ever held in memory, so an
+export of millions of rows uses as much memory as one of a hundred.
+
+Rows hold the same fields as the activity listings (see ActivitySerializer)
+and are built through the fast serializer.
+
+The body is read after the view returns, outside the request's replica
+routing context, so the database the export reads from is chosen when the
+response is built.
+"""
+import csv
+import json
+import re
+from urllib.parse import quote
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from .fast_serializers import fast_serializer
+from .serializers import ActivitySerializer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+BATCH_SIZE = 2000
+CSV = 'csv'
+NDJSON = 'ndjson'
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson; charset=utf-8'
+}
+# Characters kept in the plain ASCII filename of the Content-Disposition header
+_UNSAFE_FILENAME = re.compile(r'[^A-Za-z0-9._-]')
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Selects an export format through ``?format=`` or the Accept header.
+
+    Exports stream their own body; only error responses are rendered here,
+    as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode('utf-8')
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = CSV
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = NDJSON
+
+
+def export_response(activities, export_format, filename, batch_size=BATCH_SIZE):
+    """Stream ``activities`` oldest first as an attachment in ``export_format``"""
+    fast = fast_serializer(ActivitySerializer)
+    activities = activities.using(activities.db).order_by('date', '_id')
+    rows = fast.values(activities).iterator(chunk_size=batch_size)
+    encode = _csv_chunks if export_format == CSV else _ndjson_chunks
+    response = StreamingHttpResponse(
+        encode(fast, _batches(rows, batch_size)),
+        content_type=CONTENT_TYPES[export_format]
+    )
+    response['Content-Disposition'] = content_disposition(f'{filename}.{export_format}')
+    return response
+
+
+def content_disposition(filename):
+    """
+    Return an attachment header for ``filename`` (RFC 6266): an ASCII
+    fallback with unsafe characters replaced, plus the exact UTF-8 name
+    """
+    fallback = _UNSAFE_FILENAME.sub('_', filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_chunks(fast, batches):
+    writer = csv.writer(_Line())
+    yield writer.writerow([name for name, _column, _convert in fast.fields]).encode('utf-8')
+    for batch in batches:
+        yield ''.join(
+            writer.writerow(item.values())
+            for item in fast.to_representation(batch)
+        ).encode('utf-8')
+
+
+def _ndjson_chunks(fast, batches):
+    for batch in batches:
+        items = fast.to_representation(batch)
+        if orjson is not None:
+            yield b''.join(orjson.dumps(item) + b'\n' for item in items)
+        else:
+            yield ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items).encode('utf-8')
+
+
+class _Line:
+    """File-like target that hands back what the csv writer writes"""
+
+    def write(self, value):
+        return value
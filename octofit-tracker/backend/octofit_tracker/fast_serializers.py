@@ -0,0 +1,228 @@
+"""
+Read-only fast path for list endpoints.
+
+``ModelSerializer(many=True)`` resolves every field through its own
+``get_attribute()`` and ``to_representation()`` per row, which dominates the
+cost of long listings. A FastSerializer inspects a serializer class once and
+compiles each readable field into a ``(name, column, converter)`` triple.
+Listings then fetch plain ``values()`` rows and build each dict with a tight
+loop over those triples.
+
+FastJSONRenderer encodes those rows with orjson when it is installed. The
+output is byte-for-byte what ``JSONRenderer`` produces; whenever that cannot be
+guaranteed (e.g. a float that orjson would write in a different exponent
+form) it defers to ``JSONRenderer``.
+"""
+import functools
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+# Converters for fields whose to_representation() is a plain type cast
+_CASTS = {
+    serializers.CharField.to_representation: str,
+    serializers.IntegerField.to_representation: int,
+    serializers.FloatField.to_representation: float
+}
+# Types other than fast rows allowed next to them in a paginated response
+_SCALAR_TYPES = (str, int, bool, type(None))
+
+
+class FastRows(list):
+    """
+    Rows built by a FastSerializer.
+
+    ``json_safe`` is False when orjson would not encode them exactly like
+    ``JSONRenderer``.
+    """
+
+    def __init__(self, rows=(), json_safe=True):
+        super().__init__(rows)
+        self.json_safe = json_safe
+
+
+class FastSerializer:
+    """Precompiled read-only representation of a ModelSerializer class"""
+
+    def __init__(self, serializer_class):
+        self.fields = []
+        self.float_fields = []
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{field.field_name} is not a model column'
+                )
+            self.fields.append((field.field_name, field.source, _converter(field)))
+            if _CASTS.get(type(field).to_representation) is float:
+                self.float_fields.append(field.field_name)
+        self.columns = list(dict.fromkeys(column for _name, column, _convert in self.fields))
+
+    def values(self, queryset):
+        """Return ``queryset`` as plain rows holding only the needed columns"""
+        return queryset.values(*self.columns)
+
+    def values_in_order(self, queryset, ids, chunk_size=500):
+        """
+        Return the rows of ``queryset`` with the given primary keys, in the
+        order of ``ids``, fetched with one ``pk__in`` query per
+        ``chunk_size`` ids. Unknown ids are skipped.
+        """
+        ids = list(dict.fromkeys(ids))
+        pk = queryset.model._meta.pk.attname
+        columns = self.columns if pk in self.columns else [*self.columns, pk]
+        rows = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            rows.update((row[pk], row) for row in queryset.filter(pk__in=chunk).order_by().values(*columns))
+        return [rows[key] for key in ids if key in rows]
+
+    def to_representation(self, rows):
+        """Map plain rows to the dicts the serializer would produce"""
+        current_timezone = timezone.get_current_timezone()
+        fields = [
+            (name, column, convert.bind(current_timezone) if isinstance(convert, _DateTimeFormatter) else convert)
+            for name, column, convert in self.fields
+        ]
+        data = FastRows()
+        append = data.append
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                value = row[column]
+                item[name] = None if value is None else convert(value)
+            append(item)
+
+        data.json_safe = all(
+            _orjson_exact(item[name])
+            for name in self.float_fields
+            for item in data
+        )
+        return data
+
+
+@functools.lru_cache(maxsize=None)
+def fast_serializer(serializer_class):
+    """Return the FastSerializer for ``serializer_class``, compiling it once"""
+    return FastSerializer(serializer_class)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes fast rows with orjson when available"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+            or not _json_safe(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these so the output is also valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastListMixin:
+    """Serve a viewset's ``list()`` through the read-only fast path"""
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get_fast_serializer(self):
+        """Return the FastSerializer for the viewset's serializer class"""
+        return fast_serializer(self.get_serializer_class())
+
+    def get_list_rows(self, fast):
+        """Return the rows to list, as built by ``fast.values()``"""
+        return fast.values(self.filter_queryset(self.get_queryset()))
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        rows = self.get_list_rows(fast)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page))
+        return Response(fast.to_representation(rows))
+
+
+def _converter(field):
+    if isinstance(field, serializers.ListField):
+        child = _converter(field.child)
+        return lambda value: [None if item is None else child(item) for item in value]
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.JSONField) and not field.binary:
+        return _identity
+    return _CASTS.get(type(field).to_representation, field.to_representation)
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    fixed_timezone = field.timezone if hasattr(field, 'timezone') else None
+    if (
+        output_format is None
+        or output_format.lower() != ISO_8601
+        or (fixed_timezone if hasattr(field, 'timezone') else field.default_timezone()) is None
+    ):
+        return field.to_representation
+    return _DateTimeFormatter(field, fixed_timezone)
+
+
+class _DateTimeFormatter:
+    """
+    ISO 8601 formatting equivalent to ``DateTimeField.to_representation``.
+
+    ``bind()`` resolves the active timezone once per batch instead of once
+    per value.
+    """
+
+    def __init__(self, field, fixed_timezone=None):
+        self.field = field
+        self.fixed_timezone = fixed_timezone
+
+    def bind(self, current_timezone):
+        field = self.field
+        field_timezone = self.fixed_timezone or current_timezone
+
+        def convert(value):
+            if isinstance(value, str) or value.tzinfo is None:
+                return field.to_representation(value)
+            text = value.astimezone(field_timezone).isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        return convert
+
+    def __call__(self, value):
+        return self.bind(timezone.get_current_timezone())(value)
+
+
+def _identity(value):
+    return value
+
+
+def _orjson_exact(value):
+    """Whether orjson writes ``value`` the way ``float.__repr__`` does"""
+    return value is None or value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def _json_safe(data):
+    if isinstance(data, dict):
+        rows = data.get('results')
+        if not all(isinstance(value, _SCALAR_TYPES) for key, value in data.items() if key != 'results'):
+            return False
+    else:
+        rows = data
+    return isinstance(rows, FastRows) and rows.json_safe
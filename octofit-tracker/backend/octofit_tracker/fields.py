@@ -0,0 +1,26 @@
+"""
+Custom model fields for OctoFit Tracker.
+"""
+from django.db import models
+
+
+class NativeJSONField(models.JSONField):
+    """
+    JSONField stored as a native BSON value on djongo.
+
+    Django's JSONField writes JSON-encoded strings, which MongoDB cannot
+    update in place. Storing lists as real arrays lets server-side operators
+    such as ``$addToSet`` and ``$pull`` work on them. Other backends keep
+    the JSON string encoding, and documents written before the switch are
+    still read from it; ``memberships`` converts them on their first update.
+    """
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if connection.vendor == 'djongo':
+            return value
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def from_db_value(self, value, expression, connection):
+        if value is not None and not isinstance(value, str):
+            return value
+        return super().from_db_value(value, expression, connection)
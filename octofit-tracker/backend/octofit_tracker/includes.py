@@ -0,0 +1,35 @@
+"""
+``?include=`` expansions of list endpoints.
+
+A viewset names the expansions it offers in ``includes``, each mapped to the
+name of a method that receives every listed row and returns a value per row
+id. The method computes the values for all the rows at once, e.g. with one
+aggregation grouped by id, and each value is attached to its row under the
+expansion's name. Listing 50 users with their stats thus costs one query
+more than the plain listing instead of 50 further requests.
+"""
+from rest_framework import serializers
+
+
+def parse_includes(query_params, available, param='include'):
+    """Return the expansions named by ``?include=a,b``, checked against ``available``"""
+    names = [name for value in query_params.getlist(param) for name in value.split(',') if name]
+    if any(name not in available for name in names):
+        raise serializers.ValidationError({param: f"Expected any of: {', '.join(available)}."})
+    return list(dict.fromkeys(names))
+
+
+class IncludeMixin:
+    """Attach the ``?include=`` expansions to the rows of ``list()``"""
+    includes = {}
+
+    def list(self, request, *args, **kwargs):
+        names = parse_includes(request.query_params, self.includes)
+        response = super().list(request, *args, **kwargs)
+        if names:
+            rows = response.data['results'] if isinstance(response.data, dict) else response.data
+            for name in names:
+                values = getattr(self, self.includes[name])(rows)
+                for row in rows:
+                    row[name] = values.get(row['id'])
+        return response
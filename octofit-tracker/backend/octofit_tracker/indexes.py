@@ -0,0 +1,109 @@
+"""
+MongoDB index management driven by the models' declarations.
+
+The models declare their indexes the Django way (``Meta.indexes``,
+``unique``, ``unique_together``). This module turns those declarations into
+pymongo index definitions, and lists the queries issued by the viewsets so
+their query plans can be checked for collection scans. Indexes already
+built on the same keys, whatever their name, are left as they are.
+"""
+from django.apps import apps
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from .models import Activity, Leaderboard, SearchTerm, TeamMembership, User, Team, WindowedLeaderboard, Workout
+
+# A placeholder id: plans depend on the query's shape, not on its values
+SAMPLE_ID = '0' * 24
+
+# The filter and sort issued by each viewset's main querysets
+VIEWSET_QUERIES = [
+    ('UserViewSet.retrieve', User, {'_id': SAMPLE_ID}, None),
+    ('UserViewSet.activities', Activity, {'user_id': SAMPLE_ID}, [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('UserViewSet.stats', Activity, {'user_id': SAMPLE_ID}, None),
+    ('TeamViewSet.retrieve', Team, {'_id': SAMPLE_ID}, None),
+    ('TeamViewSet.stats', Activity, {'user_id': {'$in': [SAMPLE_ID]}}, None),
+    ('team_rollups.record_activity', TeamMembership, {'user_id': SAMPLE_ID}, None),
+    ('ActivityViewSet.list', Activity, {}, [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('ActivityViewSet.list?user_id', Activity, {'user_id': SAMPLE_ID}, [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('LeaderboardViewSet.top', Leaderboard, {}, [('total_points', DESCENDING)]),
+    ('LeaderboardViewSet.retrieve', Leaderboard, {'user_id': SAMPLE_ID}, None),
+    ('leaderboard.apply_delta', Leaderboard, {'total_points': {'$gt': 0}}, None),
+    ('LeaderboardViewSet.top?window', WindowedLeaderboard,
+     {'window': 'week', 'period': '2026-W42'}, [('total_points', DESCENDING), ('user_id', ASCENDING)]),
+    ('leaderboard_windows.record_activity', WindowedLeaderboard,
+     {'window': 'week', 'period': '2026-W42', 'user_id': SAMPLE_ID}, None),
+    ('WorkoutViewSet.list?fitness_level', Workout, {'fitness_level': 'beginner'}, None),
+    ('WorkoutViewSet.list?activity_type', Workout, {'activity_type': 'running'}, None),
+    ('WorkoutViewSet.recommend', Workout, {'fitness_level': 'beginner'}, None),
+    ('search.search', SearchTerm, {'kind': 'activity', 'term': 'running'}, None),
+    ('search.search?user_id', SearchTerm, {'kind': 'activity', 'term': 'running', 'owner_id': SAMPLE_ID}, None),
+    ('search.index_objects', SearchTerm, {'kind': 'activity', 'object_id': {'$in': [SAMPLE_ID]}}, None),
+]
+
+
+def index_models(model):
+    """Return the pymongo IndexModels declared by a Django model"""
+    opts = model._meta
+    indexes = []
+
+    for field in opts.local_fields:
+        if field.unique and not field.primary_key:
+            indexes.append(IndexModel(
+                [(field.column, ASCENDING)],
+                name=f'{opts.db_table}_{field.column}_uniq',
+                unique=True,
+                background=True
+            ))
+
+    for fields in opts.unique_together:
+        columns = [opts.get_field(name).column for name in fields]
+        indexes.append(IndexModel(
+            [(column, ASCENDING) for column in columns],
+            name=f"{opts.db_table}_{'_'.join(columns)}_uniq",
+            unique=True,
+            background=True
+        ))
+
+    for index in opts.indexes:
+        keys = []
+        for name in index.fields:
+            direction = DESCENDING if name.startswith('-') else ASCENDING
+            keys.append((opts.get_field(name.lstrip('-')).column, direction))
+        indexes.append(IndexModel(keys, name=index.name, background=True))
+
+    return indexes
+
+
+def missing_indexes(indexes, index_information):
+    """
+    Return the ``indexes`` whose keys are not indexed yet, given the
+    collection's ``index_information()``. An index on the same keys under
+    another name (e.g. populate_db's ``email_1``) counts as present:
+    creating it again would fail with IndexOptionsConflict.
+    """
+    existing = {_key_spec(info['key']) for info in index_information.values()}
+    return [index for index in indexes if _key_spec(index.document['key'].items()) not in existing]
+
+
+def _key_spec(keys):
+    return tuple((field, direction if isinstance(direction, str) else int(direction)) for field, direction in keys)
+
+
+def app_models():
+    """Return the models of this app, whose collections the indexes belong to"""
+    return list(apps.get_app_config('octofit_tracker').get_models())
+
+
+def scanned_stages(plan):
+    """Yield every stage name of an explain() winning plan"""
+    yield plan.get('stage')
+    if 'inputStage' in plan:
+        yield from scanned_stages(plan['inputStage'])
+    for stage in plan.get('inputStages', []):
+        yield from scanned_stages(stage)
+
+
+def is_collection_scan(explanation):
+    """Return True when an explain() result reads the whole collection"""
+    plan = explanation['queryPlanner']['winningPlan']
+    return 'COLLSCAN' in scanned_stages(plan)
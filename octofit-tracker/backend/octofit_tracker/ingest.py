@@ -0,0 +1,191 @@
+"""
+Streaming bulk ingest of activities.
+
+Device sync clients upload a backlog of activities in one request, either as
+NDJSON (one JSON object per line) or as a JSON array. The body is read from
+the request stream and handled in fixed-size chunks: each chunk is
+validated, written with a single batched insert and folded into the derived
+totals, so memory stays bounded however long the upload is; an item longer
+than ``MAX_ITEM_SIZE`` stops the ingest. Invalid items are reported
+individually and do not fail the rest of the batch.
+"""
+import codecs
+import json
+
+from bson import ObjectId
+from rest_framework.exceptions import ParseError
+
+from .cache import batched_invalidation
+from .models import Activity
+from .serializers import ActivitySerializer
+
+CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+# Longest single item of JSON; a longer one ends the ingest
+MAX_ITEM_SIZE = 1024 * 1024
+MAX_REPORTED_ERRORS = 1000
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class InvalidItem:
+    """Placeholder for an item that could not be decoded"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def ingest_activities(stream, content_type='', listeners=()):
+    """
+    Validate and insert every activity in ``stream``.
+
+    ``listeners`` are the modules that keep derived data in sync with
+    Activity writes; each gets ``record_activities()`` per inserted chunk.
+    Returns a report with the number of items received, created and failed,
+    plus the first ``MAX_REPORTED_ERRORS`` per-item errors. If the body stops
+    being parseable, the items before that point are still ingested and the
+    report carries a ``parse_error``. Cached responses are invalidated once,
+    after the last chunk.
+    """
+    report = {'received': 0, 'created': 0, 'failed': 0, 'errors': []}
+    chunk = []
+
+    with batched_invalidation():
+        try:
+            for index, item in iter_items(stream, content_type):
+                report['received'] += 1
+                chunk.append((index, item))
+                if len(chunk) >= CHUNK_SIZE:
+                    _ingest_chunk(chunk, report, listeners)
+                    chunk = []
+        except ParseError as exc:
+            report['parse_error'] = str(exc.detail)
+        if chunk:
+            _ingest_chunk(chunk, report, listeners)
+
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    return report
+
+
+def iter_items(stream, content_type=''):
+    """Yield ``(index, item)`` pairs from an NDJSON or JSON array body"""
+    if stream is None:
+        return iter(())
+
+    media_type = content_type.split(';')[0].strip().lower()
+    if media_type in NDJSON_CONTENT_TYPES:
+        return iter_ndjson(stream)
+
+    first = _skip_whitespace(stream)
+    if first == b'[':
+        return iter_json_array(stream)
+    return iter_ndjson(stream, prefix=first)
+
+
+def iter_ndjson(stream, prefix=b''):
+    """Yield one item per non-blank line, reading a line at a time"""
+    index = 0
+    first = True
+    while True:
+        line = stream.readline(MAX_ITEM_SIZE + 1)
+        if first:
+            line, first = prefix + line, False
+        if not line:
+            return
+        if len(line) > MAX_ITEM_SIZE and not line.endswith(b'\n'):
+            raise ParseError(f'Item at index {index} exceeds the {MAX_ITEM_SIZE} size limit')
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as exc:
+            item = InvalidItem(f'Invalid JSON: {exc}')
+        yield index, item
+        index += 1
+
+
+def iter_json_array(stream):
+    """
+    Yield the elements of a JSON array whose opening ``[`` was consumed.
+
+    Elements are decoded one at a time from a rolling buffer, so only the
+    element being decoded is held in memory, up to ``MAX_ITEM_SIZE``.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    eof = False
+    index = 0
+    expect_value = True
+
+    while True:
+        position = 0
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        buffer = buffer[position:]
+
+        if buffer.startswith(']'):
+            return
+        if not expect_value and buffer.startswith(','):
+            buffer = buffer[1:]
+            expect_value = True
+            continue
+
+        if buffer and expect_value:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise ParseError(f'Invalid JSON array element at index {index}')
+                if len(buffer) > MAX_ITEM_SIZE:
+                    raise ParseError(f'Item at index {index} exceeds the {MAX_ITEM_SIZE} size limit')
+            else:
+                if end > MAX_ITEM_SIZE:
+                    raise ParseError(f'Item at index {index} exceeds the {MAX_ITEM_SIZE} size limit')
+                if end < len(buffer) or eof:
+                    buffer = buffer[end:]
+                    expect_value = False
+                    yield index, item
+                    index += 1
+                    continue
+        elif buffer:
+            raise ParseError(f'Expected "," or "]" after element {index - 1}')
+
+        if eof:
+            raise ParseError('Unterminated JSON array')
+        data = stream.read(READ_SIZE)
+        eof = not data
+        buffer += text.decode(data, final=eof)
+
+
+def _skip_whitespace(stream):
+    """Consume leading whitespace and return the first other byte"""
+    while True:
+        byte = stream.read(1)
+        if not byte or not byte.isspace():
+            return byte
+
+
+def _ingest_chunk(chunk, report, listeners):
+    activities = []
+    for index, item in chunk:
+        if isinstance(item, InvalidItem):
+            _fail(report, index, {'non_field_errors': [item.message]})
+            continue
+        serializer = ActivitySerializer(data=item)
+        if serializer.is_valid():
+            activities.append(Activity(_id=str(ObjectId()), **serializer.validated_data))
+        else:
+            _fail(report, index, serializer.errors)
+
+    if not activities:
+        return
+    Activity.objects.bulk_create(activities)
+    for listener in listeners:
+        listener.record_activities(activities)
+    report['created'] += len(activities)
+
+
+def _fail(report, index, errors):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'index': index, 'errors': errors})
@@ -0,0 +1,85 @@
+"""
+Database round-trip accounting.
+
+``track_db()`` counts the database commands issued inside a block and the
+time spent in them. MongoDB is observed through a pymongo command listener,
+which sees every command whether it came from djongo or from the raw
+collections in ``mongo.py``. SQL backends are observed through an execute
+wrapper installed on every new connection. ``install()`` sets both up and
+must run before the first connection is opened, so the app config calls it
+from ``ready()``.
+
+Trackers live in a context variable, so commands issued from
+``sync_to_async`` threads count toward the request that awaited them.
+Commands that motor runs on its executor threads are not attributed.
+"""
+import contextlib
+import time
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from pymongo import monitoring
+
+_trackers = ContextVar('octofit_db_trackers', default=())
+_installed = False
+
+
+class DBStats:
+    """Database commands issued and seconds spent in them"""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration = 0.0
+
+
+class _CommandListener(monitoring.CommandListener):
+    """Attribute every MongoDB command to the active trackers"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        _record(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        _record(event.duration_micros / 1e6)
+
+
+def install():
+    """Register the pymongo command listener and the SQL wrapper once per process"""
+    global _installed
+    if not _installed:
+        monitoring.register(_CommandListener())
+        connection_created.connect(_wrap_connection)
+        _installed = True
+
+
+@contextlib.contextmanager
+def track_db():
+    """Yield a DBStats that accumulates the database commands of the block"""
+    stats = DBStats()
+    token = _trackers.set(_trackers.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _trackers.reset(token)
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    # djongo's commands already reach the pymongo listener
+    if connection.vendor != 'djongo' and _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _record(time.perf_counter() - started)
+
+
+def _record(duration):
+    for stats in _trackers.get():
+        stats.commands += 1
+        stats.duration += duration
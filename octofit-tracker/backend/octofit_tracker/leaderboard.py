@@ -0,0 +1,221 @@
+"""
+Incremental maintenance of Leaderboard entries.
+
+Every Activity write applies its delta to the owning user's entry, so totals
+and ranks stay current without rebuilding the whole board. Counters are
+changed with server-side increments, and a rank move only rewrites the
+ranks of the entries whose position the user actually crossed: one update
+per distinct score in the crossed range, so a move costs O(scores crossed).
+A new entry joins at 0 points, which changes no other rank, and then moves
+up like any other.
+
+Ranks follow competition ranking: an entry's rank is one plus the number of
+entries with strictly more points. ``LeaderboardViewSet.update_rankings``
+remains the full repair if the board is ever edited by hand.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from pymongo import UpdateMany
+
+from .cache import invalidate
+from .models import Activity, Leaderboard, User
+from .mongo import get_collection
+from .rank_index import board
+
+# Times a rank move is counted and written before it leaves any difference
+# left by concurrent moves to the next move over the same scores
+MAX_RANK_PASSES = 3
+
+
+def record_activity(activity):
+    """Add a newly saved activity to its user's leaderboard entry"""
+    apply_delta(
+        activity.user_id,
+        points=activity.points,
+        activities=1,
+        duration=activity.duration,
+        activity_date=activity.date
+    )
+
+
+def record_activities(activities):
+    """Add a batch of newly saved activities, applying one delta per user"""
+    deltas = {}
+    for activity in activities:
+        delta = deltas.setdefault(activity.user_id, {
+            'points': 0,
+            'activities': 0,
+            'duration': 0,
+            'activity_date': activity.date
+        })
+        delta['points'] += activity.points
+        delta['activities'] += 1
+        delta['duration'] += activity.duration
+        delta['activity_date'] = max(delta['activity_date'], activity.date)
+
+    for user_id, delta in deltas.items():
+        apply_delta(user_id, **delta)
+
+
+def discard_activity(activity):
+    """Remove a deleted activity from its user's leaderboard entry"""
+    apply_delta(
+        activity.user_id,
+        points=-activity.points,
+        activities=-1,
+        duration=-activity.duration
+    )
+    _refresh_last_activity_date(activity.user_id, activity.date)
+
+
+def replace_activity(previous, activity):
+    """Apply the difference between two versions of the same activity"""
+    if previous.user_id != activity.user_id:
+        discard_activity(previous)
+        record_activity(activity)
+        return
+
+    apply_delta(
+        activity.user_id,
+        points=activity.points - previous.points,
+        duration=activity.duration - previous.duration,
+        activity_date=activity.date
+    )
+    if previous.date != activity.date:
+        _refresh_last_activity_date(activity.user_id, previous.date)
+
+
+def apply_delta(user_id, points=0, activities=0, duration=0, activity_date=None):
+    """
+    Atomically add the given deltas to a user's leaderboard entry.
+
+    The entry is created on first use. ``activity_date`` only ever moves
+    ``last_activity_date`` forward. On SQL databases the increment and the
+    rank move commit together.
+    """
+    entry, created = _get_or_create_entry(user_id)
+    with transaction.atomic():
+        old_points = _increment(entry.pk, points, activities, duration, activity_date)
+        new_points = old_points + points
+        if created:
+            low = min(old_points, new_points)
+            if Leaderboard.objects.filter(total_points__lt=low).exists():
+                # Entries below the one that joined now have one more ahead
+                low = None
+            _move_rank(low, max(old_points, new_points))
+        elif points:
+            _move_rank(min(old_points, new_points), max(old_points, new_points))
+    board.update(user_id, new_points)
+    invalidate('leaderboard')
+
+
+def _get_or_create_entry(user_id):
+    username = User.objects.filter(_id=user_id).values_list('username', flat=True).first()
+    return Leaderboard.objects.get_or_create(
+        user_id=user_id,
+        defaults={'username': username or ''}
+    )
+
+
+def _increment(pk, points, activities, duration, activity_date):
+    """Increment the counters of one entry and return its previous points"""
+    now = timezone.now()
+    collection = get_collection(Leaderboard)
+
+    if collection is not None:
+        update = {
+            '$inc': {
+                'total_points': points,
+                'total_activities': activities,
+                'total_duration': duration
+            },
+            '$set': {'updated_at': now}
+        }
+        if activity_date is not None:
+            update['$max'] = {'last_activity_date': activity_date}
+        before = collection.find_one_and_update(
+            {'_id': pk},
+            update,
+            projection={'total_points': True}
+        )
+        return before['total_points']
+
+    with transaction.atomic():
+        entries = Leaderboard.objects.select_for_update().filter(pk=pk)
+        old_points = entries.values_list('total_points', flat=True).get()
+        entries.update(
+            total_points=F('total_points') + points,
+            total_activities=F('total_activities') + activities,
+            total_duration=F('total_duration') + duration,
+            updated_at=now
+        )
+        if activity_date is not None:
+            entries.filter(
+                Q(last_activity_date__isnull=True) | Q(last_activity_date__lt=activity_date)
+            ).update(last_activity_date=activity_date)
+    return old_points
+
+
+def _move_rank(low, high):
+    """
+    Re-rank the entries scoring from ``low`` to ``high`` after an entry
+    moved between them; ``low`` of None leaves the range open below.
+
+    Their ranks are counted from the board, one per distinct score, and
+    written as absolute values rather than shifted from the stored ones. The
+    increment and this write are not atomic on MongoDB, so a concurrent move
+    may write counts older than ours after we read them: the range is
+    recounted after each write and written again until the counts hold.
+    """
+    ranks = _count_ranks(low, high)
+    for _ in range(MAX_RANK_PASSES):
+        _write_ranks(ranks)
+        recounted = _count_ranks(low, high)
+        if recounted == ranks:
+            return
+        ranks = recounted
+
+
+def _count_ranks(low, high):
+    """Return ``(points, rank)`` for every distinct score from ``low`` to ``high``, best first"""
+    entries = Leaderboard.objects.order_by()
+    ahead = entries.filter(total_points__gt=high).count()
+    scores = entries.filter(total_points__lte=high)
+    if low is not None:
+        scores = scores.filter(total_points__gte=low)
+    ranks = []
+    for points, count in sorted(scores.values_list('total_points').annotate(count=Count('_id')), reverse=True):
+        ranks.append((points, ahead + 1))
+        ahead += count
+    return ranks
+
+
+def _write_ranks(ranks):
+    """Give every entry of each score its rank, touching only the entries whose rank differs"""
+    collection = get_collection(Leaderboard)
+    if collection is not None:
+        if ranks:
+            collection.bulk_write([
+                UpdateMany({'total_points': points, 'rank': {'$ne': rank}}, {'$set': {'rank': rank}})
+                for points, rank in ranks
+            ], ordered=False)
+        return
+
+    for points, rank in ranks:
+        Leaderboard.objects.filter(total_points=points).exclude(rank=rank).update(rank=rank)
+
+
+def _refresh_last_activity_date(user_id, removed_date):
+    """Step ``last_activity_date`` back if it pointed at a removed activity"""
+    latest = (
+        Activity.objects.filter(user_id=user_id)
+        .order_by('-date')
+        .values_list('date', flat=True)
+        .first()
+    )
+    Leaderboard.objects.filter(
+        user_id=user_id,
+        last_activity_date=removed_date
+    ).update(last_activity_date=latest)
+    invalidate('leaderboard')
@@ -0,0 +1,246 @@
+"""
+Leaderboards per day, ISO week and month.
+
+Every activity adds its points to one WindowedLeaderboard entry per window,
+keyed by the user and the period containing the activity's local date
+(``2026-10-18``, ``2026-W42``, ``2026-10``). Entries are upserted with
+server-side increments on each Activity write, so a new period simply starts
+with new entries: rollover never rescans history, and past periods stay
+queryable.
+
+Top-N and rank lookups go through one ``RankIndex`` per period, created on
+demand and kept current by the same writes. Only the most recently used
+``MAX_INDEXES`` periods stay in memory.
+
+``rebuild_windows()`` backfills the entries from existing activities.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from bson import ObjectId
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from pymongo import ReturnDocument
+from rest_framework import serializers
+
+from .cache import invalidate
+from .models import Activity, User, WindowedLeaderboard
+from .mongo import get_collection
+from .rank_index import RankIndex
+from .replicas import PRIMARY
+from .trends import local_day, period_of
+
+WINDOWS = ('day', 'week', 'month')
+ALL_TIME = 'all'
+TOTAL_FIELDS = ('total_points', 'total_activities', 'total_duration')
+MAX_INDEXES = 16
+
+_WEEK = re.compile(r'^(\d{4})-W(\d{2})$')
+_MONTH = re.compile(r'^(\d{4})-(\d{2})$')
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def record_activity(activity):
+    """Add a newly saved activity to its periods' boards"""
+    _apply_deltas(_deltas([activity], 1))
+
+
+def record_activities(activities):
+    """Add a batch of newly saved activities, applying one delta per entry"""
+    _apply_deltas(_deltas(activities, 1))
+
+
+def discard_activity(activity):
+    """Remove a deleted activity from its periods' boards"""
+    _apply_deltas(_deltas([activity], -1))
+
+
+def replace_activity(previous, activity):
+    """Move an updated activity between periods as needed"""
+    discard_activity(previous)
+    record_activity(activity)
+
+
+def parse_window(query_params):
+    """
+    Read ``?window=&period=`` from a request.
+
+    ``window`` is ``all`` (the default), ``day``, ``week`` or ``month``;
+    ``period`` defaults to the current one. Returns ``(window, period)``,
+    with a period of None for the all-time board.
+    """
+    window = query_params.get('window', ALL_TIME)
+    if window == ALL_TIME:
+        return window, None
+    if window not in WINDOWS:
+        raise serializers.ValidationError({'window': f"Expected one of: {ALL_TIME}, {', '.join(WINDOWS)}."})
+
+    period = query_params.get('period')
+    if not period:
+        return window, period_of(timezone.localdate(), window)[0]
+    return window, _parse_period(window, period)
+
+
+def board_for(window, period):
+    """Return the rank index of one period's board"""
+    key = (window, period)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RankIndex(lambda: _load_board(window, period))
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(key)
+        return index
+
+
+def invalidate_boards():
+    """Drop every in-memory period index, after writes that bypass this module"""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def rebuild_windows(user_ids=None):
+    """
+    Recompute the windowed entries of the given users (all users by default).
+
+    Activities are streamed in user order and written back one user at a
+    time. Returns the number of entries written.
+    """
+    activities = Activity.objects.order_by('user_id')
+    entries = WindowedLeaderboard.objects.all()
+    if user_ids is not None:
+        activities = activities.filter(user_id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+    entries.delete()
+    usernames = dict(User.objects.values_list('_id', 'username'))
+
+    written = 0
+    current_user = None
+    totals = {}
+    rows = activities.values_list('user_id', 'date', 'points', 'duration').iterator(chunk_size=2000)
+    for user_id, activity_date, points, duration in rows:
+        if user_id != current_user:
+            written += _write_user_entries(current_user, usernames.get(current_user, ''), totals)
+            current_user, totals = user_id, {}
+        for window, period in periods(activity_date):
+            entry = totals.setdefault((window, period), dict.fromkeys(TOTAL_FIELDS, 0))
+            entry['total_points'] += points
+            entry['total_activities'] += 1
+            entry['total_duration'] += duration
+    written += _write_user_entries(current_user, usernames.get(current_user, ''), totals)
+
+    invalidate_boards()
+    invalidate('leaderboard')
+    return written
+
+
+def periods(activity_date):
+    """Return the ``(window, period)`` pairs an activity date belongs to"""
+    day = local_day(activity_date)
+    return [(window, period_of(day, window)[0]) for window in WINDOWS]
+
+
+def _write_user_entries(user_id, username, totals):
+    if user_id is None:
+        return 0
+    WindowedLeaderboard.objects.bulk_create([
+        WindowedLeaderboard(
+            _id=str(ObjectId()),
+            window=window,
+            period=period,
+            user_id=user_id,
+            username=username,
+            **entry
+        )
+        for (window, period), entry in totals.items()
+    ], batch_size=1000)
+    return len(totals)
+
+
+def _deltas(activities, sign):
+    deltas = {}
+    for activity in activities:
+        for window, period in periods(activity.date):
+            delta = deltas.setdefault((window, period, activity.user_id), dict.fromkeys(TOTAL_FIELDS, 0))
+            delta['total_points'] += sign * activity.points
+            delta['total_activities'] += sign
+            delta['total_duration'] += sign * activity.duration
+    return deltas
+
+
+def _apply_deltas(deltas):
+    if not deltas:
+        return
+    user_ids = {user_id for _window, _period, user_id in deltas}
+    usernames = dict(User.objects.filter(_id__in=user_ids).values_list('_id', 'username'))
+    for (window, period, user_id), delta in deltas.items():
+        _apply(window, period, user_id, usernames.get(user_id, ''), delta)
+    invalidate('leaderboard')
+
+
+def _apply(window, period, user_id, username, delta):
+    """Upsert an entry, add ``delta`` to it and drop it once empty"""
+    key = {'window': window, 'period': period, 'user_id': user_id}
+    collection = get_collection(WindowedLeaderboard)
+
+    if collection is not None:
+        entry = collection.find_one_and_update(
+            key,
+            {'$inc': delta, '$setOnInsert': {'_id': str(ObjectId()), 'username': username}},
+            projection={'total_points': True, 'total_activities': True},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if entry['total_activities'] <= 0:
+            collection.delete_one({'_id': entry['_id']})
+    else:
+        entry, _created = WindowedLeaderboard.objects.get_or_create(**key, defaults={'username': username})
+        entries = WindowedLeaderboard.objects.filter(pk=entry.pk)
+        entries.update(**{field: F(field) + value for field, value in delta.items()})
+        entry = entries.values('total_points', 'total_activities').get()
+        if entry['total_activities'] <= 0:
+            entries.delete()
+
+    with _indexes_lock:
+        index = _indexes.get((window, period))
+    if index is None:
+        return
+    if entry['total_activities'] <= 0:
+        index.discard(user_id)
+    else:
+        index.update(user_id, entry['total_points'])
+
+
+def _load_board(window, period):
+    return (
+        WindowedLeaderboard.objects.using(PRIMARY)
+        .filter(window=window, period=period)
+        .values_list('user_id', 'total_points')
+        .iterator()
+    )
+
+
+def _parse_period(window, value):
+    """Validate a period label and return it in canonical form"""
+    try:
+        if window == 'day':
+            day = parse_date(value)
+        elif window == 'week':
+            match = _WEEK.match(value)
+            day = match and date.fromisocalendar(int(match[1]), int(match[2]), 1)
+        else:
+            match = _MONTH.match(value)
+            day = match and date(int(match[1]), int(match[2]), 1)
+    except ValueError:
+        day = None
+    if not day:
+        examples = {'day': '2026-10-18', 'week': '2026-W42', 'month': '2026-10'}
+        raise serializers.ValidationError({'period': f'Expected a {window} like {examples[window]}.'})
+    return period_of(day, window)[0]
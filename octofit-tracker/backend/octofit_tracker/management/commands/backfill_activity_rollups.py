@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.trends import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily activity rollups used by the trends endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='user_ids',
+                            help='Only rebuild this user (may be repeated)')
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily rollup buckets'))
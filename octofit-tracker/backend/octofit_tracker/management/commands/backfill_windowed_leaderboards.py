@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.leaderboard_windows import rebuild_windows
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily, weekly and monthly leaderboards from existing activities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='user_ids',
+                            help='Only rebuild this user (may be repeated)')
+
+    def handle(self, *args, **options):
+        written = rebuild_windows(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} windowed leaderboard entries'))
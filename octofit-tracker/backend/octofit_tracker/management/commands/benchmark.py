@@ -0,0 +1,95 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker import benchmarks
+from octofit_tracker.analytics import write_snapshot
+from octofit_tracker.synthetic import populate
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every API endpoint and compare latency and database round trips '
+            'against a stored baseline. Replaces the database contents; use a throwaway database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200,
+                            help='Number of users to generate')
+        parser.add_argument('--activities-per-user', type=int, default=20,
+                            help='Average number of activities per user')
+        parser.add_argument('--teams', type=int, default=5,
+                            help='Number of teams to generate')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the generated dataset')
+        parser.add_argument('--skip-populate', action='store_true',
+                            help='Benchmark the data already in the database')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Untimed requests per endpoint before timing')
+        parser.add_argument('--only',
+                            help='Only run endpoints whose name contains this text')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+                            help='Baseline file to compare against')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write the results to the baseline file instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 slowdown over the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive')
+        if options['warmup'] < 0 or options['tolerance'] < 0:
+            raise CommandError('--warmup and --tolerance must not be negative')
+
+        if not options['skip_populate']:
+            self.stdout.write('Generating dataset...')
+            populate(
+                users=options['users'],
+                activities_per_user=options['activities_per_user'],
+                teams=options['teams'],
+                seed=options['seed']
+            )
+            self.stdout.write('Snapshotting analytics...')
+            write_snapshot()
+
+        try:
+            scenarios = benchmarks.build_scenarios()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        results = benchmarks.run(scenarios, options['iterations'], options['warmup'], options['only'])
+        if not results:
+            raise CommandError(f"No endpoint matches --only {options['only']!r}")
+
+        self.stdout.write(
+            f"{'endpoint':<30} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'req/s':>8} {'db cmds':>8} {'db ms':>8} {'errors':>6}"
+        )
+        for name, metrics in results.items():
+            self.stdout.write(
+                f"{name:<30} {metrics['p50_ms']:8.2f} {metrics['p95_ms']:8.2f} {metrics['p99_ms']:8.2f} "
+                f"{metrics['throughput']:8.1f} {metrics['db_commands']:8d} {metrics['db_ms']:8.2f} "
+                f"{metrics['errors']:6d}"
+            )
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline = {}
+            if baseline_path.exists():
+                baseline = json.loads(baseline_path.read_text())
+            baseline.update(results)
+            baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(f'No baseline at {baseline_path}; run with --save-baseline to create one')
+            return
+
+        regressions = benchmarks.compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
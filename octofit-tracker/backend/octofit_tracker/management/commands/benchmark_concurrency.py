@@ -0,0 +1,121 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker.benchmarks import percentile
+
+# (label, WSGI path, ASGI path); {user} and {team} come from the options
+ENDPOINTS = (
+    ('leaderboard top', '/api/leaderboard/top/', '/api/async/leaderboard/top/'),
+    ('activities', '/api/activities/', '/api/async/activities/'),
+    ('user stats', '/api/users/{user}/stats/', '/api/async/users/{user}/stats/'),
+    ('team stats', '/api/teams/{team}/stats/', '/api/async/teams/{team}/stats/'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare how many concurrent requests the WSGI and ASGI servers sustain'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000',
+                            help='Base URL of the WSGI server')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001',
+                            help='Base URL of the ASGI server')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Number of clients with a request in flight')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per endpoint and server')
+        parser.add_argument('--slow-client-ms', type=int, default=0,
+                            help='Pause between the request line and the headers, like a slow client')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Seconds before a request counts as failed')
+        parser.add_argument('--user', help='User id for the user stats endpoint')
+        parser.add_argument('--team', help='Team id for the team stats endpoint')
+
+    def handle(self, *args, **options):
+        for option in ('wsgi_url', 'asgi_url'):
+            if urlsplit(options[option]).scheme != 'http':
+                raise CommandError(f"--{option.replace('_', '-')} must be an http:// URL")
+
+        ids = {'user': options['user'], 'team': options['team']}
+        for label, wsgi_path, asgi_path in ENDPOINTS:
+            if any(f'{{{key}}}' in wsgi_path and not value for key, value in ids.items()):
+                self.stdout.write(f'{label}: skipped (no id given)')
+                continue
+
+            throughput = {}
+            for server, url in (
+                ('wsgi', options['wsgi_url'].rstrip('/') + wsgi_path.format(**ids)),
+                ('asgi', options['asgi_url'].rstrip('/') + asgi_path.format(**ids))
+            ):
+                latencies, errors, elapsed = asyncio.run(run_load(
+                    url,
+                    options['requests'],
+                    options['concurrency'],
+                    options['slow_client_ms'] / 1000,
+                    options['timeout']
+                ))
+                throughput[server] = len(latencies) / elapsed
+                latencies.sort()
+                self.stdout.write(
+                    f'{label:<16} {server}: {throughput[server]:8.1f} req/s  '
+                    f'p50 {percentile(latencies, 0.50):8.1f} ms  '
+                    f'p95 {percentile(latencies, 0.95):8.1f} ms  '
+                    f'errors {errors}'
+                )
+
+            if throughput['wsgi']:
+                ratio = throughput['asgi'] / throughput['wsgi']
+                self.stdout.write(self.style.SUCCESS(f'{label:<16} asgi/wsgi throughput: {ratio:.2f}x'))
+
+
+async def run_load(url, total, concurrency, slow_seconds=0, timeout=30):
+    """
+    Send ``total`` GET requests to ``url`` from ``concurrency`` clients.
+
+    Returns the successful request latencies, the error count and the
+    elapsed seconds.
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(url, slow_seconds), timeout)
+            except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def fetch(url, slow_seconds=0):
+    """Issue one HTTP/1.1 GET on a fresh connection and return its status"""
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\n'.encode('ascii'))
+        if slow_seconds:
+            await writer.drain()
+            await asyncio.sleep(slow_seconds)
+        writer.write(
+            f'Host: {parts.netloc}\r\nAccept: application/json\r\nConnection: close\r\n\r\n'.encode('ascii')
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
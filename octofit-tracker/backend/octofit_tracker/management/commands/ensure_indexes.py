@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker.indexes import (
+    VIEWSET_QUERIES,
+    app_models,
+    index_models,
+    is_collection_scan,
+    missing_indexes
+)
+from octofit_tracker.mongo import get_collection
+
+
+class Command(BaseCommand):
+    help = 'Build the indexes declared by the models and check the viewset query plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-explain', action='store_true',
+                            help='Only build indexes, do not check query plans')
+
+    def handle(self, *args, **options):
+        scans = 0
+
+        for model in app_models():
+            collection = get_collection(model)
+            if collection is None:
+                raise CommandError('ensure_indexes requires a djongo (MongoDB) database')
+
+            indexes = index_models(model)
+            if not indexes:
+                continue
+            missing = missing_indexes(indexes, collection.index_information())
+            names = collection.create_indexes(missing) if missing else []
+            self.stdout.write(f"{collection.name}: {', '.join(names) or 'up to date'}")
+
+        if options['skip_explain']:
+            return
+
+        self.stdout.write('\n=== Query plans ===')
+        for label, model, query, sort in VIEWSET_QUERIES:
+            cursor = get_collection(model).find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            if is_collection_scan(cursor.explain()):
+                scans += 1
+                self.stdout.write(self.style.WARNING(f'{label}: COLLSCAN on {model._meta.db_table}'))
+            else:
+                self.stdout.write(f'{label}: indexed')
+
+        if scans:
+            self.stdout.write(self.style.WARNING(f'{scans} queries still scan the whole collection'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All viewset queries use an index'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker.recommendations import BATCH_SIZE, refresh_all
+
+
+class Command(BaseCommand):
+    help = 'Precompute the workout recommendations of every user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Users scored and written per batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        written = refresh_all(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored recommendations for {written} users'))
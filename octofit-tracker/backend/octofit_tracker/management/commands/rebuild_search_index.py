@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker.search import BATCH_SIZE, FIELDS, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of workouts and activities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(FIELDS), action='append',
+                            help='Only reindex this kind of document (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Index rows written per batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        counts = rebuild(options['kind'], options['batch_size'])
+        for kind, count in counts.items():
+            self.stdout.write(f'  {kind}: {count} documents')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.models import Team
+from octofit_tracker.team_rollups import rebuild_all_teams
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild every team rollup, the membership index and the team rankings '
+        'from Team.member_ids, rewriting member_ids as a native array'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Teams per bulk write')
+
+    def handle(self, *args, **options):
+        for team in Team.objects.only('_id', 'member_ids').iterator():
+            team.save(update_fields=['member_ids'])
+        report = rebuild_all_teams(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups for {report['teams']} teams ({report['memberships']} memberships)"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from octofit_tracker.analytics import BATCH_SIZE, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the activities into the columnar files served by /api/analytics/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', help='Snapshot directory (default: settings.OCTOFIT_ANALYTICS_DIR)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Activities read and written per batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        manifest = write_snapshot(options['directory'], options['batch_size'])
+        for group, labels in manifest['dictionaries'].items():
+            self.stdout.write(f'  {group}: {len(labels)} values')
+        self.stdout.write(self.style.SUCCESS(f"Snapshot of {manifest['rows']} activities written"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker.ranking import (
+    recompute_rankings,
+    RANKING_METHODS,
+    COMPETITION,
+    PARTITION_SIZE,
+    BATCH_SIZE
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute every leaderboard rank, writing only the ranks that changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=RANKING_METHODS, default=COMPETITION,
+                            help='How tied scores are ranked')
+        parser.add_argument('--partition-size', type=int, default=PARTITION_SIZE,
+                            help='Rows per sorted partition')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Rank updates per bulk write')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes used to sort partitions')
+
+    def handle(self, *args, **options):
+        report = recompute_rankings(
+            method=options['method'],
+            partition_size=options['partition_size'],
+            batch_size=options['batch_size'],
+            max_workers=options['workers']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {report['rows_scanned']} entries ({report['method']}): "
+            f"{report['rows_changed']} changed in {report['elapsed_ms']} ms"
+        ))
@@ -0,0 +1,109 @@
+"""
+Atomic team membership changes.
+
+``Team.member_ids`` is changed with server-side set operations
+(``$addToSet`` / ``$pull`` on MongoDB, a row lock elsewhere) rather than by
+rewriting the array loaded into Python, so concurrent joins and leaves never
+lose each other's updates. Each operation reports exactly which users it
+added or removed, and only those are moved in or out of the team rollup.
+
+Teams written before ``member_ids`` became a native array still hold it as a
+JSON string, which the set operators reject. The updates only match array
+documents; a team they miss is converted to an array in place and the update
+retried, so old teams need no migration.
+"""
+import json
+
+from django.db import transaction
+
+from . import team_rollups
+from .models import Team
+from .mongo import get_collection
+
+# User ids per server-side update, to bound the size of a single command
+CHUNK_SIZE = 1000
+
+
+def add_members(team_id, user_ids):
+    """Add users to a team and return the ids that were not members yet"""
+    added = []
+    for chunk in _chunks(user_ids):
+        added.extend(_add_to_set(team_id, chunk))
+    team_rollups.members_joined(team_id, added)
+    return added
+
+
+def remove_members(team_id, user_ids):
+    """Remove users from a team and return the ids that were members"""
+    removed = []
+    for chunk in _chunks(user_ids):
+        removed.extend(_pull(team_id, chunk))
+    team_rollups.members_left(team_id, removed)
+    return removed
+
+
+def set_members(team_id, user_ids):
+    """Make ``user_ids`` the team's members, changing only the difference"""
+    desired = list(dict.fromkeys(user_ids))
+    current = Team.objects.values_list('member_ids', flat=True).get(pk=team_id)
+    removed = remove_members(team_id, [user_id for user_id in current if user_id not in desired])
+    added = add_members(team_id, [user_id for user_id in desired if user_id not in current])
+    return added, removed
+
+
+def _chunks(user_ids):
+    user_ids = list(dict.fromkeys(user_ids))
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        yield user_ids[start:start + CHUNK_SIZE]
+
+
+def _add_to_set(team_id, user_ids):
+    collection = get_collection(Team)
+    if collection is not None:
+        before = _update_members(collection, team_id, {'$addToSet': {'member_ids': {'$each': user_ids}}})
+        current = set(before.get('member_ids') or [])
+        return [user_id for user_id in user_ids if user_id not in current]
+
+    with transaction.atomic():
+        team = Team.objects.select_for_update().only('member_ids').get(pk=team_id)
+        added = [user_id for user_id in user_ids if user_id not in team.member_ids]
+        if added:
+            Team.objects.filter(pk=team_id).update(member_ids=team.member_ids + added)
+    return added
+
+
+def _pull(team_id, user_ids):
+    collection = get_collection(Team)
+    if collection is not None:
+        before = _update_members(collection, team_id, {'$pull': {'member_ids': {'$in': user_ids}}})
+        current = set(before.get('member_ids') or [])
+        return [user_id for user_id in user_ids if user_id in current]
+
+    with transaction.atomic():
+        team = Team.objects.select_for_update().only('member_ids').get(pk=team_id)
+        removed = [user_id for user_id in user_ids if user_id in team.member_ids]
+        if removed:
+            Team.objects.filter(pk=team_id).update(
+                member_ids=[user_id for user_id in team.member_ids if user_id not in removed]
+            )
+    return removed
+
+
+def _update_members(collection, team_id, update):
+    """Apply ``update`` to a team's member array and return the document before it"""
+    while True:
+        before = collection.find_one_and_update(
+            {'_id': team_id, 'member_ids': {'$type': 'array'}},
+            update,
+            projection={'member_ids': True}
+        )
+        if before is not None:
+            return before
+        team = collection.find_one({'_id': team_id}, projection={'member_ids': True})
+        if team is None:
+            raise Team.DoesNotExist(team_id)
+        legacy = team.get('member_ids')
+        if not isinstance(legacy, list):
+            # Matching the old value leaves a concurrent conversion in place
+            members = (json.loads(legacy) if isinstance(legacy, str) else None) or []
+            collection.update_one({'_id': team_id, 'member_ids': legacy}, {'$set': {'member_ids': members}})
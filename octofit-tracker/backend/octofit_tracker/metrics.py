@@ -0,0 +1,147 @@
+"""
+Per-request timing and database metrics.
+
+MetricsMiddleware times every request, counts the database commands it
+issued (see ``instrumentation.track_db``) and measures the response body.
+Observations are labelled with the URL name, the viewset action and the
+HTTP method, and kept in Prometheus histograms that ``metrics_view`` serves
+at ``/api/metrics`` in the text exposition format.
+
+Each response also carries a ``Server-Timing`` header with the database and
+application time of the request, which browser dev tools display.
+
+Histograms are per process; a scraper should target every worker.
+"""
+import asyncio
+import bisect
+import threading
+import time
+
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .instrumentation import track_db
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMMANDS_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LABELS = ('view', 'action', 'method')
+METHODS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """A labelled Prometheus histogram"""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['counts'][index] += 1
+            series['count'] += 1
+            series['sum'] += value
+
+    def samples(self, labels):
+        """Return the recorded (count, sum) for ``labels``"""
+        with self._lock:
+            series = self._series.get(labels, {'count': 0, 'sum': 0})
+            return series['count'], series['sum']
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for labels, data in series:
+                label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(LABELS, labels))
+                cumulative = 0
+                for bound, count in zip(self.buckets, data['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {data["count"]}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {data["sum"]}')
+                lines.append(f'{self.name}_count{{{label_text}}} {data["count"]}')
+        return '\n'.join(lines)
+
+
+REQUEST_SECONDS = Histogram(
+    'octofit_request_duration_seconds', 'Time to produce the response.', SECONDS_BUCKETS
+)
+DB_COMMANDS = Histogram(
+    'octofit_request_db_commands', 'Database commands issued per request.', COMMANDS_BUCKETS
+)
+DB_SECONDS = Histogram(
+    'octofit_request_db_duration_seconds', 'Time spent in database commands per request.', SECONDS_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    'octofit_response_size_bytes', 'Size of the response body.', BYTES_BUCKETS
+)
+HISTOGRAMS = (REQUEST_SECONDS, DB_COMMANDS, DB_SECONDS, RESPONSE_BYTES)
+
+
+def metrics_view(request):
+    """Serve every histogram in the Prometheus text format"""
+    body = '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+    return HttpResponse(body, content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Record the latency, database work and size of every response"""
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with track_db() as db:
+            response = self.get_response(request)
+        return self.record(request, response, db, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with track_db() as db:
+            response = await self.get_response(request)
+        return self.record(request, response, db, time.perf_counter() - started)
+
+    def record(self, request, response, db, elapsed):
+        labels = request_labels(request)
+        REQUEST_SECONDS.observe(labels, elapsed)
+        DB_COMMANDS.observe(labels, db.commands)
+        DB_SECONDS.observe(labels, db.duration)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(labels, len(response.content))
+
+        response['Server-Timing'] = (
+            f'db;dur={db.duration * 1000:.2f};desc="{db.commands} commands", '
+            f'app;dur={max(elapsed - db.duration, 0) * 1000:.2f}, '
+            f'total;dur={elapsed * 1000:.2f}'
+        )
+        return response
+
+
+def request_labels(request):
+    """Return the (view, action, method) labels of a handled request"""
+    method = request.method if request.method in METHODS else 'other'
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ('unmatched', '', method)
+
+    view = match.url_name or match.view_name or ''
+    actions = getattr(match.func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower(), '')
+    else:
+        action = getattr(match.func, '__name__', '')
+    return (view, action, method)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
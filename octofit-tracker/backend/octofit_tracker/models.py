@@ -1,6 +1,8 @@
 from django.db import models
 from bson import ObjectId
 
+from .fields import NativeJSONField
+
 
 class User(models.Model):
     """User model for OctoFit Tracker"""
@@ -32,9 +34,13 @@ class Team(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     captain_id = models.CharField(max_length=24)
-    member_ids = models.JSONField(default=list)
+    member_ids = NativeJSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
     total_points = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0, help_text="Total duration in minutes")
+    total_calories = models.IntegerField(default=0)
+    member_count = models.IntegerField(default=0)
 
     class Meta:
         db_table = 'teams'
@@ -48,6 +54,27 @@ class Team(models.Model):
         return self.name
 
 
+class TeamMembership(models.Model):
+    """Index of Team.member_ids by user, used to find a user's teams"""
+    _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
+    team_id = models.CharField(max_length=24)
+    user_id = models.CharField(max_length=24)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'team_memberships'
+        unique_together = [('team_id', 'user_id')]
+        indexes = [models.Index(fields=['user_id'])]
+
+    def save(self, *args, **kwargs):
+        if not self._id:
+            self._id = str(ObjectId())
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user_id} in {self.team_id}"
+
+
 class Activity(models.Model):
     """Activity model for OctoFit Tracker"""
     _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
@@ -63,7 +90,11 @@ class Activity(models.Model):
 
     class Meta:
         db_table = 'activities'
-        ordering = ['-date']
+        ordering = ['-date', '-_id']
+        indexes = [
+            models.Index(fields=['user_id', '-date', '-_id']),
+            models.Index(fields=['-date', '-_id']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self._id:
@@ -74,6 +105,30 @@ class Activity(models.Model):
         return f"{self.activity_type} - {self.duration} mins"
 
 
+class DailyActivityRollup(models.Model):
+    """Per-user, per-activity-type totals for one day"""
+    _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
+    user_id = models.CharField(max_length=24)
+    activity_type = models.CharField(max_length=100)
+    day = models.DateField()
+    total_activities = models.IntegerField(default=0)
+    total_points = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0, help_text="Total duration in minutes")
+    total_calories = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'activity_rollups_daily'
+        unique_together = [('user_id', 'day', 'activity_type')]
+
+    def save(self, *args, **kwargs):
+        if not self._id:
+            self._id = str(ObjectId())
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user_id} {self.activity_type} on {self.day}"
+
+
 class Leaderboard(models.Model):
     """Leaderboard model for OctoFit Tracker"""
     _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
@@ -83,12 +138,14 @@ class Leaderboard(models.Model):
     total_activities = models.IntegerField(default=0)
     total_duration = models.IntegerField(default=0, help_text="Total duration in minutes")
     rank = models.IntegerField(default=0)
+    dense_rank = models.IntegerField(default=0, help_text="Rank without gaps after ties, as of the last recompute")
     last_activity_date = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'leaderboard'
         ordering = ['-total_points']
+        indexes = [models.Index(fields=['-total_points', 'user_id'])]
 
     def save(self, *args, **kwargs):
         if not self._id:
@@ -99,6 +156,32 @@ class Leaderboard(models.Model):
         return f"{self.username} - {self.total_points} points"
 
 
+class WindowedLeaderboard(models.Model):
+    """One user's totals on the leaderboard of a day, ISO week or month"""
+    _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
+    window = models.CharField(max_length=10, help_text="day, week or month")
+    period = models.CharField(max_length=10, help_text="e.g. 2026-10-18, 2026-W42 or 2026-10")
+    user_id = models.CharField(max_length=24)
+    username = models.CharField(max_length=100)
+    total_points = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0, help_text="Total duration in minutes")
+
+    class Meta:
+        db_table = 'leaderboard_windowed'
+        ordering = ['-total_points', 'user_id']
+        unique_together = [('window', 'period', 'user_id')]
+        indexes = [models.Index(fields=['window', 'period', '-total_points', 'user_id'])]
+
+    def save(self, *args, **kwargs):
+        if not self._id:
+            self._id = str(ObjectId())
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.username} - {self.total_points} points in {self.period}"
+
+
 class Workout(models.Model):
     """Workout recommendation model for OctoFit Tracker"""
     _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
@@ -114,6 +197,10 @@ class Workout(models.Model):
 
     class Meta:
         db_table = 'workouts'
+        indexes = [
+            models.Index(fields=['fitness_level', 'activity_type']),
+            models.Index(fields=['activity_type']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self._id:
@@ -122,3 +209,61 @@ class Workout(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.fitness_level})"
+
+
+class WorkoutRecommendation(models.Model):
+    """A user's precomputed workout recommendations, best first"""
+    _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
+    user_id = models.CharField(max_length=24, unique=True)
+    workout_ids = NativeJSONField(default=list)
+    catalogue = models.CharField(max_length=40, help_text="Fingerprint of the workouts scored")
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'workout_recommendations'
+
+    def save(self, *args, **kwargs):
+        if not self._id:
+            self._id = str(ObjectId())
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Recommendations for {self.user_id}"
+
+
+class SearchTerm(models.Model):
+    """One term of a workout or activity in the full-text search index"""
+    _id = models.CharField(max_length=24, primary_key=True, default='', editable=False)
+    kind = models.CharField(max_length=20, help_text="Model of the indexed document")
+    term = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=24)
+    owner_id = models.CharField(max_length=24, blank=True, help_text="User the document belongs to, if any")
+    weight = models.FloatField(help_text="Field-weighted occurrences of the term")
+
+    class Meta:
+        db_table = 'search_terms'
+        indexes = [
+            models.Index(fields=['kind', 'term', 'owner_id', '-weight']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._id:
+            self._id = str(ObjectId())
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.term} in {self.kind} {self.object_id}"
+
+
+class CacheVersion(models.Model):
+    """Current version of a response cache namespace, shared by every worker"""
+    _id = models.CharField(max_length=50, primary_key=True, help_text="Namespace name")
+    epoch = models.CharField(max_length=24, help_text="Random id of this counter, new if it is ever recreated")
+    version = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'cache_versions'
+
+    def __str__(self):
+        return f"{self._id} v{self.epoch}.{self.version}"
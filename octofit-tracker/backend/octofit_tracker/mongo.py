@@ -0,0 +1,89 @@
+"""
+Helpers for reaching the MongoDB collections behind the djongo models.
+
+djongo translates ORM queries into MongoDB commands, but it cannot express
+server-side operators such as ``$inc``, ``$max`` or ``$addToSet``. Code that
+needs them asks for the raw pymongo collection here and falls back to the
+ORM when the model lives on a SQL backend (for example in tests).
+
+Async views use ``get_async_collection()``, the motor equivalent, so their
+queries never block the event loop.
+"""
+import asyncio
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+from pymongo.errors import PyMongoError
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # pragma: no cover - only needed for djongo under ASGI
+    AsyncIOMotorClient = None
+
+_async_clients = {}
+
+
+def get_collection(model, using=None):
+    """
+    Return the pymongo collection backing ``model``.
+
+    Returns None when the model's database is not a djongo connection.
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor != 'djongo':
+        return None
+    connection.ensure_connection()
+    return connection.connection[model._meta.db_table]
+
+
+def db_value(model, field_name, value, using=None):
+    """Convert ``value`` to the form djongo stores for ``model.field_name``"""
+    using = using or router.db_for_write(model)
+    return model._meta.get_field(field_name).get_db_prep_value(value, connections[using])
+
+
+def replication_lag(using):
+    """
+    Return how many seconds the replica set member behind ``using`` trails
+    its primary.
+
+    Non-djongo connections count as current (0). Returns None when the lag
+    cannot be determined, e.g. the server is not part of a replica set.
+    """
+    connection = connections[using]
+    if connection.vendor != 'djongo':
+        return 0
+    try:
+        connection.ensure_connection()
+        members = connection.connection.client.admin.command('replSetGetStatus')['members']
+    except PyMongoError:
+        return None
+
+    primary = next((member for member in members if member['stateStr'] == 'PRIMARY'), None)
+    current = next((member for member in members if member.get('self')), None)
+    if primary is None or current is None:
+        return None
+    return max((primary['optimeDate'] - current['optimeDate']).total_seconds(), 0)
+
+
+def get_async_collection(model, using=None):
+    """
+    Return the motor collection backing ``model`` on the running event loop.
+
+    Returns None when the model's database is not a djongo connection.
+    Datetimes are decoded as aware UTC values, like the ORM returns them.
+    """
+    using = using or router.db_for_read(model)
+    connection = connections[using]
+    if connection.vendor != 'djongo':
+        return None
+    if AsyncIOMotorClient is None:
+        raise ImproperlyConfigured('The async views need the motor package on MongoDB')
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(using)
+    if client is None or client.get_io_loop() is not loop:
+        client = AsyncIOMotorClient(**connection.settings_dict.get('CLIENT', {}), tz_aware=True, io_loop=loop)
+        _async_clients[using] = client
+    return client[connection.settings_dict['NAME']][model._meta.db_table]
@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination for activity listings.
+
+Pages are ordered newest first on ``(date, _id)`` and each cursor encodes the
+last row of the previous page, so fetching a page is an index range scan of
+``page_size`` rows no matter how deep the client has scrolled. Rows inserted
+while a client is paging never shift or duplicate the rows it has yet to see.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Activity, Leaderboard
+from .mongo import get_collection
+
+
+class ActivityCursorPagination(BasePagination):
+    """
+    Forward-only cursor pagination over activities.
+
+    ``?page_size=`` picks the page size and ``?count=estimated`` adds an
+    ``estimated_count`` computed without counting the matching rows. Views
+    provide the estimate through an ``estimate_activity_count()`` method.
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-date', '-_id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            date, pk = position
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, _id__lt=pk))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+
+        self.estimated_count = None
+        if request.query_params.get('count') == 'estimated' and hasattr(view, 'estimate_activity_count'):
+            self.estimated_count = view.estimate_activity_count()
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.estimated_count is not None:
+            response['estimated_count'] = self.estimated_count
+        return Response(response)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        # Pages hold model instances or, on the fast path, values() rows
+        if isinstance(last, dict):
+            date, pk = last['date'], last['_id']
+        else:
+            date, pk = last.date, last._id
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(date, pk)
+        )
+
+    def encode_cursor(self, date, pk):
+        payload = json.dumps([date.isoformat(), pk]).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            date = parse_datetime(date)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None or not isinstance(pk, str):
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+
+def estimate_activity_count(user_id=None):
+    """
+    Approximate the number of activities without a count() scan.
+
+    A user's count comes from their maintained leaderboard entry; the global
+    count comes from the collection metadata on MongoDB and is unavailable
+    (None) on other backends.
+    """
+    if user_id is not None:
+        return (
+            Leaderboard.objects.filter(user_id=user_id)
+            .values_list('total_activities', flat=True)
+            .first()
+        ) or 0
+
+    collection = get_collection(Activity)
+    if collection is not None:
+        return collection.estimated_document_count()
+    return None
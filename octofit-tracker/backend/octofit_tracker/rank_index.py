@@ -0,0 +1,194 @@
+"""
+In-process order-statistic index of the leaderboard.
+
+``RankIndex`` keeps ``(-total_points, user_id)`` keys in a sorted list, so a
+user's exact rank, the entries around them and the top of the board are all
+found in logarithmic time instead of sorting the board.
+
+``board`` indexes the all-time Leaderboard. The WSGI and ASGI entry points
+start loading it in the background as a worker boots (``warm()``), so the
+first rank request does not pay for the load; elsewhere (management
+commands, tests) it loads on first use. It follows every change made in
+this process through ``leaderboard.apply_delta`` and Leaderboard model
+signals, and reloads every ``OCTOFIT_RANK_INDEX_REFRESH`` seconds (never if
+None) to pick up writes made by other workers. Writers that bypass both
+(e.g. ``synthetic.populate``) call ``board.invalidate()``.
+
+A reload reads and sorts the board outside the index lock, which is only
+held to swap the new lists in. Changes applied meanwhile are replayed onto
+them, and readers keep using the previous lists until the swap rather than
+waiting for the reload (only the very first load blocks them).
+
+Ranks follow competition ranking, like ``leaderboard.py``.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from sortedcontainers import SortedList
+
+from .models import Leaderboard
+from .replicas import PRIMARY
+
+DEFAULT_REFRESH = 60
+
+
+class RankIndex:
+    """
+    Order-statistic index of scores by id, loaded lazily by ``loader``.
+
+    ``loader`` returns ``(id, score)`` pairs; ids are user ids on the
+    leaderboards and team ids on the team rankings.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._keys = SortedList()
+        self._points = {}
+        self._loaded_at = None
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        # Changes seen while a reload runs, as (id, score or None), and a
+        # counter of invalidations so a reload can tell it was overtaken
+        self._pending = None
+        self._generation = 0
+
+    @property
+    def loaded(self):
+        """Whether the index is in memory and following updates"""
+        return self._loaded_at is not None
+
+    def warm(self):
+        """Start loading the index on a background thread; if that fails it loads on first use"""
+        def load():
+            try:
+                self._ensure_loaded()
+            finally:
+                connections.close_all()
+        threading.Thread(target=load, daemon=True).start()
+
+    def invalidate(self):
+        """Reload from the database on next use"""
+        with self._lock:
+            self._loaded_at = None
+            self._generation += 1
+
+    def update(self, user_id, points):
+        """Set a user's points"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((user_id, points))
+            if self._loaded_at is None:
+                return
+            previous = self._points.get(user_id)
+            if previous is not None:
+                self._keys.remove((-previous, user_id))
+            self._points[user_id] = points
+            self._keys.add((-points, user_id))
+
+    def discard(self, user_id):
+        """Remove a user from the index"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((user_id, None))
+            if self._loaded_at is None:
+                return
+            previous = self._points.pop(user_id, None)
+            if previous is not None:
+                self._keys.remove((-previous, user_id))
+
+    def __len__(self):
+        self._ensure_loaded()
+        with self._lock:
+            return len(self._keys)
+
+    def rank(self, user_id):
+        """Return the user's competition rank, or None if not on the board"""
+        self._ensure_loaded()
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return self._rank_of(points)
+
+    def around(self, user_id, window):
+        """
+        Return ``(above, entry, below)`` for a user, or None if not on the board.
+
+        Each entry is ``(user_id, points, rank)``; ``above`` and ``below`` hold
+        at most ``window`` entries, nearest last and first respectively.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            position = self._keys.index((-points, user_id))
+            above = self._keys[max(position - window, 0):position]
+            below = self._keys[position + 1:position + 1 + window]
+            return (
+                [self._entry(key) for key in above],
+                self._entry(self._keys[position]),
+                [self._entry(key) for key in below]
+            )
+
+    def top(self, count=None, offset=0):
+        """
+        Return the best ``count`` (default all) entries after the first
+        ``offset`` as ``(user_id, points, rank)``
+        """
+        self._ensure_loaded()
+        with self._lock:
+            stop = None if count is None else offset + count
+            return [self._entry(key) for key in self._keys.islice(offset, stop)]
+
+    def _entry(self, key):
+        return (key[1], -key[0], self._rank_of(-key[0]))
+
+    def _rank_of(self, points):
+        return self._keys.bisect_left((-points,)) + 1
+
+    def _fresh(self):
+        refresh = getattr(settings, 'OCTOFIT_RANK_INDEX_REFRESH', DEFAULT_REFRESH)
+        loaded_at = self._loaded_at
+        return loaded_at is not None and (refresh is None or time.monotonic() - loaded_at < refresh)
+
+    def _ensure_loaded(self):
+        """Reload when stale, building the new lists without holding the index lock"""
+        if self._fresh():
+            return
+        # While one thread reloads, the others serve the previous lists
+        if not self._reload_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._fresh():
+                return
+            with self._lock:
+                self._pending = []
+                generation = self._generation
+            started = time.monotonic()
+            points = dict(self.loader())
+            keys = SortedList((-score, key) for key, score in points.items())
+            with self._lock:
+                for key, score in self._pending:
+                    previous = points.pop(key, None)
+                    if previous is not None:
+                        keys.remove((-previous, key))
+                    if score is not None:
+                        points[key] = score
+                        keys.add((-score, key))
+                self._points, self._keys = points, keys
+                # An invalidation during the reload may postdate what was read
+                self._loaded_at = started if generation == self._generation else None
+        finally:
+            with self._lock:
+                self._pending = None
+            self._reload_lock.release()
+
+
+def _load_leaderboard():
+    return Leaderboard.objects.using(PRIMARY).values_list('user_id', 'total_points').iterator()
+
+
+board = RankIndex(_load_leaderboard)
@@ -0,0 +1,210 @@
+"""
+Bulk recomputation of leaderboard ranks.
+
+Ranks are assigned in one pass over the board sorted by points, and only the
+rows whose rank actually changed are written back, in batches. Large boards
+are read in partitions that are handed to a process pool to sort as soon as
+they are read, then merged. A board that fits in one partition is sorted in
+process, without starting a pool.
+
+Two tie policies are supported, each stored in its own column:
+
+* ``competition`` (1, 2, 2, 4) in ``rank``: tied entries share a rank and
+  the next rank skips ahead. The incremental updates in ``leaderboard.py``
+  keep it current, so it is the default.
+* ``dense`` (1, 2, 2, 3) in ``dense_rank``: tied entries share a rank with
+  no gaps. A single activity can change the dense rank of every entry below
+  it, so it is only written here and trails activity writes until the next
+  recompute.
+
+``start_recompute()`` runs a recompute on a background thread for the API,
+so a request never waits for (or forks) the sort; the job's state is kept
+in the worker that started it.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from bson import ObjectId
+from django.db import connection
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from .cache import invalidate
+from .models import Leaderboard
+from .mongo import get_collection
+
+COMPETITION = 'competition'
+DENSE = 'dense'
+RANKING_METHODS = (COMPETITION, DENSE)
+# Leaderboard column holding each method's ranks
+RANK_FIELDS = {COMPETITION: 'rank', DENSE: 'dense_rank'}
+
+PARTITION_SIZE = 50000
+BATCH_SIZE = 1000
+# Job states reported by recompute_job()
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_job = None
+_job_thread = None
+_job_lock = threading.Lock()
+
+
+def recompute_rankings(method=COMPETITION, partition_size=PARTITION_SIZE,
+                       batch_size=BATCH_SIZE, max_workers=None):
+    """
+    Recompute every leaderboard rank of ``method`` and return a report of
+    the run.
+
+    The report holds the number of rows scanned, the number of rows whose
+    rank changed and the elapsed time in milliseconds.
+    """
+    if method not in RANKING_METHODS:
+        raise ValueError(f'Unknown ranking method: {method}')
+    field = RANK_FIELDS[method]
+
+    started = time.perf_counter()
+    partitions = _read_partitions(partition_size, field)
+    first = next(partitions, [])
+    second = next(partitions, None)
+    if second is None:
+        partitions = [sorted(first)]
+    else:
+        # Spawned workers only need ``sorted``, and spawning is safe from
+        # the threads of a running server, unlike forking
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('spawn')) as pool:
+            partitions = _sort_in_pool(
+                pool, itertools.chain((first, second), partitions), 2 * (max_workers or os.cpu_count() or 1)
+            )
+    rows_scanned = sum(len(partition) for partition in partitions)
+
+    rows_changed = 0
+    pending = []
+    for pk, rank, current in assign_ranks(heapq.merge(*partitions), method):
+        if rank == current:
+            continue
+        pending.append((pk, rank))
+        if len(pending) >= batch_size:
+            rows_changed += _write_ranks(pending, field)
+            pending = []
+    if pending:
+        rows_changed += _write_ranks(pending, field)
+    if rows_changed:
+        invalidate('leaderboard')
+
+    return {
+        'method': method,
+        'rows_scanned': rows_scanned,
+        'rows_changed': rows_changed,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def start_recompute(method=COMPETITION):
+    """
+    Run ``recompute_rankings(method)`` on a background thread unless a
+    recompute is already running. Returns ``(job, started)``.
+    """
+    global _job, _job_thread
+    if method not in RANKING_METHODS:
+        raise ValueError(f'Unknown ranking method: {method}')
+    with _job_lock:
+        if _job is not None and _job['status'] == RUNNING:
+            return dict(_job), False
+        _job = {'id': str(ObjectId()), 'method': method, 'status': RUNNING, 'started_at': timezone.now()}
+        _job_thread = threading.Thread(target=_run_job, args=(_job,), daemon=True)
+        _job_thread.start()
+        return dict(_job), True
+
+
+def recompute_job():
+    """Return the state of the last recompute started in this worker, or None"""
+    with _job_lock:
+        return dict(_job) if _job is not None else None
+
+
+def wait_for_recompute(timeout=None):
+    """Block until the running recompute, if any, has finished"""
+    thread = _job_thread
+    if thread is not None:
+        thread.join(timeout)
+
+
+def _run_job(job):
+    try:
+        report = recompute_rankings(method=job['method'])
+    except Exception as error:
+        update = {'status': FAILED, 'error': str(error)}
+    else:
+        update = {'status': DONE, **report}
+    finally:
+        connection.close()
+    with _job_lock:
+        job.update(update, finished_at=timezone.now())
+
+
+def assign_ranks(rows, method=COMPETITION):
+    """
+    Yield ``(pk, new_rank, current_rank)`` for rows sorted best-first.
+
+    Each row is a ``(-total_points, user_id, pk, current_rank)`` tuple.
+    """
+    previous = None
+    rank = 0
+    for position, (negated_points, _user_id, pk, current) in enumerate(rows, start=1):
+        if negated_points != previous:
+            rank = position if method == COMPETITION else rank + 1
+            previous = negated_points
+        yield pk, rank, current
+
+
+def _read_partitions(partition_size, field):
+    """Stream the board as unsorted lists of at most ``partition_size`` rows"""
+    rows = (
+        Leaderboard.objects.order_by()
+        .values_list('total_points', 'user_id', '_id', field)
+        .iterator(chunk_size=min(partition_size, 2000))
+    )
+    partition = []
+    for total_points, user_id, pk, rank in rows:
+        partition.append((-total_points, user_id, pk, rank))
+        if len(partition) >= partition_size:
+            yield partition
+            partition = []
+    if partition:
+        yield partition
+
+
+def _sort_in_pool(pool, partitions, max_pending):
+    """Sort partitions in ``pool`` while the next are read, at most ``max_pending`` at a time"""
+    pending = deque()
+    done = []
+    for partition in partitions:
+        pending.append(pool.submit(sorted, partition))
+        if len(pending) >= max_pending:
+            done.append(pending.popleft().result())
+    done.extend(future.result() for future in pending)
+    return done
+
+
+def _write_ranks(pending, field):
+    """Write a batch of ``(pk, rank)`` pairs to ``field`` and return how many were written"""
+    collection = get_collection(Leaderboard)
+    if collection is not None:
+        collection.bulk_write(
+            [UpdateOne({'_id': pk}, {'$set': {field: rank}}) for pk, rank in pending],
+            ordered=False
+        )
+    else:
+        Leaderboard.objects.bulk_update(
+            [Leaderboard(_id=pk, **{field: rank}) for pk, rank in pending],
+            [field]
+        )
+    return len(pending)
@@ -0,0 +1,261 @@
+"""
+History-aware workout recommendations.
+
+Every workout in the catalogue and every user are described in the same
+feature space:
+
+* the share of training time per activity type (a workout is all one type),
+* the fitness level, one-hot,
+* the typical session duration and calories, scaled by the catalogue's
+  largest values.
+
+Each block is weighted by ``WEIGHTS`` and users are matched to workouts by
+cosine similarity. The catalogue is compiled once into a NumPy matrix of
+normalized rows; a batch of users is stacked into a matrix of normalized
+profiles and scored with one ``profiles @ catalogue.T`` product, then each
+row's best workouts are picked with a stable argsort. Without NumPy (it is in
+requirements.txt) the same scores come from a plain Python loop per user.
+
+A user's profile comes from their DailyActivityRollup buckets of the last
+``RECENT_DAYS`` days. The best ``TOP_N`` workouts per user are stored in
+WorkoutRecommendation:
+
+* ``refresh_all()`` precomputes every user in batches;
+* as an activity listener, this module refreshes a user whenever one of
+  their activities is logged, edited or deleted;
+* ``recommended_workout_ids()`` serves a user with one indexed lookup.
+
+Entries remember the catalogue fingerprint they were scored against; an
+entry scored against another catalogue is recomputed when read.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from bson import ObjectId
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from .cache import get_response_cache
+from .models import DailyActivityRollup, User, Workout, WorkoutRecommendation
+from .mongo import get_collection
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - slow plain-Python scoring per user
+    numpy = None
+
+RECENT_DAYS = 28
+TOP_N = 5
+BATCH_SIZE = 1000
+# Seconds before the compiled catalogue is rebuilt to see other workers' edits
+CATALOGUE_TTL = 60
+FITNESS_LEVELS = ('beginner', 'intermediate', 'advanced')
+WEIGHTS = {
+    'activity_type': 1.0,
+    'fitness_level': 0.6,
+    'duration': 0.4,
+    'calories': 0.4
+}
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+class Catalogue:
+    """The workout catalogue compiled into a feature matrix"""
+
+    def __init__(self, workouts):
+        workouts = sorted(workouts, key=lambda workout: workout['_id'])
+        self.workout_ids = [workout['_id'] for workout in workouts]
+        self.activity_types = sorted({workout['activity_type'] for workout in workouts})
+        self.max_duration = max((workout['duration'] for workout in workouts), default=0) or 1
+        self.max_calories = max((workout['calories_estimate'] for workout in workouts), default=0) or 1
+        self.width = len(self.activity_types) + len(FITNESS_LEVELS) + 2
+        self.matrix = _normalize_rows([
+            self.vector(
+                {workout['activity_type']: 1.0},
+                workout['fitness_level'],
+                workout['duration'],
+                workout['calories_estimate']
+            )
+            for workout in workouts
+        ], self.width)
+        self.fingerprint = hashlib.sha1(repr([
+            (workout['_id'], workout['activity_type'], workout['fitness_level'],
+             workout['duration'], workout['calories_estimate'])
+            for workout in workouts
+        ]).encode('utf-8')).hexdigest()
+
+    def vector(self, mix, fitness_level, duration, calories):
+        """Return the weighted feature vector of a workout or user profile"""
+        return [
+            *(WEIGHTS['activity_type'] * mix.get(activity_type, 0.0) for activity_type in self.activity_types),
+            *(WEIGHTS['fitness_level'] * (level == fitness_level) for level in FITNESS_LEVELS),
+            WEIGHTS['duration'] * min((duration or 0) / self.max_duration, 1.0),
+            WEIGHTS['calories'] * min((calories or 0) / self.max_calories, 1.0)
+        ]
+
+    def rank(self, profiles):
+        """Return the ids of the ``TOP_N`` workouts closest to each profile, keyed like ``profiles``"""
+        keys = list(profiles)
+        users = _normalize_rows([self.vector(**profiles[key]) for key in keys], self.width)
+        if numpy is not None:
+            scores = users @ self.matrix.T
+            # Stable, so equal scores keep the catalogue order
+            best = numpy.argsort(-scores, axis=1, kind='stable')[:, :TOP_N]
+            return {key: [self.workout_ids[index] for index in row] for key, row in zip(keys, best.tolist())}
+
+        ranked = {}
+        for key, user in zip(keys, users):
+            scores = [sum(a * b for a, b in zip(row, user)) for row in self.matrix]
+            order = sorted(range(len(scores)), key=lambda index: -scores[index])
+            ranked[key] = [self.workout_ids[index] for index in order[:TOP_N]]
+        return ranked
+
+
+def catalogue():
+    """Return the compiled catalogue, rebuilding it after workout changes"""
+    global _catalogue
+    version = get_response_cache().get_version('workouts')
+    now = time.monotonic()
+    with _catalogue_lock:
+        if _catalogue is None or _catalogue[0] != version or now - _catalogue[1] >= CATALOGUE_TTL:
+            workouts = Workout.objects.values('_id', 'activity_type', 'fitness_level', 'duration', 'calories_estimate')
+            _catalogue = (version, now, Catalogue(list(workouts)))
+        return _catalogue[2]
+
+
+def recommended_workout_ids(user_id):
+    """
+    Return a user's recommended workout ids, best first.
+
+    Served from the precomputed entry when it matches the current catalogue,
+    otherwise recomputed. Returns None for unknown users.
+    """
+    current = catalogue()
+    entry = WorkoutRecommendation.objects.filter(user_id=user_id).values('workout_ids', 'catalogue').first()
+    if entry is not None and entry['catalogue'] == current.fingerprint:
+        return entry['workout_ids']
+    return refresh_users([user_id]).get(user_id)
+
+
+def refresh_users(user_ids):
+    """Recompute and store the recommendations of the given users"""
+    current = catalogue()
+    ranked = current.rank(profiles(user_ids))
+    _write(ranked, current.fingerprint)
+    return ranked
+
+
+def refresh_all(batch_size=BATCH_SIZE):
+    """Precompute the recommendations of every user; returns the number stored"""
+    written = 0
+    batch = []
+    for user_id in User.objects.order_by('_id').values_list('_id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            written += len(refresh_users(batch))
+            batch = []
+    if batch:
+        written += len(refresh_users(batch))
+    return written
+
+
+def profiles(user_ids):
+    """Return the activity profile of each known user in ``user_ids``"""
+    levels = dict(User.objects.filter(_id__in=list(user_ids)).values_list('_id', 'fitness_level'))
+    since = timezone.localdate() - timedelta(days=RECENT_DAYS)
+    rollups = DailyActivityRollup.objects.filter(user_id__in=list(levels), day__gt=since).values_list(
+        'user_id', 'activity_type', 'total_activities', 'total_duration', 'total_calories'
+    )
+
+    totals = {user_id: {'minutes': {}, 'activities': 0, 'duration': 0, 'calories': 0} for user_id in levels}
+    for user_id, activity_type, activities, duration, calories in rollups:
+        user = totals[user_id]
+        user['minutes'][activity_type] = user['minutes'].get(activity_type, 0) + duration
+        user['activities'] += activities
+        user['duration'] += duration
+        user['calories'] += calories
+
+    result = {}
+    for user_id, user in totals.items():
+        count = user['activities']
+        result[user_id] = {
+            'mix': {
+                activity_type: minutes / user['duration']
+                for activity_type, minutes in user['minutes'].items()
+            } if user['duration'] else {},
+            'fitness_level': levels[user_id],
+            'duration': user['duration'] / count if count else None,
+            'calories': user['calories'] / count if count else None
+        }
+    return result
+
+
+def record_activity(activity):
+    """Refresh the recommendations of a user who logged an activity"""
+    refresh_users([activity.user_id])
+
+
+def record_activities(activities):
+    """Refresh the recommendations of every user in a batch once"""
+    refresh_users({activity.user_id for activity in activities})
+
+
+def discard_activity(activity):
+    """Refresh the recommendations of a user whose activity was deleted"""
+    refresh_users([activity.user_id])
+
+
+def replace_activity(previous, activity):
+    """Refresh the recommendations of the users of an edited activity"""
+    refresh_users({previous.user_id, activity.user_id})
+
+
+def _write(ranked, fingerprint):
+    if not ranked:
+        return
+    now = timezone.now()
+    collection = get_collection(WorkoutRecommendation)
+    if collection is not None:
+        collection.bulk_write([
+            UpdateOne(
+                {'user_id': user_id},
+                {
+                    '$set': {'workout_ids': workout_ids, 'catalogue': fingerprint, 'updated_at': now},
+                    '$setOnInsert': {'_id': str(ObjectId())}
+                },
+                upsert=True
+            )
+            for user_id, workout_ids in ranked.items()
+        ], ordered=False)
+        return
+
+    WorkoutRecommendation.objects.filter(user_id__in=list(ranked)).delete()
+    WorkoutRecommendation.objects.bulk_create([
+        WorkoutRecommendation(
+            _id=str(ObjectId()),
+            user_id=user_id,
+            workout_ids=workout_ids,
+            catalogue=fingerprint,
+            updated_at=now
+        )
+        for user_id, workout_ids in ranked.items()
+    ], ignore_conflicts=True)
+
+
+def _normalize_rows(rows, width):
+    """Scale each row to unit length, leaving all-zero rows as they are"""
+    if numpy is not None:
+        matrix = numpy.array(rows, dtype=float).reshape(len(rows), width)
+        norms = numpy.linalg.norm(matrix, axis=1, keepdims=True)
+        return numpy.divide(matrix, norms, out=matrix.copy(), where=norms > 0)
+    return [_normalize(row) for row in rows]
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
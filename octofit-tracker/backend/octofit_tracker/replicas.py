@@ -0,0 +1,246 @@
+"""
+Read-replica routing.
+
+ReplicaRoutingMiddleware lets safe (GET/HEAD/OPTIONS) requests read from the
+aliases in ``OCTOFIT_READ_REPLICAS['ALIASES']``. Writes, and every read
+outside such a request (management commands, signal handlers), go to the
+primary ``default`` database.
+
+Each endpoint declares how stale its data may be with ``@max_staleness()`` on
+a view, viewset action or viewset class. A replica only serves the read if
+its replication lag is within that tolerance; otherwise the primary does.
+The replica is picked once per request (or ``replica_reads()`` block), so
+all of its reads, e.g. a list and its count, see the same point in time.
+
+Lags are probed in the background at most once per ``LAG_CHECK_INTERVAL``;
+routing only reads the last probed value and never waits on the server, so
+it is safe on the event loop of the async views. A replica that has not
+been probed yet counts as too stale.
+
+After a client's successful write, its reads are pinned to the primary for
+``READ_AFTER_WRITE_SECONDS``, so it always sees its own writes. The pin is
+kept in the ``PIN_CACHE`` cache under the client's credentials (its
+Authorization header, else its session cookie, else its address), so API
+clients that drop cookies are pinned too; browsers also get a cookie.
+
+Replica aliases are ordinary ``DATABASES`` entries. In tests they can mirror
+``default`` (``'TEST': {'MIRROR': 'default'}``).
+"""
+import asyncio
+import contextlib
+import hashlib
+import math
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+from .mongo import replication_lag
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'octofit_read_primary'
+DEFAULTS = {
+    'ALIASES': [],
+    'DEFAULT_MAX_STALENESS': 5,
+    'READ_AFTER_WRITE_SECONDS': 10,
+    'LAG_CHECK_INTERVAL': 5,
+    'DECLARED_LAG': {},
+    # Cache alias holding the read-after-write pins; share it between workers
+    'PIN_CACHE': 'default'
+}
+
+_routing = ContextVar('octofit_replica_routing', default=None)
+_lag_cache = {}
+_lag_probes = {}
+_lag_lock = threading.Lock()
+
+
+class ReplicaRouting:
+    """Replica reads allowed for the current request or block, and the replica picked for them"""
+
+    def __init__(self, max_staleness):
+        self.max_staleness = max_staleness
+
+    @property
+    def max_staleness(self):
+        return self._max_staleness
+
+    @max_staleness.setter
+    def max_staleness(self, seconds):
+        # A new tolerance may rule out the replica picked for the old one
+        self._max_staleness = seconds
+        self.picked = False
+        self.alias = None
+
+
+def replica_config():
+    """Return ``OCTOFIT_READ_REPLICAS`` merged over the defaults"""
+    return {**DEFAULTS, **getattr(settings, 'OCTOFIT_READ_REPLICAS', {})}
+
+
+def max_staleness(seconds):
+    """
+    Let a view, viewset action or viewset read from replicas at most
+    ``seconds`` behind the primary; 0 always reads from the primary.
+    """
+    def decorator(view):
+        view.replica_max_staleness = seconds
+        return view
+    return decorator
+
+
+@contextlib.contextmanager
+def replica_reads(max_staleness=None):
+    """Route the ORM reads made inside the block like a safe request's"""
+    if max_staleness is None:
+        max_staleness = replica_config()['DEFAULT_MAX_STALENESS']
+    token = _routing.set(ReplicaRouting(max_staleness))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def read_alias():
+    """Return the replica the current context reads from, or None"""
+    routing = _routing.get()
+    if routing is None or not routing.max_staleness:
+        return None
+
+    if not routing.picked:
+        config = replica_config()
+        candidates = [
+            alias for alias in config['ALIASES']
+            if replica_lag(alias, config) <= routing.max_staleness
+        ]
+        routing.alias = random.choice(candidates) if candidates else None
+        routing.picked = True
+    return routing.alias
+
+
+def replica_lag(alias, config=None):
+    """
+    Return the last known replication lag of ``alias`` in seconds.
+
+    Declared lags win. Otherwise the probed lag is returned, and a new probe
+    is started in the background once it is older than
+    ``LAG_CHECK_INTERVAL``. A replica not probed yet, or that cannot be
+    probed, counts as infinitely stale.
+    """
+    config = config or replica_config()
+    if alias in config['DECLARED_LAG']:
+        return config['DECLARED_LAG'][alias]
+
+    now = time.monotonic()
+    with _lag_lock:
+        checked_at, lag = _lag_cache.get(alias, (None, math.inf))
+        probe = _lag_probes.get(alias)
+        if (checked_at is None or now - checked_at >= config['LAG_CHECK_INTERVAL']) and not (
+            probe is not None and probe.is_alive()
+        ):
+            probe = _lag_probes[alias] = threading.Thread(target=_probe_lag, args=(alias,), daemon=True)
+            probe.start()
+    return lag
+
+
+def _probe_lag(alias):
+    try:
+        lag = replication_lag(alias)
+    finally:
+        connections.close_all()
+    with _lag_lock:
+        _lag_cache[alias] = (time.monotonic(), math.inf if lag is None else lag)
+
+
+class ReplicaRouter:
+    """Send reads of safe requests to a fresh-enough replica, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Open a replica routing context for safe requests.
+
+    The tolerance comes from the resolved view; a successful write pins the
+    client's following reads to the primary.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _routing.set(self.routing_for(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        token = _routing.set(self.routing_for(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.process_response(request, response)
+
+    def routing_for(self, request):
+        if request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return None
+        config = replica_config()
+        if not config['ALIASES'] or caches[config['PIN_CACHE']].get(pin_key(request)):
+            return None
+        return ReplicaRouting(config['DEFAULT_MAX_STALENESS'])
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is not None:
+            staleness = view_staleness(view_func, request.method)
+            if staleness is not None:
+                routing.max_staleness = staleness
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            config = replica_config()
+            seconds = config['READ_AFTER_WRITE_SECONDS']
+            if config['ALIASES']:
+                caches[config['PIN_CACHE']].set(pin_key(request), True, seconds)
+            response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+
+def pin_key(request):
+    """Cache key of the read-after-write pin of the client making ``request``"""
+    client = (
+        request.headers.get('Authorization')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return f"replica-pin:{hashlib.sha1(client.encode('utf-8')).hexdigest()}"
+
+
+def view_staleness(view_func, method):
+    """Return the tolerance declared for the view handling ``method``, or None"""
+    viewset = getattr(view_func, 'cls', None)
+    if viewset is None:
+        return getattr(view_func, 'replica_max_staleness', None)
+
+    actions = getattr(view_func, 'actions', None) or {}
+    handler = getattr(viewset, actions.get(method.lower(), method.lower()), None)
+    return getattr(handler, 'replica_max_staleness', getattr(viewset, 'replica_max_staleness', None))
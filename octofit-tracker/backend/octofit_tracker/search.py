@@ -0,0 +1,183 @@
+"""
+Full-text search over workouts and activity notes.
+
+Documents are split into lowercase word terms and kept in an inverted index,
+the SearchTerm collection: one row per (document, term) holding the term's
+field-weighted number of occurrences. Rows also carry the document's owner
+(the user of an activity), so a user's activities are searched without
+reading anyone else's postings.
+
+``search()`` matches the documents that contain every term of the query. The
+rarest term is looked up first and the others only among its documents, so a
+query costs a few indexed lookups whatever the collection size. At most
+``MAX_CANDIDATES`` of the rarest term's postings are read, heaviest first.
+Matches are ranked by the sum of their term weights times each term's inverse document
+frequency.
+
+The index is updated on write: workouts through model signals, activities as
+an activity listener and from the admin through ``index_objects()``.
+``rebuild()`` reindexes everything, e.g. after a restore.
+"""
+import math
+import re
+
+from bson import ObjectId
+
+from .models import Activity, SearchTerm, Workout
+from .pagination import estimate_activity_count
+
+WORKOUT = 'workout'
+ACTIVITY = 'activity'
+
+# Indexed fields and their weights per kind of document
+FIELDS = {
+    WORKOUT: {'name': 3.0, 'description': 1.0, 'instructions': 1.0},
+    ACTIVITY: {'notes': 1.0, 'activity_type': 2.0}
+}
+MODELS = {WORKOUT: Workout, ACTIVITY: Activity}
+OWNER_FIELDS = {ACTIVITY: 'user_id'}
+# Most documents scored per query, taken from the rarest term's postings
+MAX_CANDIDATES = 5000
+MAX_TERM_LENGTH = 100
+BATCH_SIZE = 1000
+STOP_WORDS = frozenset(('a', 'an', 'and', 'at', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'))
+
+_WORD = re.compile(r'\w+')
+
+
+def terms(text):
+    """Split text into its index terms"""
+    return [
+        word for word in _WORD.findall(text.lower())
+        if word not in STOP_WORDS and len(word) <= MAX_TERM_LENGTH
+    ]
+
+
+def document_terms(kind, values):
+    """Return the weight of every term of a document, given its field values"""
+    weights = {}
+    for field, field_weight in FIELDS[kind].items():
+        value = values.get(field) or ''
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(item) for item in value)
+        for term in terms(str(value)):
+            weights[term] = weights.get(term, 0.0) + field_weight
+    return weights
+
+
+def postings(kind, values):
+    """Return a document's SearchTerm rows as field values, without ids"""
+    owner_field = OWNER_FIELDS.get(kind)
+    owner_id = values[owner_field] if owner_field else ''
+    return [
+        {'kind': kind, 'term': term, 'object_id': values['_id'], 'owner_id': owner_id, 'weight': weight}
+        for term, weight in document_terms(kind, values).items()
+    ]
+
+
+def search(kind, query, owner_id=None, limit=None):
+    """
+    Return ``(object_id, score)`` for the documents matching every term of
+    ``query``, best first. ``owner_id`` restricts the search to one user's
+    documents.
+    """
+    wanted = list(dict.fromkeys(terms(query)))
+    if not wanted:
+        return []
+    rows = SearchTerm.objects.filter(kind=kind)
+    if owner_id is not None:
+        rows = rows.filter(owner_id=owner_id)
+
+    frequencies = {term: rows.filter(term=term).count() for term in wanted}
+    if not all(frequencies.values()):
+        return []
+    documents = max(_document_count(kind, owner_id), *frequencies.values())
+    weights = {term: math.log(1 + documents / frequency) for term, frequency in frequencies.items()}
+
+    rarest, *others = sorted(wanted, key=frequencies.get)
+    matched = rows.filter(term=rarest).order_by('-weight', 'object_id').values_list('object_id', 'weight')
+    matched = matched[:MAX_CANDIDATES]
+    scores = {object_id: weight * weights[rarest] for object_id, weight in matched}
+    for term in others:
+        if not scores:
+            break
+        matched = rows.filter(term=term, object_id__in=list(scores)).values_list('object_id', 'weight')
+        scores = {object_id: scores[object_id] + weight * weights[term] for object_id, weight in matched}
+
+    ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    return ranked[:limit]
+
+
+def index_objects(kind, objects):
+    """Index model instances of one kind, replacing their previous entries"""
+    objects = list(objects)
+    if not objects:
+        return
+    unindex(kind, [obj._id for obj in objects])
+    fields = _columns(kind)
+    SearchTerm.objects.bulk_create([
+        SearchTerm(_id=str(ObjectId()), **row)
+        for obj in objects
+        for row in postings(kind, {field: getattr(obj, field) for field in fields})
+    ], batch_size=BATCH_SIZE)
+
+
+def unindex(kind, object_ids):
+    """Remove documents from the index"""
+    SearchTerm.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+
+def rebuild(kinds=None, batch_size=BATCH_SIZE):
+    """Reindex every document of the given kinds (all by default); returns the documents per kind"""
+    counts = {}
+    for kind in kinds or FIELDS:
+        SearchTerm.objects.filter(kind=kind).delete()
+        documents = MODELS[kind].objects.order_by('_id').values(*_columns(kind)).iterator(chunk_size=batch_size)
+        counts[kind] = 0
+        batch = []
+        for values in documents:
+            batch.extend(SearchTerm(_id=str(ObjectId()), **row) for row in postings(kind, values))
+            counts[kind] += 1
+            if len(batch) >= batch_size:
+                SearchTerm.objects.bulk_create(batch)
+                batch = []
+        SearchTerm.objects.bulk_create(batch)
+    return counts
+
+
+def record_activity(activity):
+    """Index a newly saved activity"""
+    index_objects(ACTIVITY, [activity])
+
+
+def record_activities(activities):
+    """Index a batch of newly saved activities"""
+    index_objects(ACTIVITY, activities)
+
+
+def discard_activity(activity):
+    """Remove a deleted activity from the index"""
+    unindex(ACTIVITY, [activity._id])
+
+
+def replace_activity(previous, activity):
+    """Reindex an edited activity"""
+    index_objects(ACTIVITY, [activity])
+
+
+def _columns(kind):
+    """Model fields a document's postings are built from"""
+    owner_field = OWNER_FIELDS.get(kind)
+    return ['_id', *([owner_field] if owner_field else []), *FIELDS[kind]]
+
+
+def _document_count(kind, owner_id):
+    """Number of searchable documents, for the inverse document frequencies"""
+    if kind == ACTIVITY:
+        estimate = estimate_activity_count(owner_id)
+        if estimate is not None:
+            return estimate
+    documents = MODELS[kind].objects.all()
+    if owner_id is not None:
+        documents = documents.filter(**{OWNER_FIELDS[kind]: owner_id})
+    return documents.count()
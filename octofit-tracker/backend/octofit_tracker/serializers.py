@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import User, Team, Activity, Leaderboard, WindowedLeaderboard, Workout
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -39,8 +39,14 @@ class TeamSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Team
-        fields = ['id', 'name', 'description', 'captain_id', 'member_ids', 'created_at', 'total_points']
-        read_only_fields = ['_id', 'created_at']
+        fields = [
+            'id', 'name', 'description', 'captain_id', 'member_ids', 'created_at',
+            'total_points', 'total_activities', 'total_duration', 'total_calories', 'member_count'
+        ]
+        read_only_fields = [
+            '_id', 'created_at',
+            'total_points', 'total_activities', 'total_duration', 'total_calories', 'member_count'
+        ]
 
     def create(self, validated_data):
         """Create a new team"""
@@ -48,10 +54,10 @@ class TeamSerializer(serializers.ModelSerializer):
         return team
 
     def update(self, instance, validated_data):
-        """Update an existing team"""
+        """Update an existing team without overwriting its maintained rollup"""
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        instance.save(update_fields=list(validated_data))
         return instance
 
 
@@ -85,8 +91,8 @@ class LeaderboardSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Leaderboard
-        fields = ['id', 'user_id', 'username', 'total_points', 'total_activities', 'total_duration', 'rank', 'last_activity_date', 'updated_at']
-        read_only_fields = ['_id', 'updated_at']
+        fields = ['id', 'user_id', 'username', 'total_points', 'total_activities', 'total_duration', 'rank', 'dense_rank', 'last_activity_date', 'updated_at']
+        read_only_fields = ['_id', 'dense_rank', 'updated_at']
 
     def create(self, validated_data):
         """Create a new leaderboard entry"""
@@ -101,6 +107,16 @@ class LeaderboardSerializer(serializers.ModelSerializer):
         return instance
 
 
+class WindowedLeaderboardSerializer(serializers.ModelSerializer):
+    """Read-only serializer for WindowedLeaderboard entries; views add each entry's rank"""
+    id = serializers.CharField(source='_id', read_only=True)
+
+    class Meta:
+        model = WindowedLeaderboard
+        fields = ['id', 'user_id', 'username', 'window', 'period', 'total_points', 'total_activities', 'total_duration']
+        read_only_fields = fields
+
+
 class WorkoutSerializer(serializers.ModelSerializer):
     """Serializer for Workout model"""
     id = serializers.CharField(source='_id', read_only=True)
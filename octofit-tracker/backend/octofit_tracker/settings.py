@@ -53,8 +53,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'octofit_tracker.replicas.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -100,6 +102,12 @@ DATABASES = {
 }
 
 
+# Safe requests may read from the replica aliases listed in
+# OCTOFIT_READ_REPLICAS (see octofit_tracker/replicas.py); writes and
+# read-after-write requests use 'default'.
+DATABASE_ROUTERS = ['octofit_tracker.replicas.ReplicaRouter']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -141,6 +149,36 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Response cache for hot read-only actions (see octofit_tracker/cache.py).
+# Entries are per worker and expire after 'timeout' seconds; invalidations
+# reach every worker through counters in the database. Use
+# 'octofit_tracker.cache.DjangoCacheBackend' to share the entries too.
+OCTOFIT_RESPONSE_CACHE = {
+    'BACKEND': 'octofit_tracker.cache.LRUBackend',
+    'OPTIONS': {'max_entries': 1024, 'timeout': 300},
+}
+
+# Read replicas. Add each replica to DATABASES (with
+# 'TEST': {'MIRROR': 'default'}) and list its alias here. Endpoints declare
+# their tolerated lag with replicas.max_staleness(); others use the default.
+# PIN_CACHE names the CACHES alias holding the read-after-write pins; with
+# several workers it must be a shared cache.
+OCTOFIT_READ_REPLICAS = {
+    'ALIASES': [],
+    'DEFAULT_MAX_STALENESS': 5,
+    'READ_AFTER_WRITE_SECONDS': 10,
+    'LAG_CHECK_INTERVAL': 5,
+    'PIN_CACHE': 'default',
+}
+
+# Seconds between reloads of the in-process leaderboard rank index, to pick
+# up writes from other workers (see octofit_tracker/rank_index.py).
+OCTOFIT_RANK_INDEX_REFRESH = 60
+
+# Where the snapshot_analytics command writes the columnar activity snapshots
+# served by /api/analytics/ (see octofit_tracker/analytics.py).
+OCTOFIT_ANALYTICS_DIR = BASE_DIR / 'analytics'
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_METHODS = [
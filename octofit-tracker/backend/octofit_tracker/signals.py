@@ -0,0 +1,50 @@
+"""
+Signal handlers for OctoFit Tracker.
+
+Model saves and deletes (through the API or the admin) invalidate the cached
+responses that depend on them and keep the leaderboard and team rank
+indexes and the workout search index current. Bulk and server-side writes that bypass
+signals call ``cache.invalidate()`` and update the index themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate
+from . import search, team_ranking
+from .models import Leaderboard, Team, Workout
+from .rank_index import board
+
+
+@receiver([post_save, post_delete], sender=Leaderboard)
+def invalidate_leaderboard(sender, **kwargs):
+    invalidate('leaderboard')
+
+
+@receiver(post_save, sender=Leaderboard)
+def index_leaderboard_entry(sender, instance, **kwargs):
+    board.update(instance.user_id, instance.total_points)
+
+
+@receiver(post_delete, sender=Leaderboard)
+def unindex_leaderboard_entry(sender, instance, **kwargs):
+    board.discard(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Team)
+def rescore_team(sender, instance, **kwargs):
+    team_ranking.teams_changed([instance._id])
+
+
+@receiver([post_save, post_delete], sender=Workout)
+def invalidate_workouts(sender, **kwargs):
+    invalidate('workouts')
+
+
+@receiver(post_save, sender=Workout)
+def index_workout(sender, instance, **kwargs):
+    search.index_objects(search.WORKOUT, [instance])
+
+
+@receiver(post_delete, sender=Workout)
+def unindex_workout(sender, instance, **kwargs):
+    search.unindex(search.WORKOUT, [instance._id])
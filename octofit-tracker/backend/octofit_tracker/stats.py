@@ -0,0 +1,125 @@
+"""
+Activity statistics computed in a single database round trip.
+
+All metrics come from one aggregation grouped by ``activity_type``; the
+overall totals are folded from the groups in Python, so asking for the
+per-type breakdown costs nothing extra.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+METRICS = ('total_activities', 'total_points', 'total_duration', 'total_calories')
+
+
+def activity_stats(activities, breakdown=False):
+    """
+    Return totals for an Activity queryset.
+
+    With ``breakdown`` the result also holds the same totals per activity
+    type under ``by_activity_type``.
+    """
+    groups = (
+        activities.order_by()
+        .values('activity_type')
+        .annotate(
+            total_activities=Count('_id'),
+            total_points=Sum('points'),
+            total_duration=Sum('duration'),
+            total_calories=Sum('calories')
+        )
+    )
+    return fold_groups(groups, breakdown)
+
+
+def activity_stats_by_user(activities, user_ids, chunk_size=500):
+    """
+    Return the totals of each of ``user_ids`` within an Activity queryset,
+    from one aggregation grouped by ``user_id`` per ``chunk_size`` ids.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    stats = {user_id: dict.fromkeys(METRICS, 0) for user_id in user_ids}
+    for start in range(0, len(user_ids), chunk_size):
+        groups = (
+            activities.filter(user_id__in=user_ids[start:start + chunk_size])
+            .order_by()
+            .values('user_id')
+            .annotate(
+                total_activities=Count('_id'),
+                total_points=Sum('points'),
+                total_duration=Sum('duration'),
+                total_calories=Sum('calories')
+            )
+        )
+        for group in groups:
+            stats[group['user_id']] = {metric: group[metric] or 0 for metric in METRICS}
+    return stats
+
+
+def fold_groups(groups, breakdown=False):
+    """
+    Fold per-activity-type totals into the stats response.
+
+    ``groups`` are dicts holding ``activity_type`` and the METRICS.
+    """
+    stats = dict.fromkeys(METRICS, 0)
+    by_activity_type = {}
+    for group in groups:
+        totals = {metric: group[metric] or 0 for metric in METRICS}
+        for metric in METRICS:
+            stats[metric] += totals[metric]
+        by_activity_type[group['activity_type']] = totals
+
+    if breakdown:
+        stats['by_activity_type'] = by_activity_type
+    return stats
+
+
+def filter_date_range(activities, query_params):
+    """
+    Restrict activities to the ``?from=&to=`` range in ``query_params``.
+
+    Both bounds are optional and accept ISO dates or datetimes; a bare ``to``
+    date includes the whole day.
+    """
+    start, end = date_range(query_params)
+
+    if start is not None:
+        activities = activities.filter(date__gte=start)
+    if end is not None:
+        activities = activities.filter(date__lt=end)
+    return activities
+
+
+def date_range(query_params):
+    """Return the ``[start, end)`` bounds of ``?from=&to=``, either may be None"""
+    start = _parse_bound(query_params.get('from'), 'from')
+    end = _parse_bound(query_params.get('to'), 'to', end_of_day=True)
+    return start, end
+
+
+def _parse_bound(value, name, end_of_day=False):
+    if not value:
+        return None
+
+    try:
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        moment = day = None
+
+    if moment is None:
+        if day is None:
+            raise serializers.ValidationError({name: 'Expected an ISO date or datetime.'})
+        if end_of_day:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min)
+    elif end_of_day:
+        moment += timedelta(microseconds=1)
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
@@ -0,0 +1,405 @@
+"""
+Synthetic dataset generation for development and load testing.
+
+Users are generated in fixed-size ranges that run in parallel across a
+process pool. Each range streams its users, activities, leaderboard entries
+(all-time and windowed), daily rollups, search postings and team memberships
+out in batched inserts, and folds every derived total in the same pass over the activities
+it just generated. Teams, which span ranges, are written last from the
+merged per-range totals, and ranks are assigned by
+``ranking.recompute_rankings()``.
+
+Every range draws from its own generator seeded with ``(seed, range start)``,
+so a given seed yields the same dataset whatever the worker count (dates are
+relative to the time of the run).
+"""
+import functools
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.db import connections, models
+from django.utils import timezone
+
+from . import recommendations, search, team_ranking
+from .cache import invalidate
+from .fields import NativeJSONField
+from .leaderboard_windows import TOTAL_FIELDS as WINDOW_FIELDS, invalidate_boards, periods
+from .models import (
+    Activity,
+    DailyActivityRollup,
+    Leaderboard,
+    SearchTerm,
+    Team,
+    TeamMembership,
+    User,
+    WindowedLeaderboard,
+    Workout,
+    WorkoutRecommendation
+)
+from .mongo import db_value, get_collection
+from .rank_index import board
+from .ranking import recompute_rankings, RANKING_METHODS
+
+CHUNK_SIZE = 1000
+BATCH_SIZE = 5000
+ROLLUP_FIELDS = ('total_points', 'total_activities', 'total_duration', 'total_calories')
+MODELS = (
+    User, Team, TeamMembership, Activity, DailyActivityRollup, Leaderboard, WindowedLeaderboard,
+    Workout, WorkoutRecommendation, SearchTerm
+)
+
+FIRST_NAMES = (
+    'Tony', 'Steve', 'Natasha', 'Thor', 'Bruce', 'Clark', 'Diana', 'Barry',
+    'Arthur', 'Wanda', 'Peter', 'Carol', 'Hal', 'Selina', 'Victor', 'Kara'
+)
+LAST_NAMES = (
+    'Stark', 'Rogers', 'Romanoff', 'Odinson', 'Banner', 'Kent', 'Prince', 'Allen',
+    'Curry', 'Maximoff', 'Parker', 'Danvers', 'Jordan', 'Kyle', 'Stone', 'Zor-El'
+)
+TEAM_NAMES = ('Team Marvel', 'Team DC')
+FITNESS_LEVELS = ('beginner', 'intermediate', 'advanced')
+# activity type -> (calories per minute, km per minute or None)
+ACTIVITY_TYPES = {
+    'running': (11, 0.17),
+    'cycling': (9, 0.4),
+    'swimming': (10, 0.04),
+    'weightlifting': (6, None),
+    'yoga': (4, None),
+    'boxing': (12, None)
+}
+
+WORKOUTS = (
+    {
+        'name': 'Super Soldier Training',
+        'description': "Captain America's intense workout routine",
+        'fitness_level': 'advanced',
+        'activity_type': 'weightlifting',
+        'duration': 60,
+        'calories_estimate': 600,
+        'instructions': ['5x50 push-ups', '5x20 pull-ups', '5x50 squats', '5 km run'],
+        'equipment_needed': ['pull-up bar']
+    },
+    {
+        'name': 'Speedster Circuit',
+        'description': "Flash's high-intensity interval training",
+        'fitness_level': 'advanced',
+        'activity_type': 'running',
+        'duration': 45,
+        'calories_estimate': 550,
+        'instructions': ['10x30 s sprints', '5x30 burpees', '10 min jump rope', '5x20 box jumps'],
+        'equipment_needed': ['jump rope', 'plyo box']
+    },
+    {
+        'name': 'Warrior Training',
+        'description': "Wonder Woman's battle-ready workout",
+        'fitness_level': 'intermediate',
+        'activity_type': 'weightlifting',
+        'duration': 50,
+        'calories_estimate': 400,
+        'instructions': ['4x12 deadlifts', '4x12 bench press', '4x15 lunges', '3 min plank'],
+        'equipment_needed': ['barbell', 'bench']
+    },
+    {
+        'name': 'Asgardian Power',
+        'description': "Thor's god-level strength training",
+        'fitness_level': 'advanced',
+        'activity_type': 'weightlifting',
+        'duration': 70,
+        'calories_estimate': 650,
+        'instructions': ['5x8 heavy squats', '5x8 overhead press', '4x12 hammer curls', '5 min battle ropes'],
+        'equipment_needed': ['barbell', 'dumbbells', 'battle ropes']
+    },
+    {
+        'name': 'Aquatic Endurance',
+        'description': "Aquaman's underwater conditioning",
+        'fitness_level': 'intermediate',
+        'activity_type': 'swimming',
+        'duration': 60,
+        'calories_estimate': 500,
+        'instructions': ['2 km swim', '10 min water treading', '4x15 resistance work', '10 min core'],
+        'equipment_needed': ['pool access']
+    },
+    {
+        'name': 'Zen Warrior',
+        'description': "Black Widow's flexibility and balance routine",
+        'fitness_level': 'beginner',
+        'activity_type': 'yoga',
+        'duration': 40,
+        'calories_estimate': 180,
+        'instructions': ['20 min yoga flow', '10 min meditation', '10 min stretching'],
+        'equipment_needed': ['yoga mat']
+    }
+)
+
+
+def populate(users=10, activities_per_user=8, teams=2, seed=None, days=30,
+             workers=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, progress=None):
+    """
+    Replace the database contents with a generated dataset.
+
+    Each user gets ``activities_per_user`` activities on average, spread over
+    the last ``days`` days, and joins one of ``teams`` teams. ``progress`` is
+    called with the number of users written so far. Returns the number of
+    rows written per collection.
+    """
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    rng = random.Random(seed)
+    team_ids = [_object_id(rng) for _ in range(teams)]
+    now = timezone.now()
+
+    clear()
+    ranges = [
+        (start, min(start + chunk_size, users), seed, team_ids, activities_per_user, days, now, batch_size)
+        for start in range(0, users, chunk_size)
+    ]
+
+    counts = dict.fromkeys(('users', 'activities', 'rollups', 'windowed_entries', 'search_terms'), 0)
+    team_totals = [{'member_ids': [], **dict.fromkeys(ROLLUP_FIELDS, 0)} for _ in team_ids]
+    done = 0
+    for result in _run(ranges, workers):
+        for name in counts:
+            counts[name] += result[name]
+        for totals, partial in zip(team_totals, result['teams']):
+            totals['member_ids'].extend(partial['member_ids'])
+            for field in ROLLUP_FIELDS:
+                totals[field] += partial[field]
+        done += result['users']
+        if progress:
+            progress(done)
+
+    _write(Team, [
+        {
+            '_id': team_id,
+            'name': TEAM_NAMES[index] if index < len(TEAM_NAMES) else f'Team {index + 1}',
+            'description': f'Synthetic team {index + 1}',
+            'captain_id': totals['member_ids'][0] if totals['member_ids'] else '',
+            'member_ids': totals['member_ids'],
+            'member_count': len(totals['member_ids']),
+            'created_at': now,
+            **{field: totals[field] for field in ROLLUP_FIELDS}
+        }
+        for index, (team_id, totals) in enumerate(zip(team_ids, team_totals))
+    ], batch_size)
+    workouts = [{'_id': _object_id(rng), 'created_at': now, **workout} for workout in WORKOUTS]
+    _write(Workout, workouts, batch_size)
+    workout_terms = [
+        {'_id': _object_id(rng), **row}
+        for workout in workouts
+        for row in search.postings(search.WORKOUT, workout)
+    ]
+    _write(SearchTerm, workout_terms, batch_size)
+    counts['search_terms'] += len(workout_terms)
+
+    for method in RANKING_METHODS:
+        recompute_rankings(method=method, max_workers=workers)
+    invalidate('leaderboard', 'workouts')
+    board.invalidate()
+    invalidate_boards()
+    team_ranking.invalidate()
+    return {
+        **counts,
+        'leaderboard': users,
+        'teams': teams,
+        'memberships': users if teams else 0,
+        'workouts': len(WORKOUTS),
+        'recommendations': recommendations.refresh_all(batch_size)
+    }
+
+
+def clear():
+    """Delete every row of the app's models"""
+    for model in MODELS:
+        collection = get_collection(model)
+        if collection is not None:
+            collection.delete_many({})
+        else:
+            model.objects.all().delete()
+
+
+def populate_range(start, end, seed, team_ids, activities_per_user, days, now, batch_size):
+    """
+    Write users ``start`` to ``end - 1`` with everything derived from them.
+
+    Returns the rows written plus each team's member ids and totals from
+    this range.
+    """
+    rng = random.Random(f'{seed}:{start}')
+    writer = _BatchWriter(batch_size)
+    teams = [{'member_ids': [], **dict.fromkeys(ROLLUP_FIELDS, 0)} for _ in team_ids]
+    activity_types = list(ACTIVITY_TYPES)
+    result = dict.fromkeys(('users', 'activities', 'rollups', 'windowed_entries', 'search_terms'), 0)
+
+    for index in range(start, end):
+        user_id = _object_id(rng)
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        username = f'{first}{last}{index}'.lower().replace('-', '')
+        writer.add(User, {
+            '_id': user_id,
+            'username': username,
+            'email': f'{username}@octofit.example',
+            'password': 'hashed_password',
+            'full_name': f'{first} {last}',
+            'age': rng.randint(16, 70),
+            'fitness_level': rng.choice(FITNESS_LEVELS),
+            'created_at': now,
+            'updated_at': now
+        })
+
+        totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+        buckets = {}
+        windows = {}
+        last_date = None
+        for _ in range(rng.randint(activities_per_user // 2, activities_per_user + activities_per_user // 2)):
+            activity_type = rng.choice(activity_types)
+            calories_per_minute, km_per_minute = ACTIVITY_TYPES[activity_type]
+            duration = rng.randint(20, 120)
+            calories = int(duration * calories_per_minute * rng.uniform(0.8, 1.2))
+            points = duration + calories // 10
+            date = now - timedelta(seconds=rng.randrange(days * 86400))
+            activity = {
+                '_id': _object_id(rng),
+                'user_id': user_id,
+                'activity_type': activity_type,
+                'duration': duration,
+                'distance': round(duration * km_per_minute * rng.uniform(0.8, 1.2), 2) if km_per_minute else None,
+                'calories': calories,
+                'points': points,
+                'date': date,
+                'notes': f'{first} completed a {activity_type} session',
+                'created_at': now
+            }
+            writer.add(Activity, activity)
+            for row in search.postings(search.ACTIVITY, activity):
+                writer.add(SearchTerm, {'_id': _object_id(rng), **row})
+                result['search_terms'] += 1
+
+            bucket = buckets.setdefault((activity_type, timezone.localtime(date).date()), dict.fromkeys(ROLLUP_FIELDS, 0))
+            for target in (totals, bucket):
+                target['total_points'] += points
+                target['total_activities'] += 1
+                target['total_duration'] += duration
+                target['total_calories'] += calories
+            for key in periods(date):
+                entry = windows.setdefault(key, dict.fromkeys(WINDOW_FIELDS, 0))
+                entry['total_points'] += points
+                entry['total_activities'] += 1
+                entry['total_duration'] += duration
+            last_date = date if last_date is None else max(last_date, date)
+
+        writer.add(Leaderboard, {
+            '_id': _object_id(rng),
+            'user_id': user_id,
+            'username': username,
+            'total_points': totals['total_points'],
+            'total_activities': totals['total_activities'],
+            'total_duration': totals['total_duration'],
+            'rank': 0,
+            'dense_rank': 0,
+            'last_activity_date': last_date,
+            'updated_at': now
+        })
+        for (activity_type, day), bucket in buckets.items():
+            writer.add(DailyActivityRollup, {
+                '_id': _object_id(rng),
+                'user_id': user_id,
+                'activity_type': activity_type,
+                'day': day,
+                **bucket
+            })
+        for (window, period), entry in windows.items():
+            writer.add(WindowedLeaderboard, {
+                '_id': _object_id(rng),
+                'window': window,
+                'period': period,
+                'user_id': user_id,
+                'username': username,
+                **entry
+            })
+
+        if team_ids:
+            team_index = rng.randrange(len(team_ids))
+            writer.add(TeamMembership, {
+                '_id': _object_id(rng),
+                'team_id': team_ids[team_index],
+                'user_id': user_id,
+                'joined_at': now
+            })
+            teams[team_index]['member_ids'].append(user_id)
+            for field in ROLLUP_FIELDS:
+                teams[team_index][field] += totals[field]
+
+        result['users'] += 1
+        result['activities'] += totals['total_activities']
+        result['rollups'] += len(buckets)
+        result['windowed_entries'] += len(windows)
+
+    writer.flush()
+    result['teams'] = teams
+    return result
+
+
+class _BatchWriter:
+    """Buffer rows per model and insert them ``batch_size`` at a time"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+
+    def add(self, model, row):
+        rows = self.pending.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            _write(model, rows, self.batch_size)
+            rows.clear()
+
+    def flush(self):
+        for model, rows in self.pending.items():
+            _write(model, rows, self.batch_size)
+        self.pending.clear()
+
+
+def _write(model, rows, batch_size):
+    """Insert rows given as model field values, converting them for MongoDB"""
+    if not rows:
+        return
+    collection = get_collection(model)
+    if collection is None:
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=batch_size)
+        return
+
+    converted = _converted_fields(model)
+    if converted:
+        rows = [{**row, **{name: db_value(model, name, row[name]) for name in converted}} for row in rows]
+    collection.insert_many(rows, ordered=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _converted_fields(model):
+    """Fields djongo stores differently from their Python value"""
+    return tuple(
+        field.name for field in model._meta.concrete_fields
+        if isinstance(field, (models.JSONField, models.DateField))
+        and not isinstance(field, (NativeJSONField, models.DateTimeField))
+    )
+
+
+def _run(ranges, workers):
+    """Yield the result of every range, in parallel when several workers are allowed"""
+    if workers == 1 or len(ranges) <= 1:
+        for arguments in ranges:
+            yield populate_range(*arguments)
+        return
+
+    # Children must open their own database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        futures = [pool.submit(populate_range, *arguments) for arguments in ranges]
+        for future in futures:
+            yield future.result()
+
+
+def _object_id(rng):
+    """Return a reproducible ObjectId-shaped hex string"""
+    return f'{rng.getrandbits(96):024x}'
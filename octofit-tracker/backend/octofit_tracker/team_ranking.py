@@ -0,0 +1,77 @@
+"""
+Team rankings.
+
+Teams are ranked on their maintained rollups (see ``team_rollups.py``) by
+one of two metrics: ``total`` member points, or ``average`` points per
+member so that team size does not dominate. Each metric has its own
+``RankIndex``, so top-N and rank-of-team lookups are logarithmic.
+
+The indexes load on first use and follow every rollup change made in this
+process: ``team_rollups`` reports the teams it touched to
+``teams_changed()``. Like the user leaderboard index they reload every
+``OCTOFIT_RANK_INDEX_REFRESH`` seconds to pick up other workers' writes.
+
+``team_rollups.rebuild_all_teams()`` recomputes every rollup in bulk for
+backfills and then reloads the indexes.
+"""
+from .models import Team
+from .rank_index import RankIndex
+from .replicas import PRIMARY
+
+TOTAL = 'total'
+AVERAGE = 'average'
+METRICS = (TOTAL, AVERAGE)
+STANDING_FIELDS = ('name', 'member_count', 'total_points', 'total_activities', 'total_duration', 'total_calories')
+
+
+def score(total_points, member_count, metric):
+    """Return a team's score under ``metric``"""
+    if metric == AVERAGE:
+        return total_points / member_count if member_count else 0.0
+    return total_points
+
+
+def _load(metric):
+    rows = Team.objects.using(PRIMARY).values_list('_id', 'total_points', 'member_count').iterator()
+    return ((team_id, score(points, members, metric)) for team_id, points, members in rows)
+
+
+boards = {metric: RankIndex(lambda metric=metric: _load(metric)) for metric in METRICS}
+
+
+def teams_changed(team_ids):
+    """Re-score teams whose rollup or membership changed"""
+    if not team_ids or not any(board.loaded for board in boards.values()):
+        return
+    rows = dict(
+        (team_id, (points, members))
+        for team_id, points, members in Team.objects.using(PRIMARY).filter(_id__in=list(team_ids))
+        .values_list('_id', 'total_points', 'member_count')
+    )
+    for team_id in team_ids:
+        for metric, board in boards.items():
+            if team_id in rows:
+                board.update(team_id, score(*rows[team_id], metric))
+            else:
+                board.discard(team_id)
+
+
+def represent(entries):
+    """Return the standings of ranked ``(team_id, score, rank)`` entries, in order"""
+    team_ids = [team_id for team_id, _, _ in entries]
+    rows = {row['_id']: row for row in Team.objects.filter(_id__in=team_ids).values('_id', *STANDING_FIELDS)}
+    return [
+        {
+            'id': team_id,
+            **{field: rows[team_id][field] for field in STANDING_FIELDS},
+            'average_points': round(score(rows[team_id]['total_points'], rows[team_id]['member_count'], AVERAGE), 2),
+            'rank': rank
+        }
+        for team_id, _, rank in entries if team_id in rows
+    ]
+
+
+def invalidate():
+    """Reload both indexes on next use"""
+    for board in boards.values():
+        board.invalidate()
@@ -0,0 +1,265 @@
+"""
+Materialized per-team rollups.
+
+Each Team carries running totals of its members' activities and its member
+count. Activity writes and membership changes apply deltas to those fields,
+so team stats and listings read them directly instead of rescanning every
+member's history.
+
+TeamMembership rows index ``Team.member_ids`` by user, so an activity can
+find the teams of its user without scanning every team. ``member_ids``
+itself is changed by ``memberships.py``, which reports exactly which users
+joined or left so their history can be moved here.
+
+Every rollup change is reported to ``team_ranking`` so the team rankings
+stay current.
+"""
+from bson import ObjectId
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from . import team_ranking
+from .models import Activity, Team, TeamMembership
+from .mongo import get_collection
+
+ROLLUP_FIELDS = ('total_points', 'total_activities', 'total_duration', 'total_calories')
+DUPLICATE_KEY = 11000
+
+
+def record_activity(activity):
+    """Add a newly saved activity to the rollups of its user's teams"""
+    _apply(_teams_of(activity.user_id), _activity_totals(activity, 1))
+
+
+def record_activities(activities):
+    """Add a batch of newly saved activities, applying one delta per team"""
+    by_user = {}
+    for activity in activities:
+        totals = by_user.setdefault(activity.user_id, dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field, value in _activity_totals(activity, 1).items():
+            totals[field] += value
+
+    by_team = {}
+    memberships = TeamMembership.objects.filter(user_id__in=list(by_user)).values_list('team_id', 'user_id')
+    for team_id, user_id in memberships:
+        totals = by_team.setdefault(team_id, dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field, value in by_user[user_id].items():
+            totals[field] += value
+
+    for team_id, delta in by_team.items():
+        _apply([team_id], delta)
+
+
+def discard_activity(activity):
+    """Remove a deleted activity from the rollups of its user's teams"""
+    _apply(_teams_of(activity.user_id), _activity_totals(activity, -1))
+
+
+def replace_activity(previous, activity):
+    """Apply the difference between two versions of the same activity"""
+    if previous.user_id != activity.user_id:
+        discard_activity(previous)
+        record_activity(activity)
+        return
+
+    old = _activity_totals(previous, 1)
+    new = _activity_totals(activity, 1)
+    _apply(_teams_of(activity.user_id), {field: new[field] - old[field] for field in ROLLUP_FIELDS})
+
+
+def members_joined(team_id, user_ids):
+    """Index users that just joined a team and move their history in"""
+    if not user_ids:
+        return
+    _index_members(team_id, user_ids)
+    delta = member_totals(user_ids)
+    delta['member_count'] = len(user_ids)
+    _apply([team_id], delta)
+
+
+def members_left(team_id, user_ids):
+    """Unindex users that just left a team and move their history out"""
+    if not user_ids:
+        return
+    TeamMembership.objects.filter(team_id=team_id, user_id__in=user_ids).delete()
+    delta = {field: -value for field, value in member_totals(user_ids).items()}
+    delta['member_count'] = -len(user_ids)
+    _apply([team_id], delta)
+
+
+def rebuild_team(team):
+    """Recompute a team's rollup and membership index from ``member_ids``"""
+    members = list(dict.fromkeys(team.member_ids))
+
+    TeamMembership.objects.filter(team_id=team._id).exclude(user_id__in=members).delete()
+    _index_members(team._id, members)
+
+    Team.objects.filter(pk=team._id).update(member_count=len(members), **member_totals(members))
+    team_ranking.teams_changed([team._id])
+
+
+def rebuild_all_teams(batch_size=1000):
+    """
+    Recompute every team rollup and the whole membership index in bulk.
+
+    Activities are aggregated per user in a single pass and each team sums
+    its members' totals, instead of one aggregation per team. Run it while
+    writes are paused: activities logged mid-rebuild may miss their teams.
+    Returns the number of teams and memberships written.
+    """
+    totals_by_user = _totals_by_user()
+    TeamMembership.objects.all().delete()
+
+    teams = 0
+    pending = []
+    memberships = []
+    for team_id, member_ids in Team.objects.values_list('_id', 'member_ids').iterator():
+        members = list(dict.fromkeys(member_ids or []))
+        rollup = dict.fromkeys(ROLLUP_FIELDS, 0)
+        for user_id in members:
+            for field, value in totals_by_user.get(user_id, {}).items():
+                rollup[field] += value
+        pending.append((team_id, {'member_count': len(members), **rollup}))
+        memberships.extend(
+            TeamMembership(_id=str(ObjectId()), team_id=team_id, user_id=user_id, joined_at=timezone.now())
+            for user_id in members
+        )
+        teams += 1
+        if len(pending) >= batch_size:
+            _write_rollups(pending)
+            pending = []
+    _write_rollups(pending)
+    TeamMembership.objects.bulk_create(memberships, batch_size=batch_size)
+
+    team_ranking.invalidate()
+    return {'teams': teams, 'memberships': len(memberships)}
+
+
+def forget_team(team):
+    """Drop the membership index of a deleted team"""
+    TeamMembership.objects.filter(team_id=team._id).delete()
+
+
+def rollup_stats(team):
+    """Return a team's unfiltered stats straight from its maintained rollup"""
+    return {
+        'total_members': team.member_count,
+        'total_activities': team.total_activities,
+        'total_points': team.total_points,
+        'total_duration': team.total_duration,
+        'total_calories': team.total_calories
+    }
+
+
+def member_totals(user_ids):
+    """Return the rollup totals of all activities by the given users"""
+    totals = Activity.objects.filter(user_id__in=user_ids).aggregate(
+        total_points=Sum('points'),
+        total_activities=Count('_id'),
+        total_duration=Sum('duration'),
+        total_calories=Sum('calories')
+    )
+    return {field: totals[field] or 0 for field in ROLLUP_FIELDS}
+
+
+def _totals_by_user():
+    """Return the rollup totals of every user with activities"""
+    collection = get_collection(Activity)
+    if collection is not None:
+        groups = collection.aggregate([{'$group': {
+            '_id': '$user_id',
+            'total_points': {'$sum': '$points'},
+            'total_activities': {'$sum': 1},
+            'total_duration': {'$sum': '$duration'},
+            'total_calories': {'$sum': '$calories'}
+        }}])
+        return {group.pop('_id'): group for group in groups}
+
+    groups = Activity.objects.order_by().values('user_id').annotate(
+        total_points=Sum('points'),
+        total_activities=Count('_id'),
+        total_duration=Sum('duration'),
+        total_calories=Sum('calories')
+    )
+    return {group.pop('user_id'): group for group in groups}
+
+
+def _write_rollups(pending):
+    """Write a batch of ``(team_id, fields)`` rollups"""
+    if not pending:
+        return
+    collection = get_collection(Team)
+    if collection is not None:
+        collection.bulk_write(
+            [UpdateOne({'_id': team_id}, {'$set': fields}) for team_id, fields in pending],
+            ordered=False
+        )
+        return
+    Team.objects.bulk_update(
+        [Team(_id=team_id, **fields) for team_id, fields in pending],
+        ['member_count', *ROLLUP_FIELDS]
+    )
+
+
+def _activity_totals(activity, sign):
+    return {
+        'total_points': sign * activity.points,
+        'total_activities': sign,
+        'total_duration': sign * activity.duration,
+        'total_calories': sign * activity.calories
+    }
+
+
+def _index_members(team_id, user_ids):
+    """Create the missing TeamMembership rows, tolerating concurrent inserts"""
+    existing = set(
+        TeamMembership.objects.filter(team_id=team_id, user_id__in=user_ids)
+        .values_list('user_id', flat=True)
+    )
+    memberships = [
+        TeamMembership(_id=str(ObjectId()), team_id=team_id, user_id=user_id, joined_at=timezone.now())
+        for user_id in dict.fromkeys(user_ids) if user_id not in existing
+    ]
+    if not memberships:
+        return
+
+    collection = get_collection(TeamMembership)
+    if collection is None:
+        TeamMembership.objects.bulk_create(memberships, ignore_conflicts=True)
+        return
+    try:
+        collection.insert_many([
+            {
+                '_id': membership._id,
+                'team_id': membership.team_id,
+                'user_id': membership.user_id,
+                'joined_at': membership.joined_at
+            }
+            for membership in memberships
+        ], ordered=False)
+    except BulkWriteError as exc:
+        # Rows inserted concurrently hit the unique (team_id, user_id) index
+        if any(error['code'] != DUPLICATE_KEY for error in exc.details['writeErrors']):
+            raise
+
+
+def _teams_of(user_id):
+    return list(TeamMembership.objects.filter(user_id=user_id).values_list('team_id', flat=True))
+
+
+def _apply(team_ids, delta):
+    """Atomically add ``delta`` to the rollup fields of the given teams"""
+    delta = {field: value for field, value in delta.items() if value}
+    if not team_ids or not delta:
+        return
+
+    collection = get_collection(Team)
+    if collection is not None:
+        collection.update_many({'_id': {'$in': list(team_ids)}}, {'$inc': delta})
+    else:
+        Team.objects.filter(pk__in=team_ids).update(
+            **{field: F(field) + value for field, value in delta.items()}
+        )
+    team_ranking.teams_changed(team_ids)
@@ -1,9 +1,81 @@
-from django.test import TestCase
-from rest_framework.test import APITestCase, APIClient
-from rest_framework import status
+import csv
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import User, Team, Activity, Leaderboard, Workout
-from datetime import datetime
+from django.utils import timezone
+from pymongo.errors import WriteError
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+
+from . import (
+    analytics,
+    benchmarks,
+    ingest,
+    leaderboard,
+    memberships,
+    metrics,
+    ranking,
+    recommendations,
+    replicas,
+    search,
+    team_ranking
+)
+from .admin import ActivityAdmin, WorkoutAdmin
+from .cache import LRUBackend, cached_response, get_response_cache
+from .export import export_response
+from .fast_serializers import FastJSONRenderer, fast_serializer
+from .indexes import index_models, is_collection_scan, missing_indexes
+from .leaderboard_windows import invalidate_boards, rebuild_windows
+from .models import (
+    Activity,
+    CacheVersion,
+    DailyActivityRollup,
+    Leaderboard,
+    SearchTerm,
+    Team,
+    TeamMembership,
+    User,
+    WindowedLeaderboard,
+    Workout
+)
+from .rank_index import RankIndex, board
+from .ranking import DENSE, recompute_rankings
+from .replicas import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, replica_reads
+from .serializers import ActivitySerializer, LeaderboardSerializer, TeamSerializer, UserSerializer, WorkoutSerializer
+from .stats import activity_stats_by_user
+from .team_rollups import rebuild_all_teams, rebuild_team
+from .trends import rebuild_rollups
+from .views import MAX_MULTI_GET_IDS, ActivityViewSet, LeaderboardViewSet
+
+
+def make_user(username, **overrides):
+    """Create a test user, with an email and full name derived from ``username``"""
+    fields = {
+        'email': f'{username}@example.com',
+        'password': 'testpass123',
+        'full_name': username.title(),
+        'age': 30,
+        **overrides
+    }
+    return User.objects.create(username=username, **fields)
 
 
 class UserModelTest(TestCase):
@@ -229,7 +301,1836 @@ class ActivityAPITest(APITestCase):
         )
         response = self.client.get(reverse('activity-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+
+class LeaderboardMaintenanceTest(APITestCase):
+    """Test cases for leaderboard updates driven by activity writes"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+    
+    def log_activity(self, user, points, date=None):
+        response = self.client.post(
+            reverse('activity-list'),
+            {
+                'user_id': user._id,
+                'activity_type': 'running',
+                'duration': 30,
+                'calories': 300,
+                'points': points,
+                'date': (date or timezone.now()).isoformat()
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+    
+    def test_create_activity_updates_totals_and_rank(self):
+        """Test creating activities maintains totals and ranks"""
+        self.log_activity(self.alice, 50)
+        self.log_activity(self.bob, 80)
+        self.log_activity(self.alice, 40)
+        
+        alice = Leaderboard.objects.get(user_id=self.alice._id)
+        bob = Leaderboard.objects.get(user_id=self.bob._id)
+        self.assertEqual(alice.username, 'alice')
+        self.assertEqual(alice.total_points, 90)
+        self.assertEqual(alice.total_activities, 2)
+        self.assertEqual(alice.total_duration, 60)
+        self.assertEqual((alice.rank, bob.rank), (1, 2))
+    
+    def test_update_and_delete_activity_apply_deltas(self):
+        """Test updating and deleting activities reverses their contribution"""
+        earlier = timezone.now() - timedelta(days=2)
+        self.log_activity(self.alice, 50, date=earlier)
+        latest_id = self.log_activity(self.alice, 10)
+        self.log_activity(self.bob, 40)
+        
+        response = self.client.patch(
+            reverse('activity-detail', args=[latest_id]),
+            {'points': 30},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        alice = Leaderboard.objects.get(user_id=self.alice._id)
+        self.assertEqual(alice.total_points, 80)
+        
+        response = self.client.delete(reverse('activity-detail', args=[latest_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        alice = Leaderboard.objects.get(user_id=self.alice._id)
+        bob = Leaderboard.objects.get(user_id=self.bob._id)
+        self.assertEqual(alice.total_points, 50)
+        self.assertEqual(alice.total_activities, 1)
+        self.assertEqual(alice.last_activity_date, earlier)
+        self.assertEqual((alice.rank, bob.rank), (1, 2))
+    
+    def test_rank_moves_write_absolute_ranks(self):
+        """Test a move recounts the crossed ranks instead of shifting stored ones"""
+        for name, points in [('c', 60), ('d', 40), ('e', 40), ('f', 10)]:
+            Leaderboard.objects.create(user_id=name, username=name, total_points=points, rank=99)
+        self.log_activity(self.alice, 50)
+        ranks = dict(Leaderboard.objects.values_list('username', 'rank'))
+        self.assertEqual(ranks, {'c': 99, 'alice': 2, 'd': 3, 'e': 3, 'f': 5})
+        
+        self.log_activity(self.alice, 20)
+        ranks = dict(Leaderboard.objects.values_list('username', 'rank'))
+        self.assertEqual(ranks, {'alice': 1, 'c': 2, 'd': 3, 'e': 3, 'f': 5})
+    
+    def test_new_entry_reranks_from_zero(self):
+        """Test a new entry moves up from 0 points, reaching below 0 only when entries score there"""
+        for name, points in [('c', 60), ('z', -5)]:
+            Leaderboard.objects.create(user_id=name, username=name, total_points=points, rank=99)
+        self.log_activity(self.alice, 20)
+        ranks = dict(Leaderboard.objects.values_list('username', 'rank'))
+        self.assertEqual(ranks, {'c': 99, 'alice': 2, 'z': 3})
+    
+    def test_interleaved_move_is_recounted(self):
+        """Test ranks written from counts that a concurrent move made stale are rewritten"""
+        for name, points in [('c', 60), ('d', 40), ('f', 10)]:
+            Leaderboard.objects.create(user_id=name, username=name, total_points=points, rank=99)
+        write_ranks = leaderboard._write_ranks
+        
+        def interleaved(ranks):
+            write_ranks(ranks)
+            if not Leaderboard.objects.filter(total_points=45).exists():
+                # Another worker's increment lands between our count and write
+                Leaderboard.objects.filter(user_id='f').update(total_points=45)
+        
+        with mock.patch.object(leaderboard, '_write_ranks', interleaved):
+            self.log_activity(self.alice, 50)
+        ranks = dict(Leaderboard.objects.values_list('username', 'rank'))
+        self.assertEqual(ranks, {'c': 99, 'alice': 2, 'f': 3, 'd': 4})
+
+
+class RankingTest(APITestCase):
+    """Test cases for bulk rank recomputation"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for name, points in [('a', 300), ('b', 200), ('c', 200), ('d', 100), ('e', 50)]:
+            Leaderboard.objects.create(user_id=name, username=name, total_points=points, rank=1)
+    
+    def ranks(self, field='rank'):
+        return dict(Leaderboard.objects.values_list('username', field))
+    
+    def test_ranking_across_partitions(self):
+        """Test ranks are the same when the board is merged from several partitions"""
+        report = recompute_rankings(partition_size=2, max_workers=2)
+        self.assertEqual(report['rows_scanned'], 5)
+        self.assertEqual(self.ranks(), {'a': 1, 'b': 2, 'c': 2, 'd': 4, 'e': 5})
+    
+    def test_dense_ranks_have_their_own_column(self):
+        """Test dense ranking fills dense_rank and leaves the competition ranks alone"""
+        report = recompute_rankings(method=DENSE)
+        self.assertEqual(report['rows_changed'], 5)
+        self.assertEqual(self.ranks('dense_rank'), {'a': 1, 'b': 2, 'c': 2, 'd': 3, 'e': 4})
+        self.assertEqual(set(self.ranks().values()), {1})
+        
+        response = self.client.get(reverse('leaderboard-list'))
+        self.assertEqual({entry['username']: entry['dense_rank'] for entry in response.data}['d'], 3)
+    
+    def test_invalid_method(self):
+        """Test an unknown ranking method is rejected"""
+        response = self.client.post(
+            reverse('leaderboard-update-rankings'),
+            {'method': 'olympic'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(ValueError):
+            recompute_rankings(method='olympic')
+
+
+class RankingJobTest(APITransactionTestCase):
+    """Test cases for rank recomputation started from the API"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for name, points in [('a', 300), ('b', 200), ('c', 200), ('d', 100), ('e', 50)]:
+            Leaderboard.objects.create(user_id=name, username=name, total_points=points, rank=1)
+    
+    def run_job(self, **data):
+        response = self.client.post(reverse('leaderboard-update-rankings'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        ranking.wait_for_recompute(timeout=30)
+        response = self.client.get(reverse('leaderboard-update-rankings'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], ranking.DONE)
+        return response.data
+    
+    def test_competition_ranking_writes_only_changed_rows(self):
+        """Test competition ranking skips gaps after ties and reports changes"""
+        report = self.run_job()
+        self.assertEqual(report['rows_scanned'], 5)
+        self.assertEqual(report['rows_changed'], 4)
+        self.assertEqual(
+            dict(Leaderboard.objects.values_list('username', 'rank')),
+            {'a': 1, 'b': 2, 'c': 2, 'd': 4, 'e': 5}
+        )
+    
+    def test_dense_ranking_from_the_api(self):
+        """Test the API recomputes dense ranks too"""
+        report = self.run_job(method=DENSE)
+        self.assertEqual(report['method'], DENSE)
+        self.assertEqual(
+            dict(Leaderboard.objects.values_list('username', 'dense_rank')),
+            {'a': 1, 'b': 2, 'c': 2, 'd': 3, 'e': 4}
+        )
+
+
+class StatsAPITest(APITestCase):
+    """Test cases for user and team statistics endpoints"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('statsuser')
+        self.team = Team.objects.create(
+            name='Stats Team',
+            captain_id=self.user._id,
+            member_ids=[self.user._id]
+        )
+        now = timezone.now()
+        for activity_type, points, days_ago in [('running', 50, 0), ('running', 30, 1), ('yoga', 20, 10)]:
+            Activity.objects.create(
+                user_id=self.user._id,
+                activity_type=activity_type,
+                duration=30,
+                calories=200,
+                points=points,
+                date=now - timedelta(days=days_ago)
+            )
+        rebuild_team(self.team)
+    
+    def test_user_stats_single_aggregation(self):
+        """Test user stats are computed with one aggregation query"""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('user-stats', args=[self.user._id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'total_activities': 3,
+            'total_points': 100,
+            'total_duration': 90,
+            'total_calories': 600
+        })
+    
+    def test_user_stats_breakdown_and_date_range(self):
+        """Test per-type breakdown restricted to a date range"""
+        start = (timezone.now() - timedelta(days=5)).date().isoformat()
+        response = self.client.get(
+            reverse('user-stats', args=[self.user._id]),
+            {'from': start, 'breakdown': 'activity_type'}
+        )
+        self.assertEqual(response.data['total_points'], 80)
+        self.assertEqual(list(response.data['by_activity_type']), ['running'])
+        self.assertEqual(response.data['by_activity_type']['running']['total_activities'], 2)
+    
+    def test_team_stats(self):
+        """Test team stats aggregate member activities"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('team-stats', args=[self.team._id]))
+        self.assertEqual(response.data['total_members'], 1)
+        self.assertEqual(response.data['total_points'], 100)
+        
+        response = self.client.get(reverse('team-stats', args=[self.team._id]), {'breakdown': 'activity_type'})
+        self.assertEqual(response.data['by_activity_type']['yoga']['total_points'], 20)
+    
+    def test_invalid_date_range(self):
+        """Test malformed date bounds are rejected"""
+        response = self.client.get(reverse('user-stats', args=[self.user._id]), {'to': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TeamRollupTest(APITestCase):
+    """Test cases for team rollups kept in sync with members and activities"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [make_user(f'member{i}') for i in range(2)]
+        for user, points in zip(self.users, [40, 60]):
+            Activity.objects.create(
+                user_id=user._id,
+                activity_type='cycling',
+                duration=45,
+                calories=400,
+                points=points,
+                date=timezone.now()
+            )
+        response = self.client.post(
+            reverse('team-list'),
+            {'name': 'Rollup Team', 'captain_id': self.users[0]._id, 'member_ids': [self.users[0]._id]},
+            format='json'
+        )
+        self.team_id = response.data['id']
+    
+    def team(self):
+        return Team.objects.get(pk=self.team_id)
+    
+    def test_create_team_builds_rollup(self):
+        """Test a new team starts with its members' history"""
+        team = self.team()
+        self.assertEqual((team.member_count, team.total_points, team.total_activities), (1, 40, 1))
+    
+    def test_membership_changes_move_history(self):
+        """Test adding and removing members moves their totals"""
+        second = self.users[1]._id
+        response = self.client.post(reverse('team-add-member', args=[self.team_id]), {'user_id': second}, format='json')
+        self.assertEqual(response.data['total_points'], 100)
+        self.assertEqual(response.data['member_count'], 2)
+        
+        response = self.client.post(reverse('team-remove-member', args=[self.team_id]), {'user_id': second}, format='json')
+        self.assertEqual(response.data['total_points'], 40)
+        self.assertEqual(response.data['member_count'], 1)
+    
+    def test_member_activity_updates_rollup(self):
+        """Test a member's new activity is added to the team rollup"""
+        self.client.post(
+            reverse('activity-list'),
+            {
+                'user_id': self.users[0]._id,
+                'activity_type': 'running',
+                'duration': 15,
+                'calories': 150,
+                'points': 25,
+                'date': timezone.now().isoformat()
+            },
+            format='json'
+        )
+        team = self.team()
+        self.assertEqual((team.total_points, team.total_activities, team.total_duration), (65, 2, 60))
+
+
+class ActivityPaginationTest(APITestCase):
+    """Test cases for keyset pagination of activity listings"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('pager')
+        same_day = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            Activity.objects.create(
+                user_id=self.user._id,
+                activity_type='walking',
+                duration=10,
+                calories=50,
+                points=i,
+                date=same_day if i < 3 else timezone.now() - timedelta(hours=i)
+            )
+    
+    def collect(self, url, params):
+        seen = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['id'] for row in response.data['results'])
+            if response.data['next'] is None:
+                return seen
+            response = self.client.get(response.data['next'])
+    
+    def test_cursor_walks_every_row_once_in_order(self):
+        """Test pages cover all rows, newest first, including tied dates"""
+        seen = self.collect(reverse('activity-list'), {'page_size': 2})
+        expected = list(Activity.objects.order_by('-date', '-_id').values_list('_id', flat=True))
+        self.assertEqual(seen, expected)
+    
+    def test_insert_while_paging_does_not_shift_pages(self):
+        """Test a new activity does not duplicate rows on later pages"""
+        first = self.client.get(reverse('user-activities', args=[self.user._id]), {'page_size': 2})
+        Activity.objects.create(
+            user_id=self.user._id,
+            activity_type='walking',
+            duration=10,
+            calories=50,
+            points=9,
+            date=timezone.now()
+        )
+        rest = self.collect(first.data['next'], {})
+        self.assertEqual(len(rest), 3)
+        self.assertFalse(set(rest) & {row['id'] for row in first.data['results']})
+    
+    def test_estimated_count_and_invalid_cursor(self):
+        """Test the optional estimated count and cursor validation"""
+        Leaderboard.objects.create(user_id=self.user._id, username='pager', total_activities=5)
+        response = self.client.get(reverse('user-activities', args=[self.user._id]), {'count': 'estimated'})
+        self.assertEqual(response.data['estimated_count'], 5)
+        
+        response = self.client.get(reverse('activity-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IndexDeclarationTest(TestCase):
+    """Test cases for MongoDB index definitions built from the models"""
+    
+    def test_declared_indexes(self):
+        """Test Meta.indexes and unique fields become pymongo indexes"""
+        activity_keys = [list(index.document['key'].items()) for index in index_models(Activity)]
+        self.assertIn([('user_id', 1), ('date', -1), ('_id', -1)], activity_keys)
+        
+        user_indexes = {index.document['name']: index.document for index in index_models(User)}
+        self.assertTrue(user_indexes['users_email_uniq']['unique'])
+        self.assertTrue(user_indexes['users_username_uniq']['unique'])
+    
+    def test_existing_keys_are_skipped(self):
+        """Test indexes already built on the same keys under other names are not recreated"""
+        existing = {
+            '_id_': {'key': [('_id', 1)]},
+            'email_1': {'key': [('email', 1.0)], 'unique': True}
+        }
+        names = [index.document['name'] for index in missing_indexes(index_models(User), existing)]
+        self.assertEqual(names, ['users_username_uniq'])
+    
+    def test_collection_scan_detection(self):
+        """Test nested explain() plans are searched for COLLSCAN"""
+        indexed = {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}}
+        scanned = {'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}}
+        self.assertFalse(is_collection_scan(indexed))
+        self.assertTrue(is_collection_scan(scanned))
+
+
+class BulkIngestTest(APITestCase):
+    """Test cases for the streaming bulk activity endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('device')
+    
+    def activity(self, points):
+        return {
+            'user_id': self.user._id,
+            'activity_type': 'swimming',
+            'duration': 20,
+            'calories': 180,
+            'points': points,
+            'date': timezone.now().isoformat()
+        }
+    
+    def test_ndjson_with_per_item_errors(self):
+        """Test NDJSON upload inserts valid lines and reports bad ones"""
+        lines = [
+            json.dumps(self.activity(10)),
+            '{not json',
+            '',
+            json.dumps({'user_id': self.user._id}),
+            json.dumps(self.activity(15)),
+        ]
+        response = self.client.post(
+            reverse('activity-bulk'),
+            data='\n'.join(lines),
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['received'], 4)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(Activity.objects.count(), 2)
+        self.assertEqual(Leaderboard.objects.get(user_id=self.user._id).total_points, 25)
+    
+    def test_json_array(self):
+        """Test a JSON array body is ingested element by element"""
+        body = json.dumps([self.activity(points) for points in range(1, 6)], indent=2)
+        response = self.client.post(reverse('activity-bulk'), data=body, content_type='application/json')
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(response.data['failed'], 0)
+        self.assertEqual(Leaderboard.objects.get(user_id=self.user._id).total_activities, 5)
+    
+    def test_truncated_json_array(self):
+        """Test complete elements before a parse error are kept"""
+        body = '[' + json.dumps(self.activity(7)) + ', {"user_id": '
+        response = self.client.post(reverse('activity-bulk'), data=body, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 1)
+        self.assertIn('parse_error', response.data)
+    
+    def test_oversized_items_stop_the_ingest(self):
+        """Test an item longer than MAX_ITEM_SIZE is rejected without reading on"""
+        oversized = '{"notes": "' + 'x' * 400
+        original = ingest.MAX_ITEM_SIZE
+        ingest.MAX_ITEM_SIZE = 300
+        try:
+            for body, content_type in (
+                ('[' + json.dumps(self.activity(7)) + ', ' + oversized + '"}]', 'application/json'),
+                ('[' + json.dumps(self.activity(7)) + ', ' + oversized, 'application/json'),
+                (json.dumps(self.activity(7)) + '\n' + oversized + '"}\n', 'application/x-ndjson'),
+            ):
+                response = self.client.post(reverse('activity-bulk'), data=body, content_type=content_type)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(response.data['created'], 1)
+                self.assertIn('size limit', response.data['parse_error'])
+        finally:
+            ingest.MAX_ITEM_SIZE = original
+
+
+class ResponseCacheTest(APITestCase):
+    """Test cases for cached leaderboard and workout responses"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+        self.entry = Leaderboard.objects.create(user_id='u1', username='cached', total_points=10, rank=1)
+    
+    def test_etag_and_not_modified(self):
+        """Test repeat polls with a matching ETag get an empty 304"""
+        response = self.client.get(reverse('leaderboard-top'))
+        etag = response['ETag']
+        
+        # Only the namespace version is read
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('leaderboard-top'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_write_invalidates_cached_response(self):
+        """Test a leaderboard write serves fresh data with a new ETag"""
+        first = self.client.get(reverse('leaderboard-top'))
+        self.entry.total_points = 99
+        self.entry.save()
+        
+        second = self.client.get(reverse('leaderboard-top'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data[0]['total_points'], 99)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+    
+    def test_recommend_is_keyed_by_query(self):
+        """Test different query strings are cached separately"""
+        Workout.objects.create(
+            name='Plank',
+            description='Core',
+            fitness_level='advanced',
+            activity_type='strength',
+            duration=5,
+            calories_estimate=30
+        )
+        beginner = self.client.get(reverse('workout-recommend'))
+        advanced = self.client.get(reverse('workout-recommend'), {'fitness_level': 'advanced'})
+        self.assertEqual(len(beginner.data), 0)
+        self.assertEqual(len(advanced.data), 1)
+    
+    def test_lru_eviction(self):
+        """Test the LRU backend evicts the least recently used entry"""
+        cache = LRUBackend(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+    
+    def test_entries_expire_and_versions_are_shared(self):
+        """Test entries expire after the timeout and a bump in one worker reaches the others"""
+        cache = LRUBackend(timeout=0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        
+        other = LRUBackend()
+        before = other.get_version('workouts')
+        cache.bump_version('workouts')
+        self.assertNotEqual(other.get_version('workouts'), before)
+        self.assertEqual(other.get_version('workouts'), cache.get_version('workouts'))
+    
+    def test_activity_writes_invalidate_once(self):
+        """Test a bulk ingest bumps the leaderboard version once, after its last chunk"""
+        user = make_user('batcher')
+        body = '\n'.join(json.dumps({
+            'user_id': user._id, 'activity_type': 'running', 'duration': 30, 'calories': 300,
+            'points': 10, 'date': timezone.now().isoformat()
+        }) for _ in range(3))
+        before = CacheVersion.objects.get_or_create(pk='leaderboard', defaults={'epoch': 'test'})[0].version
+        self.client.post(reverse('activity-bulk'), data=body, content_type='application/x-ndjson')
+        self.assertEqual(CacheVersion.objects.get(pk='leaderboard').version, before + 1)
+
+
+class TrendsAPITest(APITestCase):
+    """Test cases for daily rollups and the trends endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('trender')
+        # Monday 2026-10-12 and Wednesday 2026-10-14 are in ISO week 42
+        self.days = [
+            timezone.make_aware(datetime(2026, 10, 12, 9)),
+            timezone.make_aware(datetime(2026, 10, 14, 9)),
+            timezone.make_aware(datetime(2026, 10, 14, 18)),
+            timezone.make_aware(datetime(2026, 10, 20, 9)),
+        ]
+        for date, activity_type in zip(self.days, ['running', 'running', 'yoga', 'running']):
+            response = self.client.post(
+                reverse('activity-list'),
+                {
+                    'user_id': self.user._id,
+                    'activity_type': activity_type,
+                    'duration': 30,
+                    'calories': 250,
+                    'points': 10,
+                    'date': date.isoformat()
+                },
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def trends(self, **params):
+        return self.client.get(
+            reverse('user-trends', args=[self.user._id]),
+            {'from': '2026-10-01', 'to': '2026-10-31', **params}
+        )
+    
+    def test_daily_rollups_maintained_on_write(self):
+        """Test one bucket per user, day and activity type"""
+        self.assertEqual(DailyActivityRollup.objects.count(), 4)
+        response = self.trends()
+        self.assertEqual([bucket['period'] for bucket in response.data['buckets']], ['2026-10-12', '2026-10-14', '2026-10-20'])
+        self.assertEqual(response.data['buckets'][1]['total_activities'], 2)
+    
+    def test_weekly_and_monthly_granularity(self):
+        """Test daily buckets are summed into weeks and months"""
+        weeks = self.trends(granularity='week').data['buckets']
+        self.assertEqual([(week['period'], week['total_points']) for week in weeks], [('2026-W42', 30), ('2026-W43', 10)])
+        self.assertEqual(weeks[0]['by_activity_type']['yoga']['total_activities'], 1)
+        
+        months = self.trends(granularity='month').data['buckets']
+        self.assertEqual(len(months), 1)
+        self.assertEqual(months[0]['total_calories'], 1000)
+    
+    def test_delete_and_backfill(self):
+        """Test deletes empty their bucket and a backfill rebuilds the same buckets"""
+        yoga = Activity.objects.get(activity_type='yoga')
+        self.client.delete(reverse('activity-detail', args=[yoga._id]))
+        self.assertFalse(DailyActivityRollup.objects.filter(activity_type='yoga').exists())
+        
+        before = sorted(DailyActivityRollup.objects.values_list('day', 'activity_type', 'total_points'))
+        self.assertEqual(rebuild_rollups(), 3)
+        after = sorted(DailyActivityRollup.objects.values_list('day', 'activity_type', 'total_points'))
+        self.assertEqual(before, after)
+    
+    def test_invalid_granularity(self):
+        """Test unknown granularities are rejected"""
+        self.assertEqual(self.trends(granularity='year').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TeamDocuments:
+    """The few pymongo collection calls memberships makes, over documents kept as stored"""
+    
+    def __init__(self, *documents):
+        self.documents = {document['_id']: dict(document) for document in documents}
+    
+    def find_one(self, query, projection=None):
+        for document in self.documents.values():
+            if all(
+                isinstance(document.get(key), list) if isinstance(condition, dict) else document.get(key) == condition
+                for key, condition in query.items()
+            ):
+                return dict(document)
+        return None
+    
+    def find_one_and_update(self, query, update, projection=None):
+        before = self.find_one(query)
+        if before is None:
+            return None
+        members = before['member_ids']
+        if not isinstance(members, list):
+            raise WriteError('Cannot apply the update to a non-array field', 2)
+        if '$addToSet' in update:
+            members = members + [user_id for user_id in update['$addToSet']['member_ids']['$each'] if user_id not in members]
+        if '$pull' in update:
+            members = [user_id for user_id in members if user_id not in update['$pull']['member_ids']['$in']]
+        self.documents[before['_id']]['member_ids'] = members
+        return before
+    
+    def update_one(self, query, update):
+        document = self.find_one(query)
+        if document is not None:
+            self.documents[document['_id']].update(update['$set'])
+
+
+class TeamMembershipAPITest(APITestCase):
+    """Test cases for atomic and batched team membership changes"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user_ids = [make_user(f'joiner{i}')._id for i in range(3)]
+        Activity.objects.create(
+            user_id=self.user_ids[2],
+            activity_type='rowing',
+            duration=40,
+            calories=350,
+            points=70,
+            date=timezone.now()
+        )
+        self.team = Team.objects.create(name='Batch Team', captain_id=self.user_ids[0], member_ids=[self.user_ids[0]])
+        rebuild_team(self.team)
+    
+    def test_bulk_add_and_remove(self):
+        """Test many members are added and removed in one call"""
+        response = self.client.post(
+            reverse('team-bulk-members', args=[self.team._id]),
+            {'add': self.user_ids, 'remove': []},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['added'], self.user_ids[1:])
+        self.assertEqual(response.data['team']['member_ids'], self.user_ids)
+        self.assertEqual(response.data['team']['total_points'], 70)
+        
+        response = self.client.post(
+            reverse('team-bulk-members', args=[self.team._id]),
+            {'remove': self.user_ids[1:] + ['not-a-member']},
+            format='json'
+        )
+        self.assertEqual(response.data['removed'], self.user_ids[1:])
+        self.assertEqual(response.data['team']['member_count'], 1)
+        self.assertEqual(response.data['team']['total_points'], 0)
+    
+    def test_stale_instance_does_not_lose_members(self):
+        """Test membership changes apply to the stored set, not a loaded copy"""
+        stale = Team.objects.get(pk=self.team._id)
+        self.client.post(reverse('team-add-member', args=[self.team._id]), {'user_id': self.user_ids[1]}, format='json')
+        self.client.post(reverse('team-add-member', args=[stale._id]), {'user_id': self.user_ids[2]}, format='json')
+        self.assertEqual(Team.objects.get(pk=self.team._id).member_ids, self.user_ids)
+    
+    def test_update_replaces_member_set(self):
+        """Test a PATCH of member_ids is applied as a set difference"""
+        response = self.client.patch(
+            reverse('team-detail', args=[self.team._id]),
+            {'member_ids': [self.user_ids[2]]},
+            format='json'
+        )
+        self.assertEqual(response.data['member_ids'], [self.user_ids[2]])
+        self.assertEqual(response.data['total_points'], 70)
+    
+    def test_legacy_string_members_are_converted(self):
+        """Test teams whose member_ids is still a JSON string are converted on their first change"""
+        documents = TeamDocuments({'_id': self.team._id, 'member_ids': json.dumps([self.user_ids[0]])})
+        with mock.patch.object(memberships, 'get_collection', return_value=documents):
+            self.assertEqual(memberships.add_members(self.team._id, self.user_ids), self.user_ids[1:])
+            self.assertEqual(documents.documents[self.team._id]['member_ids'], self.user_ids)
+            
+            documents.documents[self.team._id]['member_ids'] = json.dumps(self.user_ids)
+            self.assertEqual(memberships.remove_members(self.team._id, self.user_ids[:2]), self.user_ids[:2])
+            self.assertEqual(documents.documents[self.team._id]['member_ids'], self.user_ids[2:])
+            
+            with self.assertRaises(Team.DoesNotExist):
+                memberships.add_members('missing', self.user_ids)
+    
+    def test_bulk_members_on_legacy_team(self):
+        """Test bulk onboarding works on a team whose member_ids is still a JSON string"""
+        documents = TeamDocuments({'_id': self.team._id, 'member_ids': json.dumps(self.user_ids[:2])})
+        with mock.patch.object(memberships, 'get_collection', return_value=documents):
+            response = self.client.post(
+                reverse('team-bulk-members', args=[self.team._id]),
+                {'add': self.user_ids[1:], 'remove': [self.user_ids[0]]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['added'], response.data['removed']), ([self.user_ids[2]], [self.user_ids[0]]))
+        self.assertEqual(documents.documents[self.team._id]['member_ids'], self.user_ids[1:])
+    
+    def test_invalid_bulk_payload(self):
+        """Test non-list payloads are rejected"""
+        response = self.client.post(
+            reverse('team-bulk-members', args=[self.team._id]),
+            {'add': 'everyone'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastSerializationTest(APITestCase):
+    """Test cases for the read-only fast serialization path"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('fastuser', full_name='Fast User \u2028 Ünïcode')
+        Team.objects.create(name='Fast Team', captain_id=self.user._id, member_ids=[self.user._id])
+        for distance in (5.25, 0.00001, None):
+            Activity.objects.create(
+                user_id=self.user._id,
+                activity_type='running',
+                duration=30,
+                distance=distance,
+                calories=300,
+                points=50,
+                date=timezone.now()
+            )
+        Leaderboard.objects.create(user_id=self.user._id, username='fastuser', total_points=150, rank=1)
+        Workout.objects.create(
+            name='Sprints',
+            description='Short bursts',
+            fitness_level='beginner',
+            activity_type='running',
+            duration=20,
+            calories_estimate=200,
+            instructions=['Warm up', 'Sprint'],
+            equipment_needed=[]
+        )
+    
+    def test_matches_model_serializers(self):
+        """Test fast rows render byte-for-byte like the model serializers"""
+        serializers = (UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer)
+        for serializer_class in serializers:
+            queryset = serializer_class.Meta.model.objects.all()
+            fast = fast_serializer(serializer_class)
+            expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+            self.assertEqual(FastJSONRenderer().render(fast.to_representation(fast.values(queryset))), expected)
+    
+    def test_list_response_unchanged(self):
+        """Test a paginated listing renders like the serializer output"""
+        response = self.client.get(reverse('user-activities', args=[self.user._id]))
+        activities = Activity.objects.order_by('-date', '-_id')
+        expected = JSONRenderer().render({
+            'next': None,
+            'results': ActivitySerializer(activities, many=True).data
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, expected)
+
+
+class AsyncViewsTest(APITestCase):
+    """Test cases for the native async read endpoints"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('asyncuser')
+        self.team = Team.objects.create(name='Async Team', captain_id=self.user._id, member_ids=[self.user._id])
+        rebuild_team(self.team)
+        for activity_type in ('running', 'cycling'):
+            self.client.post(reverse('activity-list'), {
+                'user_id': self.user._id,
+                'activity_type': activity_type,
+                'duration': 30,
+                'calories': 250,
+                'points': 40,
+                'date': timezone.now().isoformat()
+            }, format='json')
+    
+    def test_async_endpoints_match_sync(self):
+        """Test each async endpoint returns the same bytes as its viewset action"""
+        async_client = AsyncClient()
+        pairs = [
+            (reverse('leaderboard-top'), reverse('async-leaderboard-top')),
+            (reverse('leaderboard-top') + '?window=week', reverse('async-leaderboard-top') + '?window=week'),
+            (reverse('user-stats', args=[self.user._id]), reverse('async-user-stats', args=[self.user._id])),
+            (reverse('team-stats', args=[self.team._id]) + '?breakdown=activity_type',
+             reverse('async-team-stats', args=[self.team._id]) + '?breakdown=activity_type'),
+            (reverse('activity-list') + '?page_size=1', reverse('async-activity-list') + '?page_size=1')
+        ]
+        for sync_url, async_url in pairs:
+            expected = self.client.get(sync_url)
+            response = async_to_sync(async_client.get)(async_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content.replace(b'/api/activities/', b'/api/async/activities/'))
+            self.assertEqual(response.headers.get('ETag'), expected.headers.get('ETag'))
+    
+    def test_async_top_not_modified(self):
+        """Test the async leaderboard answers a matching If-None-Match with a 304"""
+        etag = self.client.get(reverse('leaderboard-top')).headers['ETag']
+        response = async_to_sync(AsyncClient().get)(reverse('async-leaderboard-top'), **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers['ETag'], etag)
+    
+    def test_async_not_found(self):
+        """Test an unknown user gets a 404"""
+        response = async_to_sync(AsyncClient().get)(reverse('async-user-stats', args=['missing']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(OCTOFIT_READ_REPLICAS={'ALIASES': ['replica'], 'DECLARED_LAG': {'replica': 20}})
+class ReplicaRoutingTest(TestCase):
+    """Test cases for read-replica routing"""
+    
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        caches['default'].clear()
+    
+    def route(self, request, view_func):
+        """Return the alias an Activity read would use inside ``request``"""
+        def get_response(request):
+            middleware.process_view(request, view_func, (), {})
+            return HttpResponse(self.router.db_for_read(Activity) or 'default')
+        middleware = ReplicaRoutingMiddleware(get_response)
+        return middleware(request)
+    
+    def test_replica_within_tolerance(self):
+        """Test reads use a replica only when its lag is tolerated"""
+        with replica_reads(max_staleness=30):
+            self.assertEqual(self.router.db_for_read(Activity), 'replica')
+            self.assertEqual(self.router.db_for_write(Activity), 'default')
+        with replica_reads(max_staleness=10):
+            self.assertIsNone(self.router.db_for_read(Activity))
+        self.assertIsNone(self.router.db_for_read(Activity))
+    
+    def test_endpoint_staleness(self):
+        """Test each endpoint's declared staleness picks the database"""
+        top = LeaderboardViewSet.as_view({'get': 'top'})
+        activities = ActivityViewSet.as_view({'get': 'list', 'post': 'create'})
+        self.assertEqual(self.route(self.factory.get('/'), top).content, b'replica')
+        self.assertEqual(self.route(self.factory.get('/'), activities).content, b'default')
+    
+    def test_read_after_write(self):
+        """Test a write pins the client's following reads to the primary"""
+        top = LeaderboardViewSet.as_view({'get': 'top'})
+        response = self.route(self.factory.post('/'), top)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request, top).content, b'default')
+    
+    @override_settings(OCTOFIT_READ_REPLICAS={
+        'ALIASES': ['replica', 'replica2'], 'DECLARED_LAG': {'replica': 1, 'replica2': 1}
+    })
+    def test_one_replica_per_request(self):
+        """Test every read of a request or block goes to the same replica"""
+        for _ in range(10):
+            with replica_reads(max_staleness=30):
+                self.assertEqual(len({self.router.db_for_read(Activity) for _ in range(20)}), 1)
+    
+    @override_settings(OCTOFIT_READ_REPLICAS={'ALIASES': ['replica'], 'LAG_CHECK_INTERVAL': 60})
+    def test_lag_is_probed_in_the_background(self):
+        """Test routing never waits for a lag probe and uses a replica once it is probed"""
+        replicas._lag_cache.clear()
+        with mock.patch.object(replicas, 'replication_lag', return_value=2) as probe:
+            with replica_reads(max_staleness=30):
+                self.assertIsNone(self.router.db_for_read(Activity))
+            replicas._lag_probes['replica'].join(5)
+            with replica_reads(max_staleness=30):
+                self.assertEqual(self.router.db_for_read(Activity), 'replica')
+        probe.assert_called_once_with('replica')
+    
+    def test_read_after_write_without_cookies(self):
+        """Test a client that drops cookies is pinned by its credentials"""
+        top = LeaderboardViewSet.as_view({'get': 'top'})
+        self.route(self.factory.post('/', HTTP_AUTHORIZATION='Token writer'), top)
+        
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Token writer')
+        self.assertEqual(self.route(request, top).content, b'default')
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Token reader')
+        self.assertEqual(self.route(request, top).content, b'replica')
+    
+    def test_cached_responses_read_the_primary(self):
+        """Test a cache miss is never computed from a lagging replica"""
+        reads = []
+        
+        @cached_response('leaderboard')
+        def view(viewset, request):
+            reads.append(self.router.db_for_read(Activity))
+            return Response({})
+        
+        with replica_reads(max_staleness=30):
+            view(None, self.factory.get('/'))
+        self.assertEqual(reads, [None])
+
+
+class PopulateDbTest(TestCase):
+    """Test cases for the synthetic data generator"""
+    
+    def populate(self, seed):
+        call_command(
+            'populate_db', users=30, activities_per_user=6, teams=4, seed=seed,
+            workers=1, chunk_size=8, batch_size=50, stdout=StringIO()
+        )
+        return list(Activity.objects.order_by('_id').values_list('user_id', 'activity_type', 'points', 'duration'))
+    
+    def test_totals_match_generated_activities(self):
+        """Test every derived total agrees with the generated activities"""
+        self.populate(seed=42)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(TeamMembership.objects.count(), 30)
+        
+        for entry in Leaderboard.objects.all():
+            points = Activity.objects.filter(user_id=entry.user_id).aggregate(total=Sum('points'))['total'] or 0
+            self.assertEqual(entry.total_points, points)
+        for team in Team.objects.all():
+            points = Activity.objects.filter(user_id__in=team.member_ids).aggregate(total=Sum('points'))['total'] or 0
+            self.assertEqual(team.total_points, points)
+            self.assertEqual(team.member_count, len(team.member_ids))
+        self.assertEqual(
+            DailyActivityRollup.objects.aggregate(total=Sum('total_points'))['total'],
+            Activity.objects.aggregate(total=Sum('points'))['total']
+        )
+        self.assertEqual(Leaderboard.objects.order_by('-total_points').first().rank, 1)
+        for window in ('day', 'week', 'month'):
+            self.assertEqual(
+                WindowedLeaderboard.objects.filter(window=window).aggregate(total=Sum('total_points'))['total'],
+                Activity.objects.aggregate(total=Sum('points'))['total']
+            )
+    
+    def test_seed_is_reproducible(self):
+        """Test the same seed generates the same dataset"""
+        self.assertEqual(self.populate(seed=7), self.populate(seed=7))
+
+
+class BenchmarkTest(TestCase):
+    """Test cases for the endpoint benchmark suite"""
+    
+    def setUp(self):
+        call_command(
+            'populate_db', users=6, activities_per_user=3, teams=2, seed=1,
+            workers=1, stdout=StringIO()
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(OCTOFIT_ANALYTICS_DIR=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        analytics.write_snapshot()
+    
+    def test_every_scenario_succeeds_and_counts_queries(self):
+        """Test every endpoint is benchmarked without errors and with its database commands counted"""
+        results = benchmarks.run(benchmarks.build_scenarios(), iterations=2, warmup=1)
+        self.assertIn('leaderboard update_rankings', results)
+        self.assertIn('teams add_member', results)
+        self.assertIn('analytics summary', results)
+        for name, metrics in results.items():
+            self.assertEqual(metrics['errors'], 0, name)
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+        self.assertGreater(results['users stats']['db_commands'], 0)
+    
+    def test_compare_flags_regressions(self):
+        """Test slower p95s and extra database commands are reported against the baseline"""
+        results = benchmarks.run(benchmarks.build_scenarios(), iterations=2, warmup=0, only='users detail')
+        metrics = results['users detail']
+        self.assertEqual(benchmarks.compare(results, results), [])
+        
+        baseline = {'users detail': {**metrics, 'p95_ms': metrics['p95_ms'] / 10, 'db_commands': 0}}
+        regressions = benchmarks.compare(results, baseline, tolerance=0.5, noise_ms=0)
+        self.assertEqual(len(regressions), 2)
+
+
+class MetricsTest(APITestCase):
+    """Test cases for request metrics and the metrics endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('testuser', _id='507f1f77bcf86cd799439011', fitness_level='beginner')
+    
+    def test_server_timing_header(self):
+        """Test responses carry database and application timings"""
+        response = self.client.get(reverse('user-stats', args=[self.user._id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[0-9.]+;desc="[1-9][0-9]* commands"')
+        self.assertIn('app;dur=', timing)
+        self.assertIn('total;dur=', timing)
+    
+    def test_requests_are_recorded_per_action(self):
+        """Test each request is observed under its URL name and viewset action"""
+        labels = ('user-stats', 'stats', 'GET')
+        before, _ = metrics.DB_COMMANDS.samples(labels)
+        self.client.get(reverse('user-stats', args=[self.user._id]))
+        self.client.get(reverse('user-stats', args=[self.user._id]))
+        count, commands = metrics.DB_COMMANDS.samples(labels)
+        self.assertEqual(count, before + 2)
+        self.assertGreater(commands, 0)
+    
+    def test_metrics_endpoint(self):
+        """Test the metrics endpoint serves Prometheus histograms"""
+        self.client.get(reverse('user-detail', args=[self.user._id]))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE octofit_request_duration_seconds histogram', body)
+        self.assertIn(
+            'octofit_response_size_bytes_bucket{view="user-detail",action="retrieve",method="GET",le="+Inf"}',
+            body
+        )
+        self.assertIn('octofit_request_db_commands_count{view="user-detail",action="retrieve",method="GET"}', body)
+
+
+class LeaderboardRankTest(APITestCase):
+    """Test cases for the leaderboard rank lookup"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        board.invalidate()
+        for index, points in enumerate([100, 90, 90, 80, 70, 60]):
+            Leaderboard.objects.create(user_id=f'user{index}', username=f'user{index}', total_points=points)
+    
+    def get_rank(self, user_id, **params):
+        return self.client.get(reverse('leaderboard-rank', args=[user_id]), params)
+    
+    def test_rank_and_neighbours(self):
+        """Test the lookup returns the competition rank and surrounding entries"""
+        response = self.get_rank('user3', window=2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rank'], 4)
+        self.assertEqual(response.data['entry']['user_id'], 'user3')
+        self.assertEqual([entry['user_id'] for entry in response.data['above']], ['user1', 'user2'])
+        self.assertEqual([entry['rank'] for entry in response.data['above']], [2, 2])
+        self.assertEqual([entry['user_id'] for entry in response.data['below']], ['user4', 'user5'])
+        
+        response = self.get_rank('user0')
+        self.assertEqual(response.data['rank'], 1)
+        self.assertEqual(response.data['above'], [])
+        self.assertEqual(len(response.data['below']), 5)
+    
+    def test_index_follows_activity_writes(self):
+        """Test new points move a user without reloading the index"""
+        self.assertEqual(self.get_rank('user5').data['rank'], 6)
+        user = make_user('climber')
+        Leaderboard.objects.filter(user_id='user5').update(user_id=user._id)
+        board.invalidate()
+        self.assertEqual(self.get_rank(user._id).data['rank'], 6)
+        self.client.post(reverse('activity-list'), {
+            'user_id': user._id, 'activity_type': 'running', 'duration': 30,
+            'calories': 300, 'points': 35, 'date': timezone.now().isoformat()
+        }, format='json')
+        
+        response = self.get_rank(user._id, window=1)
+        self.assertEqual(response.data['rank'], 2)
+        self.assertEqual(response.data['entry']['total_points'], 95)
+        self.assertEqual([entry['user_id'] for entry in response.data['below']], ['user1'])
+    
+    def test_reload_does_not_block_readers(self):
+        """Test a stale index serves its previous lists while reloading and keeps changes made meanwhile"""
+        started, release = threading.Event(), threading.Event()
+        rows = [('a', 10), ('b', 20)]
+        
+        def loader():
+            if index.loaded:
+                started.set()
+                release.wait(5)
+            return list(rows)
+        
+        index = RankIndex(loader)
+        with override_settings(OCTOFIT_RANK_INDEX_REFRESH=0):
+            self.assertEqual(index.rank('a'), 2)
+            rows.append(('c', 30))
+            reloading = threading.Thread(target=index.rank, args=('a',))
+            reloading.start()
+            self.assertTrue(started.wait(5))
+            self.assertEqual(index.rank('a'), 2)
+            index.update('a', 50)
+            release.set()
+            reloading.join()
+        with override_settings(OCTOFIT_RANK_INDEX_REFRESH=None):
+            self.assertEqual(index.top(), [('a', 50, 1), ('c', 30, 2), ('b', 20, 3)])
+    
+    def test_warm_loads_in_the_background(self):
+        """Test warming an index loads it without a reader asking first"""
+        loaded = threading.Event()
+        
+        def loader():
+            loaded.set()
+            return [('a', 10)]
+        
+        index = RankIndex(loader)
+        with override_settings(OCTOFIT_RANK_INDEX_REFRESH=None):
+            index.warm()
+            self.assertTrue(loaded.wait(5))
+            for _ in range(100):
+                if index.loaded:
+                    break
+                time.sleep(0.01)
+            self.assertTrue(index.loaded)
+            self.assertEqual(index.rank('a'), 1)
+    
+    def test_invalid_lookups(self):
+        """Test unknown users and bad windows are rejected"""
+        self.assertEqual(self.get_rank('nobody').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get_rank('user1', window='many').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_rank('user1', window=500).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WindowedLeaderboardTest(APITestCase):
+    """Test cases for daily, weekly and monthly leaderboards"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        invalidate_boards()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+    
+    def log_activity(self, user, points, day):
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': user._id, 'activity_type': 'running', 'duration': 30, 'calories': 300,
+            'points': points, 'date': timezone.make_aware(datetime(2026, 10, day, 12)).isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+    
+    def top(self, **params):
+        response = self.client.get(reverse('leaderboard-top'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(entry['username'], entry['total_points'], entry['rank']) for entry in response.data]
+    
+    def test_boards_per_period(self):
+        """Test each window only counts the activities in its period"""
+        self.log_activity(self.alice, 50, day=13)
+        self.log_activity(self.bob, 30, day=14)
+        self.log_activity(self.bob, 40, day=20)
+        
+        self.assertEqual(self.top(window='week', period='2026-W42'), [('alice', 50, 1), ('bob', 30, 2)])
+        self.assertEqual(self.top(window='week', period='2026-W43'), [('bob', 40, 1)])
+        self.assertEqual(self.top(window='day', period='2026-10-14'), [('bob', 30, 1)])
+        self.assertEqual(self.top(window='month', period='2026-10'), [('bob', 70, 1), ('alice', 50, 2)])
+        self.assertEqual(self.top(window='week', period='2026-W44'), [])
+        
+        response = self.client.get(reverse('leaderboard-list'), {'window': 'week', 'period': '2026-W42'})
+        self.assertEqual([entry['user_id'] for entry in response.data], [self.alice._id, self.bob._id])
+    
+    def test_period_listing_is_paged(self):
+        """Test a period's listing returns ?limit= entries from ?offset="""
+        self.log_activity(self.alice, 50, day=13)
+        self.log_activity(self.bob, 30, day=14)
+        params = {'window': 'week', 'period': '2026-W42'}
+        
+        response = self.client.get(reverse('leaderboard-list'), {**params, 'limit': 1, 'offset': 1})
+        self.assertEqual([(entry['user_id'], entry['rank']) for entry in response.data], [(self.bob._id, 2)])
+        response = self.client.get(reverse('leaderboard-list'), {**params, 'offset': 2})
+        self.assertEqual(response.data, [])
+        for bad in ({'limit': 0}, {'limit': 1001}, {'offset': 3}):
+            response = self.client.get(reverse('leaderboard-list'), {**params, **bad})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_rank_in_period(self):
+        """Test the rank lookup works on a period's board"""
+        self.log_activity(self.alice, 50, day=13)
+        self.log_activity(self.bob, 30, day=14)
+        
+        response = self.client.get(
+            reverse('leaderboard-rank', args=[self.bob._id]),
+            {'window': 'week', 'period': '2026-W42', 'neighbours': 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rank'], 2)
+        self.assertEqual(response.data['entry']['period'], '2026-W42')
+        self.assertEqual([entry['user_id'] for entry in response.data['above']], [self.alice._id])
+        
+        response = self.client.get(
+            reverse('leaderboard-rank', args=[self.bob._id]), {'window': 'week', 'period': '2026-W40'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_updates_and_deletes_move_entries(self):
+        """Test edited and deleted activities leave their periods' boards"""
+        self.log_activity(self.alice, 50, day=13)
+        activity_id = self.log_activity(self.bob, 60, day=14)
+        self.assertEqual(self.top(window='week', period='2026-W42')[0], ('bob', 60, 1))
+        
+        self.client.patch(
+            reverse('activity-detail', args=[activity_id]),
+            {'date': timezone.make_aware(datetime(2026, 10, 21, 12)).isoformat()},
+            format='json'
+        )
+        self.assertEqual(self.top(window='week', period='2026-W42'), [('alice', 50, 1)])
+        self.assertEqual(self.top(window='week', period='2026-W43'), [('bob', 60, 1)])
+        
+        self.client.delete(reverse('activity-detail', args=[activity_id]))
+        self.assertEqual(self.top(window='week', period='2026-W43'), [])
+        self.assertFalse(WindowedLeaderboard.objects.filter(user_id=self.bob._id).exists())
+    
+    def test_rebuild_matches_incremental_entries(self):
+        """Test the backfill produces the incrementally maintained entries"""
+        self.log_activity(self.alice, 50, day=13)
+        self.log_activity(self.alice, 20, day=13)
+        self.log_activity(self.bob, 30, day=20)
+        fields = ('window', 'period', 'user_id', 'username', 'total_points', 'total_activities', 'total_duration')
+        maintained = sorted(WindowedLeaderboard.objects.values_list(*fields))
+        
+        self.assertEqual(rebuild_windows(), len(maintained))
+        self.assertEqual(sorted(WindowedLeaderboard.objects.values_list(*fields)), maintained)
+    
+    def test_invalid_window_or_period(self):
+        """Test unknown windows and malformed periods are rejected"""
+        for params in ({'window': 'year'}, {'window': 'week', 'period': '2026-42'},
+                       {'window': 'week', 'period': '2026-W60'}, {'window': 'month', 'period': '2026-13'}):
+            response = self.client.get(reverse('leaderboard-top'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class TeamLeaderboardTest(APITestCase):
+    """Test cases for the team leaderboard"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        team_ranking.invalidate()
+        self.users = [make_user(f'member{index}') for index in range(4)]
+        self.big = self.create_team('Big', self.users[:3])
+        self.small = self.create_team('Small', self.users[3:])
+        for user, points in zip(self.users, [40, 40, 40, 70]):
+            self.log_activity(user, points)
+    
+    def create_team(self, name, members):
+        response = self.client.post(reverse('team-list'), {
+            'name': name, 'captain_id': members[0]._id, 'member_ids': [user._id for user in members]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+    
+    def log_activity(self, user, points):
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': user._id, 'activity_type': 'running', 'duration': 30,
+            'calories': 300, 'points': points, 'date': timezone.now().isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def standings(self, **params):
+        response = self.client.get(reverse('team-leaderboard'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(team['name'], team['rank']) for team in response.data['results']]
+    
+    def test_total_and_average_metrics(self):
+        """Test teams rank by total points or by points per member"""
+        self.assertEqual(self.standings(), [('Big', 1), ('Small', 2)])
+        self.assertEqual(self.standings(metric='average'), [('Small', 1), ('Big', 2)])
+        self.assertEqual(self.standings(limit=1), [('Big', 1)])
+        
+        response = self.client.get(reverse('team-leaderboard'))
+        self.assertEqual(response.data['results'][0]['total_points'], 120)
+        self.assertEqual(response.data['results'][0]['average_points'], 40.0)
+        self.assertEqual(response.data['results'][0]['member_count'], 3)
+    
+    def test_rankings_follow_activities_and_membership(self):
+        """Test new points and member moves re-rank teams incrementally"""
+        self.assertEqual(self.standings(metric='average'), [('Small', 1), ('Big', 2)])
+        self.log_activity(self.users[0], 100)
+        self.assertEqual(self.standings(metric='average'), [('Big', 1), ('Small', 2)])
+        
+        self.client.post(reverse('team-remove-member', args=[self.big]), {'user_id': self.users[0]._id}, format='json')
+        self.assertEqual(self.standings(metric='average'), [('Small', 1), ('Big', 2)])
+        response = self.client.get(reverse('team-leaderboard'))
+        self.assertEqual(response.data['results'][0]['total_points'], 80)
+    
+    def test_rank_of_team(self):
+        """Test a team's rank is returned with its neighbours"""
+        response = self.client.get(reverse('team-leaderboard'), {'team': self.small, 'neighbours': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rank'], 2)
+        self.assertEqual(response.data['entry']['id'], self.small)
+        self.assertEqual([team['id'] for team in response.data['above']], [self.big])
+        self.assertEqual(response.data['below'], [])
+        
+        response = self.client.get(reverse('team-leaderboard'), {'team': 'missing'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('team-leaderboard'), {'metric': 'median'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_bulk_rebuild_matches_incremental_rollups(self):
+        """Test rebuilding every team from scratch reproduces the maintained rollups"""
+        fields = ('_id', 'member_count', 'total_points', 'total_activities', 'total_duration', 'total_calories')
+        maintained = sorted(Team.objects.values_list(*fields))
+        Team.objects.update(total_points=0, total_activities=0, member_count=0)
+        TeamMembership.objects.all().delete()
+        
+        report = rebuild_all_teams()
+        self.assertEqual(report, {'teams': 2, 'memberships': 4})
+        self.assertEqual(sorted(Team.objects.values_list(*fields)), maintained)
+        self.assertEqual(TeamMembership.objects.count(), 4)
+        self.assertEqual(self.standings(), [('Big', 1), ('Small', 2)])
+
+
+class WorkoutRecommendationTest(APITestCase):
+    """Test cases for history-aware workout recommendations"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for name, level, activity_type, duration, calories in [
+            ('Easy Run', 'beginner', 'running', 30, 300),
+            ('Gentle Yoga', 'beginner', 'yoga', 45, 150),
+            ('Power Lifting', 'advanced', 'weightlifting', 60, 600),
+            ('Tempo Run', 'advanced', 'running', 45, 550),
+            ('Spin Class', 'intermediate', 'cycling', 40, 400),
+        ]:
+            Workout.objects.create(
+                name=name, description=name, fitness_level=level, activity_type=activity_type,
+                duration=duration, calories_estimate=calories
+            )
+        self.user = make_user('trainee', fitness_level='beginner')
+    
+    def log_activity(self, activity_type, duration, calories):
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': self.user._id, 'activity_type': activity_type, 'duration': duration,
+            'calories': calories, 'points': duration, 'date': timezone.now().isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def recommended(self):
+        response = self.client.get(reverse('workout-recommend'), {'user_id': self.user._id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [workout['name'] for workout in response.data]
+    
+    def test_recommendations_follow_activity_history(self):
+        """Test logging activities refreshes the user's recommendations"""
+        self.log_activity('yoga', 45, 160)
+        self.assertEqual(self.recommended()[0], 'Gentle Yoga')
+        
+        for _ in range(4):
+            self.log_activity('running', 45, 520)
+        self.assertEqual(set(self.recommended()[:2]), {'Tempo Run', 'Easy Run'})
+        self.assertEqual(len(self.recommended()), recommendations.TOP_N)
+    
+    def test_served_from_precomputed_entry(self):
+        """Test a precomputed user is served with two queries besides the cache version"""
+        self.log_activity('cycling', 40, 380)
+        self.assertEqual(recommendations.refresh_all(), 1)
+        self.recommended()
+        with self.assertNumQueries(3):
+            self.assertEqual(self.recommended()[0], 'Spin Class')
+    
+    def test_catalogue_changes_recompute_stale_entries(self):
+        """Test entries scored against an older catalogue are recomputed"""
+        self.log_activity('boxing', 30, 400)
+        self.assertNotIn('Heavy Bag', self.recommended())
+        Workout.objects.create(
+            name='Heavy Bag', description='Heavy Bag', fitness_level='beginner', activity_type='boxing',
+            duration=30, calories_estimate=400
+        )
+        self.assertEqual(self.recommended()[0], 'Heavy Bag')
+    
+    def test_batch_scoring_matches_per_user_scoring(self):
+        """Test a batch scored as one matrix product ranks like the per-user loop"""
+        current = recommendations.catalogue()
+        profiles = {
+            'yoga': {'mix': {'yoga': 1.0}, 'fitness_level': 'beginner', 'duration': 45, 'calories': 160},
+            'mixed': {'mix': {'running': 0.5, 'cycling': 0.5}, 'fitness_level': 'advanced', 'duration': 50, 'calories': 500},
+            'new': {'mix': {}, 'fitness_level': None, 'duration': None, 'calories': None},
+        }
+        batched = current.rank(profiles)
+        numpy = recommendations.numpy
+        recommendations.numpy = None
+        try:
+            looped = recommendations.Catalogue([
+                dict(workout) for workout in Workout.objects.values(
+                    '_id', 'activity_type', 'fitness_level', 'duration', 'calories_estimate'
+                )
+            ]).rank(profiles)
+        finally:
+            recommendations.numpy = numpy
+        self.assertEqual(batched, looped)
+        self.assertEqual(len(batched['yoga']), recommendations.TOP_N)
+    
+    def test_unknown_user_and_level_fallback(self):
+        """Test unknown users are rejected and requests without user_id still match by level"""
+        response = self.client.get(reverse('workout-recommend'), {'user_id': 'missing'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('workout-recommend'), {'fitness_level': 'advanced'})
+        self.assertEqual({workout['name'] for workout in response.data}, {'Power Lifting', 'Tempo Run'})
+
+
+class SearchTest(APITestCase):
+    """Test cases for full-text search over workouts and activities"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.runner = make_user('runner')
+        self.swimmer = make_user('swimmer')
+        self.workout(
+            'Hill Sprints', 'running', 'advanced', 'Short uphill sprints',
+            ['Warm up jogging', 'Sprint up the hill', 'Walk down']
+        )
+        self.workout('Recovery Jog', 'running', 'beginner', 'An easy jog after hill sprints', [])
+        self.workout('Pool Laps', 'swimming', 'intermediate', 'Steady freestyle laps', ['Swim 20 laps'])
+    
+    def workout(self, name, activity_type, fitness_level, description, instructions):
+        return Workout.objects.create(
+            name=name, description=description, fitness_level=fitness_level, activity_type=activity_type,
+            duration=30, calories_estimate=300, instructions=instructions
+        )
+    
+    def log(self, user, notes, activity_type='running'):
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': user._id, 'activity_type': activity_type, 'duration': 30, 'calories': 300,
+            'points': 30, 'date': timezone.now().isoformat(), 'notes': notes
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+    
+    def search(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_workouts_ranked_by_field_weight(self):
+        """Test name matches rank above description matches and every term must match"""
+        results = self.search('workout-list', q='hill sprints')
+        self.assertEqual([workout['name'] for workout in results], ['Hill Sprints', 'Recovery Jog'])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+        self.assertEqual([workout['name'] for workout in self.search('workout-list', q='SWIM laps')], ['Pool Laps'])
+        self.assertEqual(self.search('workout-list', q='hill laps'), [])
+    
+    def test_workout_search_with_filters_and_limit(self):
+        """Test ?q= combines with the list filters and honours ?limit="""
+        results = self.search('workout-list', q='sprints', fitness_level='beginner')
+        self.assertEqual([workout['name'] for workout in results], ['Recovery Jog'])
+        self.assertEqual(len(self.search('workout-list', q='sprints', limit=1)), 1)
+        response = self.client.get(reverse('workout-list'), {'q': 'sprints', 'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_workout_edits_are_reindexed(self):
+        """Test saving and deleting workouts keeps the index current"""
+        workout = Workout.objects.get(name='Pool Laps')
+        workout.name = 'Open Water'
+        workout.save()
+        self.assertEqual(self.search('workout-list', q='laps pool'), [])
+        self.assertEqual([item['name'] for item in self.search('workout-list', q='open water')], ['Open Water'])
+        workout.delete()
+        self.assertEqual(self.search('workout-list', q='open water'), [])
+    
+    def test_activity_notes_follow_writes(self):
+        """Test activities logged, edited and deleted through the API are searchable"""
+        first = self.log(self.runner, 'Foggy morning along the river')
+        self.log(self.swimmer, 'Morning swim in the river', activity_type='swimming')
+        self.assertEqual(len(self.search('activity-list', q='river morning')), 2)
+        
+        response = self.client.patch(reverse('activity-detail', args=[first]), {'notes': 'Evening tempo'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.search('activity-list', q='river')), 1)
+        self.assertEqual([item['id'] for item in self.search('activity-list', q='tempo')], [first])
+        
+        self.client.delete(reverse('activity-detail', args=[first]))
+        self.assertEqual(self.search('activity-list', q='tempo'), [])
+    
+    def test_activity_search_scoped_to_user(self):
+        """Test ?user_id= restricts the search to one user's activities"""
+        self.log(self.runner, 'Long run by the lake')
+        self.log(self.swimmer, 'Lake swim', activity_type='swimming')
+        results = self.search('activity-list', q='lake', user_id=self.swimmer._id)
+        self.assertEqual([item['user_id'] for item in results], [self.swimmer._id])
+        self.assertEqual(self.search('activity-list', q='lake swimming', user_id=self.runner._id), [])
+    
+    def test_candidates_are_the_heaviest_postings(self):
+        """Test truncated candidates keep the best matches and ?limit= applies last"""
+        light = [self.log(self.runner, 'Tempo') for _ in range(3)]
+        heavy = self.log(self.runner, 'Tempo tempo tempo')
+        original = search.MAX_CANDIDATES
+        search.MAX_CANDIDATES = 1
+        try:
+            self.assertEqual([item['id'] for item in self.search('activity-list', q='tempo')], [heavy])
+        finally:
+            search.MAX_CANDIDATES = original
+        results = self.search('activity-list', q='tempo', user_id=self.runner._id, limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['id'], heavy)
+        self.assertIn(results[1]['id'], light)
+    
+    def test_bulk_ingest_and_rebuild(self):
+        """Test bulk-ingested activities are indexed and the index can be rebuilt"""
+        body = '\n'.join(json.dumps({
+            'user_id': self.runner._id, 'activity_type': 'cycling', 'duration': 40, 'calories': 400,
+            'points': 40, 'date': timezone.now().isoformat(), 'notes': f'Commute number {index}'
+        }) for index in range(3))
+        self.client.post(reverse('activity-bulk'), data=body, content_type='application/x-ndjson')
+        self.assertEqual(len(self.search('activity-list', q='commute')), 3)
+        
+        SearchTerm.objects.all().delete()
+        self.assertEqual(self.search('activity-list', q='commute'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('activity: 3 documents', out.getvalue())
+        self.assertEqual(len(self.search('activity-list', q='commute')), 3)
+        self.assertEqual(len(self.search('workout-list', q='sprints')), 2)
+    
+    def test_admin_search_uses_index(self):
+        """Test the admin search box is answered from the index"""
+        self.log(self.runner, 'Intervals on the track')
+        self.log(self.swimmer, 'Drills', activity_type='swimming')
+        activity_admin = ActivityAdmin(Activity, admin.site)
+        queryset, duplicates = activity_admin.get_search_results(None, Activity.objects.all(), 'track intervals')
+        self.assertFalse(duplicates)
+        self.assertEqual([activity.notes for activity in queryset], ['Intervals on the track'])
+        queryset, _ = activity_admin.get_search_results(None, Activity.objects.all(), self.swimmer._id)
+        self.assertEqual([activity.notes for activity in queryset], ['Drills'])
+        
+        workout_admin = WorkoutAdmin(Workout, admin.site)
+        queryset, _ = workout_admin.get_search_results(None, Workout.objects.all(), 'jogging')
+        self.assertEqual([workout.name for workout in queryset], ['Hill Sprints'])
+
+
+class ActivityExportTest(APITestCase):
+    """Test cases for streaming activity exports"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user('exporter')
+        other = make_user('other')
+        start = timezone.make_aware(datetime(2026, 3, 1, 12))
+        for day in range(5):
+            Activity.objects.create(
+                user_id=self.user._id, activity_type='running', duration=30 + day, calories=300,
+                points=10 * day, date=start + timedelta(days=day), notes=f'Run, day "{day}"'
+            )
+        Activity.objects.create(
+            user_id=other._id, activity_type='yoga', duration=60, calories=200, points=5, date=start
+        )
+        self.url = reverse('user-export-activities', args=[self.user._id])
+    
+    def body(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+    
+    def test_csv_export(self):
+        """Test the default CSV export lists the user's activities oldest first"""
+        response = self.client.get(self.url)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('activities-exporter.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.body(response))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([row['duration'] for row in rows], ['30', '31', '32', '33', '34'])
+        self.assertEqual(rows[2]['notes'], 'Run, day "2"')
+        self.assertEqual(set(rows[0]), set(ActivitySerializer().fields))
+    
+    def test_ndjson_export_with_date_range(self):
+        """Test NDJSON is chosen by ?format= or Accept and ?from=&to= filters"""
+        response = self.client.get(self.url, {
+            'format': 'ndjson', 'from': '2026-03-02T00:00:00Z', 'to': '2026-03-03T23:59:59Z'
+        })
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        lines = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual([line['points'] for line in lines], [10, 20])
+        
+        response = self.client.get(self.url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(self.body(response).splitlines()), 5)
+    
+    def test_streams_in_batches(self):
+        """Test rows are encoded one batch per chunk"""
+        response = export_response(Activity.objects.filter(user_id=self.user._id), 'ndjson', 'export', batch_size=2)
+        chunks = list(response.streaming_content)
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+    
+    def test_filename_is_escaped(self):
+        """Test usernames cannot break the Content-Disposition header"""
+        self.user.username = 'ev"il; name=x'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="activities-ev_il__name_x.csv"; '
+            "filename*=UTF-8''activities-ev%22il%3B%20name%3Dx.csv"
+        )
+    
+    def test_errors(self):
+        """Test unknown users and malformed dates are rejected"""
+        response = self.client.get(reverse('user-export-activities', args=['missing']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url, {'from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_admin_export_action(self):
+        """Test the admin exports every selected activity"""
+        activity_admin = ActivityAdmin(Activity, admin.site)
+        response = activity_admin.export_csv(None, Activity.objects.all())
+        rows = list(csv.DictReader(StringIO(self.body(response))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['date'], rows[1]['date'])
+
+
+class AnalyticsSnapshotTest(APITestCase):
+    """Test cases for the columnar analytics snapshot"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(OCTOFIT_ANALYTICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        beginner = make_user('novice', fitness_level='beginner')
+        advanced = make_user('expert', fitness_level='advanced')
+        self.start = timezone.make_aware(datetime(2026, 5, 1, 8))
+        for index, calories in enumerate([100, 200, 300, 400]):
+            self.activity(beginner, 'running', calories, 20 + index, days=index, distance=float(index + 1))
+        for index, calories in enumerate([500, 700]):
+            self.activity(advanced, 'cycling', calories, 60, days=index)
+        self.activity(advanced, 'running', 600, 40, days=10, distance=10.0)
+    
+    def activity(self, user, activity_type, calories, duration, days, distance=None):
+        Activity.objects.create(
+            user_id=user._id, activity_type=activity_type, duration=duration, calories=calories,
+            points=duration, distance=distance, date=self.start + timedelta(days=days)
+        )
+    
+    def summary(self, **params):
+        response = self.client.get(reverse('analytics-summary'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {row[response.data['by']]: row for row in response.data['results']}
+    
+    def test_group_by_with_percentiles(self):
+        """Test calorie percentiles per activity type match a direct computation"""
+        call_command('snapshot_analytics', stdout=StringIO())
+        results = self.summary(by='activity_type', metric='calories', percentiles='50,90')
+        self.assertEqual(list(results), ['cycling', 'running'])
+        running = results['running']
+        self.assertEqual(running['count'], 5)
+        self.assertEqual(running['sum'], 1600)
+        self.assertEqual((running['min'], running['max']), (100, 600))
+        self.assertEqual(running['percentiles'], {'p50': 300.0, 'p90': 520.0})
+        self.assertEqual(results['cycling']['mean'], 600.0)
+    
+    def test_filters_and_other_groups(self):
+        """Test average duration by fitness level, group filters and date ranges"""
+        call_command('snapshot_analytics', stdout=StringIO())
+        results = self.summary(by='fitness_level', metric='duration')
+        self.assertEqual(results['beginner']['mean'], 21.5)
+        self.assertEqual(results['advanced']['mean'], round(160 / 3, 3))
+        
+        results = self.summary(by='fitness_level', metric='calories', activity_type='running')
+        self.assertEqual(results['advanced']['count'], 1)
+        results = self.summary(by='activity_type', metric='distance', to='2026-05-05T00:00:00Z')
+        self.assertEqual(results['running']['count'], 4)
+        self.assertEqual(results['running']['sum'], 10.0)
+        self.assertNotIn('cycling', results)
+        self.assertEqual(self.summary(by='cohort', activity_type='swimming'), {})
+        cohort = timezone.localtime(User.objects.get(username='novice').created_at).strftime('%Y-%m')
+        self.assertEqual(self.summary(by='cohort')[cohort]['count'], 7)
+    
+    def test_served_from_snapshot(self):
+        """Test queries read the snapshot, not the database, until the next one"""
+        response = self.client.get(reverse('analytics-list'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        call_command('snapshot_analytics', stdout=StringIO())
+        self.client.get(reverse('analytics-summary'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.summary()['running']['count'], 5)
+        
+        Activity.objects.filter(activity_type='cycling').delete()
+        self.assertEqual(self.summary()['cycling']['count'], 2)
+        for _ in range(2):
+            call_command('snapshot_analytics', stdout=StringIO())
+        self.assertNotIn('cycling', self.summary())
+        self.assertEqual(len(list(self.directory.glob('snapshot-*'))), analytics.KEEP_SNAPSHOTS)
+        response = self.client.get(reverse('analytics-list'))
+        self.assertEqual(response.data['rows'], 5)
+    
+    def test_invalid_queries(self):
+        """Test unknown groups, metrics and percentiles are rejected"""
+        call_command('snapshot_analytics', stdout=StringIO())
+        for params in ({'by': 'user'}, {'metric': 'heart_rate'}, {'percentiles': '50,101'}, {'percentiles': 'x'}):
+            response = self.client.get(reverse('analytics-summary'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListIncludeTest(APITestCase):
+    """Test cases for ?include= expansions on the user and team listings"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        board.invalidate()
+        team_ranking.invalidate()
+        self.users = [make_user(f'member{index}') for index in range(4)]
+        for index, user in enumerate(self.users[:3]):
+            for points in range(index + 1):
+                self.client.post(reverse('activity-list'), {
+                    'user_id': user._id, 'activity_type': 'running', 'duration': 30, 'calories': 200,
+                    'points': 10 * (index + 1), 'date': timezone.now().isoformat()
+                }, format='json')
+        self.small = self.client.post(reverse('team-list'), {
+            'name': 'Small', 'description': 'Small team', 'captain_id': self.users[1]._id,
+            'member_ids': [self.users[1]._id]
+        }, format='json').data['id']
+        self.large = self.client.post(reverse('team-list'), {
+            'name': 'Large', 'description': 'Large team', 'captain_id': self.users[0]._id,
+            'member_ids': [self.users[0]._id, self.users[2]._id, self.users[3]._id]
+        }, format='json').data['id']
+    
+    def test_user_stats_match_stats_endpoint(self):
+        """Test ?include=stats attaches each user's stats with one more query"""
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(reverse('user-list'))
+        with CaptureQueriesContext(connection) as included:
+            response = self.client.get(reverse('user-list'), {'include': 'stats'})
+        self.assertEqual(len(included), len(plain) + 1)
+        
+        for row in response.data:
+            expected = self.client.get(reverse('user-stats', args=[row['id']])).data
+            self.assertEqual(row['stats'], expected)
+            self.assertNotIn('rank', row)
+    
+    def test_user_stats_in_chunks(self):
+        """Test the per-user aggregation runs once per chunk of ids"""
+        ids = [user._id for user in self.users]
+        expected = activity_stats_by_user(Activity.objects.all(), ids)
+        with CaptureQueriesContext(connection) as queries:
+            stats = activity_stats_by_user(Activity.objects.all(), ids, chunk_size=3)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(stats, expected)
+        self.assertEqual(stats[self.users[2]._id]['total_points'], 90)
+    
+    def test_user_rank(self):
+        """Test ?include=stats,rank attaches leaderboard ranks, None for unranked users"""
+        response = self.client.get(reverse('user-list'), {'include': 'stats,rank'})
+        ranks = {row['id']: row['rank'] for row in response.data}
+        self.assertEqual(
+            [ranks[user._id] for user in self.users],
+            [3, 2, 1, None]
+        )
+        self.assertEqual(response.data[0]['stats']['total_activities'], 1)
+    
+    def test_team_includes(self):
+        """Test team stats match the stats endpoint and ranks follow ?metric="""
+        response = self.client.get(reverse('team-list'), {'include': 'stats,rank'})
+        rows = {row['id']: row for row in response.data}
+        for team_id, row in rows.items():
+            self.assertEqual(row['stats'], self.client.get(reverse('team-stats', args=[team_id])).data)
+        self.assertEqual((rows[self.large]['rank'], rows[self.small]['rank']), (1, 2))
+        self.assertEqual(rows[self.large]['stats']['total_points'], 100)
+        
+        response = self.client.get(reverse('team-list'), {'include': 'rank', 'metric': 'average'})
+        ranks = {row['id']: row['rank'] for row in response.data}
+        self.assertEqual((ranks[self.small], ranks[self.large]), (1, 2))
+    
+    def test_unknown_include(self):
+        """Test unknown expansions are rejected"""
+        response = self.client.get(reverse('user-list'), {'include': 'stats,friends'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MultiGetTest(APITestCase):
+    """Test cases for user multi-get and team member expansion"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [make_user(f'roster{index}') for index in range(5)]
+        self.roster = [self.users[index]._id for index in (3, 0, 4, 1)]
+        self.team = Team.objects.create(
+            name='Roster', description='Roster team', captain_id=self.roster[0], member_ids=self.roster
+        )
+    
+    def test_users_by_ids_in_order(self):
+        """Test ?ids= returns the users in the order given, skipping unknown and repeated ids"""
+        ids = [self.users[2]._id, 'missing', self.users[0]._id, self.users[2]._id]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-list'), {'ids': ','.join(ids)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data], [self.users[2]._id, self.users[0]._id])
+        self.assertNotIn('password', response.data[0])
+        
+        response = self.client.get(reverse('user-list'), {'ids': self.users[1]._id, 'include': 'stats'})
+        self.assertEqual(response.data[0]['stats']['total_activities'], 0)
+        self.assertEqual(self.client.get(reverse('user-list'), {'ids': ''}).data, [])
+    
+    def test_chunked_lookups(self):
+        """Test large id lists are fetched in chunks and capped"""
+        fast = fast_serializer(UserSerializer)
+        ids = [user._id for user in reversed(self.users)]
+        with self.assertNumQueries(3):
+            rows = fast.values_in_order(User.objects.all(), ids, chunk_size=2)
+        self.assertEqual([row['_id'] for row in rows], ids)
+        
+        response = self.client.get(reverse('user-list'), {'ids': ','.join(['x'] * (MAX_MULTI_GET_IDS + 1))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_team_member_expansion(self):
+        """Test ?expand=members resolves the roster in order with one more query"""
+        url = reverse('team-detail', args=[self.team._id])
+        with CaptureQueriesContext(connection) as plain:
+            response = self.client.get(url)
+        self.assertNotIn('members', response.data)
+        with CaptureQueriesContext(connection) as expanded:
+            response = self.client.get(url, {'expand': 'members'})
+        self.assertEqual(len(expanded), len(plain) + 1)
+        self.assertEqual([member['id'] for member in response.data['members']], self.roster)
+        self.assertEqual(response.data['members'][1]['username'], 'roster0')
+        
+        response = self.client.get(url, {'expand': 'captain'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
 class APIRootTest(APITestCase):
@@ -0,0 +1,221 @@
+"""
+Time-bucketed activity rollups and the trends built from them.
+
+Every activity is folded into a DailyActivityRollup bucket keyed by user,
+activity type and day. Buckets are upserted with server-side increments on
+each Activity write, and weekly or monthly trends are summed from the daily
+buckets, so a year-long chart reads at most 365 small documents per type
+instead of every raw activity.
+
+``rebuild_rollups()`` backfills the buckets from existing activities.
+"""
+from datetime import timedelta
+
+from bson import ObjectId
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import serializers
+
+from .models import Activity, DailyActivityRollup
+from .mongo import db_value, get_collection
+
+GRANULARITIES = ('day', 'week', 'month')
+ROLLUP_FIELDS = ('total_activities', 'total_points', 'total_duration', 'total_calories')
+DEFAULT_RANGE = timedelta(days=365)
+
+
+def record_activity(activity):
+    """Add a newly saved activity to its daily bucket"""
+    _apply(_bucket_key(activity), _activity_totals(activity, 1))
+
+
+def record_activities(activities):
+    """Add a batch of newly saved activities, applying one delta per bucket"""
+    deltas = {}
+    for activity in activities:
+        totals = deltas.setdefault(_bucket_key(activity), dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field, value in _activity_totals(activity, 1).items():
+            totals[field] += value
+
+    for key, delta in deltas.items():
+        _apply(key, delta)
+
+
+def discard_activity(activity):
+    """Remove a deleted activity from its daily bucket"""
+    _apply(_bucket_key(activity), _activity_totals(activity, -1))
+
+
+def replace_activity(previous, activity):
+    """Move an updated activity between buckets as needed"""
+    discard_activity(previous)
+    record_activity(activity)
+
+
+def user_trends(user_id, granularity='day', start=None, end=None):
+    """
+    Return one bucket per period between ``start`` and ``end`` (inclusive).
+
+    Each bucket holds the period totals and a per-activity-type breakdown.
+    Periods without activity are omitted.
+    """
+    rollups = (
+        DailyActivityRollup.objects.filter(user_id=user_id, day__gte=start, day__lte=end)
+        .order_by('day')
+        .values('day', 'activity_type', *ROLLUP_FIELDS)
+    )
+
+    buckets = {}
+    for rollup in rollups:
+        period, period_start = period_of(rollup['day'], granularity)
+        bucket = buckets.get(period)
+        if bucket is None:
+            bucket = buckets[period] = {
+                'period': period,
+                'start': period_start,
+                **dict.fromkeys(ROLLUP_FIELDS, 0),
+                'by_activity_type': {}
+            }
+        by_type = bucket['by_activity_type'].setdefault(
+            rollup['activity_type'], dict.fromkeys(ROLLUP_FIELDS, 0)
+        )
+        for field in ROLLUP_FIELDS:
+            bucket[field] += rollup[field]
+            by_type[field] += rollup[field]
+    return list(buckets.values())
+
+
+def parse_trend_range(query_params):
+    """
+    Read ``?granularity=&from=&to=`` from a request.
+
+    ``from`` and ``to`` are ISO dates and default to the last year.
+    """
+    granularity = query_params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise serializers.ValidationError({'granularity': f"Expected one of: {', '.join(GRANULARITIES)}."})
+
+    end = _parse_day(query_params.get('to'), 'to') or timezone.localdate()
+    start = _parse_day(query_params.get('from'), 'from') or end - DEFAULT_RANGE
+    if start > end:
+        raise serializers.ValidationError({'from': 'Must not be after "to".'})
+    return granularity, start, end
+
+
+def rebuild_rollups(user_ids=None):
+    """
+    Recompute the daily buckets of the given users (all users by default).
+
+    Activities are streamed in ``(user_id, date)`` order and written back one
+    user at a time, so memory holds a single user's buckets. Returns the
+    number of buckets written.
+    """
+    activities = Activity.objects.order_by('user_id', '-date')
+    if user_ids is None:
+        DailyActivityRollup.objects.all().delete()
+    else:
+        activities = activities.filter(user_id__in=user_ids)
+        DailyActivityRollup.objects.filter(user_id__in=user_ids).delete()
+
+    written = 0
+    current_user = None
+    buckets = {}
+    rows = activities.values_list(
+        'user_id', 'activity_type', 'date', 'points', 'duration', 'calories'
+    ).iterator(chunk_size=2000)
+
+    for user_id, activity_type, date, points, duration, calories in rows:
+        if user_id != current_user:
+            written += _write_user_buckets(current_user, buckets)
+            current_user, buckets = user_id, {}
+        totals = buckets.setdefault((activity_type, local_day(date)), dict.fromkeys(ROLLUP_FIELDS, 0))
+        totals['total_activities'] += 1
+        totals['total_points'] += points
+        totals['total_duration'] += duration
+        totals['total_calories'] += calories
+    written += _write_user_buckets(current_user, buckets)
+    return written
+
+
+def _write_user_buckets(user_id, buckets):
+    if user_id is None:
+        return 0
+    DailyActivityRollup.objects.bulk_create([
+        DailyActivityRollup(
+            _id=str(ObjectId()),
+            user_id=user_id,
+            activity_type=activity_type,
+            day=day,
+            **totals
+        )
+        for (activity_type, day), totals in buckets.items()
+    ], batch_size=1000)
+    return len(buckets)
+
+
+def local_day(date):
+    """Return the local calendar day of a datetime"""
+    return timezone.localtime(date).date() if timezone.is_aware(date) else date.date()
+
+
+def _bucket_key(activity):
+    return activity.user_id, activity.activity_type, local_day(activity.date)
+
+
+def _activity_totals(activity, sign):
+    return {
+        'total_activities': sign,
+        'total_points': sign * activity.points,
+        'total_duration': sign * activity.duration,
+        'total_calories': sign * activity.calories
+    }
+
+
+def period_of(day, granularity):
+    """Return the label and first day of the period containing ``day``"""
+    if granularity == 'week':
+        year, week, weekday = day.isocalendar()
+        return f'{year}-W{week:02d}', day - timedelta(days=weekday - 1)
+    if granularity == 'month':
+        return f'{day.year}-{day.month:02d}', day.replace(day=1)
+    return day.isoformat(), day
+
+
+def _parse_day(value, name):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise serializers.ValidationError({name: 'Expected an ISO date.'})
+    return day
+
+
+def _apply(key, delta):
+    """Upsert a bucket and add ``delta`` to it, dropping it once empty"""
+    user_id, activity_type, day = key
+    collection = get_collection(DailyActivityRollup)
+
+    if collection is not None:
+        bucket = {
+            'user_id': user_id,
+            'activity_type': activity_type,
+            'day': db_value(DailyActivityRollup, 'day', day)
+        }
+        collection.update_one(
+            bucket,
+            {'$inc': delta, '$setOnInsert': {'_id': str(ObjectId())}},
+            upsert=True
+        )
+        collection.delete_one({**bucket, 'total_activities': {'$lte': 0}})
+        return
+
+    rollup, _created = DailyActivityRollup.objects.get_or_create(
+        user_id=user_id, activity_type=activity_type, day=day
+    )
+    buckets = DailyActivityRollup.objects.filter(pk=rollup.pk)
+    buckets.update(**{field: F(field) + value for field, value in delta.items()})
+    buckets.filter(total_activities__lte=0).delete()
@@ -25,8 +25,11 @@ from .views import (
     TeamViewSet,
     ActivityViewSet,
     LeaderboardViewSet,
-    WorkoutViewSet
+    WorkoutViewSet,
+    AnalyticsViewSet
 )
+from . import async_views
+from .metrics import metrics_view
 
 # Get codespace name for URL construction
 codespace_name = os.environ.get('CODESPACE_NAME')
@@ -42,6 +45,7 @@ router.register(r'teams', TeamViewSet, basename='team')
 router.register(r'activities', ActivityViewSet, basename='activity')
 router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
 router.register(r'workouts', WorkoutViewSet, basename='workout')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 
 @api_view(['GET'])
@@ -55,6 +59,7 @@ def api_root(request, format=None):
         'activities': f"{base_url}/api/activities/",
         'leaderboard': f"{base_url}/api/leaderboard/",
         'workouts': f"{base_url}/api/workouts/",
+        'analytics': f"{base_url}/api/analytics/",
         'base_url': base_url
     })
 
@@ -63,5 +68,11 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', api_root, name='api-root'),
     path('api/', api_root, name='api-root'),
+    path('api/metrics', metrics_view, name='metrics'),
     path('api/', include(router.urls)),
+    # Native async versions of the read-heavy endpoints, for the ASGI server
+    path('api/async/leaderboard/top/', async_views.leaderboard_top, name='async-leaderboard-top'),
+    path('api/async/users/<str:pk>/stats/', async_views.user_stats, name='async-user-stats'),
+    path('api/async/teams/<str:pk>/stats/', async_views.team_stats, name='async-team-stats'),
+    path('api/async/activities/', async_views.activity_list, name='async-activity-list'),
 ]
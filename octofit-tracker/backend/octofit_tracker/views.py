@@ -1,55 +1,210 @@
-from rest_framework import viewsets, status
+import copy
+
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from django.db.models import Sum, Count
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import User, Team, Activity, Leaderboard, WindowedLeaderboard, Workout
+from . import (
+    analytics,
+    leaderboard,
+    leaderboard_windows,
+    memberships,
+    ranking,
+    recommendations,
+    search,
+    team_ranking,
+    team_rollups,
+    trends
+)
+from .ranking import RANKING_METHODS, COMPETITION
+from .stats import activity_stats, activity_stats_by_user, filter_date_range
+from .pagination import ActivityCursorPagination, estimate_activity_count
+from .ingest import ingest_activities
+from .export import CSVRenderer, NDJSONRenderer, export_response
+from .cache import batched_invalidation, cached_response
+from .fast_serializers import FastListMixin, fast_serializer
+from .includes import IncludeMixin, parse_includes
+from .replicas import max_staleness
+from .rank_index import board
 from .serializers import (
     UserSerializer,
     TeamSerializer,
     ActivitySerializer,
     LeaderboardSerializer,
+    WindowedLeaderboardSerializer,
     WorkoutSerializer
 )
 
+# Most entries shown on each side by the leaderboard rank lookups
+MAX_RANK_NEIGHBOURS = 50
+# Largest ?limit= of the team leaderboard
+MAX_TEAM_LEADERBOARD_LIMIT = 100
+# Default and largest ?limit= of a period's leaderboard listing
+LEADERBOARD_LIMIT = 100
+MAX_LEADERBOARD_LIMIT = 1000
+# Most ids in a ?ids= multi-get, and ids per _id__in query behind it
+MAX_MULTI_GET_IDS = 1000
+MULTI_GET_CHUNK = 500
+# Default and largest ?limit= of ?q= searches
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Modules that keep derived data in sync with Activity writes. Each provides
+# record_activity(), record_activities(), discard_activity() and
+# replace_activity(). recommendations reads the rollups kept by trends, so it
+# comes after it.
+ACTIVITY_LISTENERS = (leaderboard, leaderboard_windows, team_rollups, trends, recommendations, search)
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class UserViewSet(IncludeMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for User model.
     Provides CRUD operations for users.
+    The list supports ?ids=a,b,c multi-get and ?include=stats,rank.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    includes = {'stats': 'include_stats', 'rank': 'include_rank'}
+
+    def get_list_rows(self, fast):
+        """With ?ids=, only the users with those ids, in the order given"""
+        ids = self.request.query_params.get('ids')
+        if ids is None:
+            return super().get_list_rows(fast)
+        ids = [pk for pk in ids.split(',') if pk]
+        if len(ids) > MAX_MULTI_GET_IDS:
+            raise serializers.ValidationError({'ids': f'Expected at most {MAX_MULTI_GET_IDS} ids.'})
+        return fast.values_in_order(self.get_queryset(), ids, MULTI_GET_CHUNK)
+
+    def include_stats(self, rows):
+        """The activity totals of every listed user, from one grouped aggregation per chunk of ids"""
+        return activity_stats_by_user(Activity.objects.all(), [row['id'] for row in rows], MULTI_GET_CHUNK)
+
+    def include_rank(self, rows):
+        """Every listed user's all-time leaderboard rank, None when not ranked"""
+        return {row['id']: board.rank(row['id']) for row in rows}
 
     @action(detail=True, methods=['get'])
     def activities(self, request, pk=None):
-        """Get all activities for a specific user"""
+        """Get a page of activities for a specific user, newest first"""
         user = self.get_object()
-        activities = Activity.objects.filter(user_id=user._id)
-        serializer = ActivitySerializer(activities, many=True)
-        return Response(serializer.data)
+        fast = fast_serializer(ActivitySerializer)
+        activities = fast.values(Activity.objects.filter(user_id=user._id))
+        paginator = ActivityCursorPagination()
+        page = paginator.paginate_queryset(activities, request, view=self)
+        return paginator.get_paginated_response(fast.to_representation(page))
+
+    def estimate_activity_count(self):
+        """Estimated total for the activities action"""
+        return estimate_activity_count(self.kwargs.get('pk'))
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='activities/export',
+        renderer_classes=[CSVRenderer, NDJSONRenderer]
+    )
+    @max_staleness(300)
+    def export_activities(self, request, pk=None):
+        """
+        Stream a user's whole activity history, oldest first.
+        Supports ?format=csv|ndjson (default csv) and ?from=&to= date filtering.
+        """
+        user = self.get_object()
+        activities = filter_date_range(Activity.objects.filter(user_id=user._id), request.query_params)
+        return export_response(activities, request.accepted_renderer.format, f'activities-{user.username}')
 
     @action(detail=True, methods=['get'])
+    @max_staleness(60)
     def stats(self, request, pk=None):
-        """Get statistics for a specific user"""
+        """
+        Get statistics for a specific user.
+        Supports ?from=&to= date filtering and ?breakdown=activity_type.
+        """
         user = self.get_object()
-        activities = Activity.objects.filter(user_id=user._id)
+        activities = filter_date_range(
+            Activity.objects.filter(user_id=user._id),
+            request.query_params
+        )
         
-        stats = {
-            'total_activities': activities.count(),
-            'total_points': activities.aggregate(Sum('points'))['points__sum'] or 0,
-            'total_duration': activities.aggregate(Sum('duration'))['duration__sum'] or 0,
-            'total_calories': activities.aggregate(Sum('calories'))['calories__sum'] or 0
-        }
+        stats = activity_stats(
+            activities,
+            breakdown=request.query_params.get('breakdown') == 'activity_type'
+        )
         return Response(stats)
 
+    @action(detail=True, methods=['get'])
+    @max_staleness(300)
+    def trends(self, request, pk=None):
+        """
+        Get activity totals per day, week or month for a specific user.
+        Supports ?granularity=day|week|month and ?from=&to= ISO dates.
+        """
+        user = self.get_object()
+        granularity, start, end = trends.parse_trend_range(request.query_params)
+        
+        return Response({
+            'granularity': granularity,
+            'from': start,
+            'to': end,
+            'buckets': trends.user_trends(user._id, granularity, start, end)
+        })
+
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(IncludeMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Team model.
     Provides CRUD operations for teams.
+    The list supports ?include=stats,rank, ranking by ?metric=total|average;
+    a team's detail supports ?expand=members.
     """
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    includes = {'stats': 'include_stats', 'rank': 'include_rank'}
+
+    def retrieve(self, request, *args, **kwargs):
+        """Get a team; ?expand=members adds its members' profiles in roster order"""
+        expand = parse_includes(request.query_params, ('members',), param='expand')
+        response = super().retrieve(request, *args, **kwargs)
+        if 'members' in expand:
+            fast = fast_serializer(UserSerializer)
+            members = fast.values_in_order(User.objects.all(), response.data['member_ids'], MULTI_GET_CHUNK)
+            response.data['members'] = fast.to_representation(members)
+        return response
+
+    def include_stats(self, rows):
+        """Every listed team's stats, read from the rollup columns already listed"""
+        return {
+            row['id']: {
+                'total_members': row['member_count'],
+                **{field: row[field] for field in team_rollups.ROLLUP_FIELDS}
+            }
+            for row in rows
+        }
+
+    def include_rank(self, rows):
+        """Every listed team's rank on the team leaderboard, None when not ranked"""
+        index = team_ranking.boards[_parse_team_metric(self.request.query_params)]
+        return {row['id']: index.rank(row['id']) for row in rows}
+
+    def perform_create(self, serializer):
+        """Save the team and build its rollup from the initial members"""
+        team = serializer.save()
+        team_rollups.rebuild_team(team)
+
+    def perform_update(self, serializer):
+        """Save the team, applying a new member list as atomic set changes"""
+        member_ids = serializer.validated_data.pop('member_ids', None)
+        team = serializer.save()
+        if member_ids is not None:
+            memberships.set_members(team._id, member_ids)
+        team.refresh_from_db()
+
+    def perform_destroy(self, instance):
+        """Delete the team and its membership index"""
+        team_rollups.forget_team(instance)
+        instance.delete()
 
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
@@ -63,9 +218,8 @@ class TeamViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if user_id not in team.member_ids:
-            team.member_ids.append(user_id)
-            team.save()
+        if memberships.add_members(team._id, [user_id]):
+            team.refresh_from_db()
         
         serializer = self.get_serializer(team)
         return Response(serializer.data)
@@ -82,37 +236,107 @@ class TeamViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if user_id in team.member_ids:
-            team.member_ids.remove(user_id)
-            team.save()
+        if memberships.remove_members(team._id, [user_id]):
+            team.refresh_from_db()
         
         serializer = self.get_serializer(team)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'], url_path='members')
+    def bulk_members(self, request, pk=None):
+        """
+        Add and remove many members in one call.
+        Expects {"add": [user_id, ...], "remove": [user_id, ...]}.
+        """
+        team = self.get_object()
+        changes = {}
+        
+        for key in ('add', 'remove'):
+            user_ids = request.data.get(key, [])
+            if not isinstance(user_ids, list) or not all(isinstance(uid, str) and uid for uid in user_ids):
+                return Response(
+                    {'error': f'{key} must be a list of user ids'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            changes[key] = user_ids
+        
+        removed = memberships.remove_members(team._id, changes['remove'])
+        added = memberships.add_members(team._id, changes['add'])
+        team.refresh_from_db()
+        
+        serializer = self.get_serializer(team)
+        return Response({'added': added, 'removed': removed, 'team': serializer.data})
+
+    @action(detail=False, methods=['get'])
+    @max_staleness(30)
+    def leaderboard(self, request):
+        """
+        Rank teams by their members' points.
+        ?metric=total|average ranks by total or per-member points and
+        ?limit= sets the top-N (default 10). ?team= instead returns that
+        team's rank with ?neighbours= teams on each side (default 5).
+        """
+        metric = _parse_team_metric(request.query_params)
+        index = team_ranking.boards[metric]
+        
+        team_id = request.query_params.get('team')
+        if team_id is None:
+            limit = _parse_count(request.query_params.get('limit', '10'), 'limit', 1, MAX_TEAM_LEADERBOARD_LIMIT)
+            return Response({'metric': metric, 'results': team_ranking.represent(index.top(limit))})
+        
+        neighbours = _parse_count(request.query_params.get('neighbours', '5'), 'neighbours', 0, MAX_RANK_NEIGHBOURS)
+        around = index.around(team_id, neighbours)
+        if around is None:
+            raise NotFound()
+        above, entry, below = around
+        standings = team_ranking.represent([*above, entry, *below])
+        by_id = {standing['id']: standing for standing in standings}
+        if entry[0] not in by_id:
+            raise NotFound()
+        
+        return Response({
+            'metric': metric,
+            'rank': entry[2],
+            'entry': by_id[entry[0]],
+            'above': [by_id[key] for key, _, _ in above if key in by_id],
+            'below': [by_id[key] for key, _, _ in below if key in by_id]
+        })
+
     @action(detail=True, methods=['get'])
+    @max_staleness(60)
     def stats(self, request, pk=None):
-        """Get statistics for a specific team"""
+        """
+        Get statistics for a specific team.
+        Supports ?from=&to= date filtering and ?breakdown=activity_type.
+        """
         team = self.get_object()
+        breakdown = request.query_params.get('breakdown') == 'activity_type'
+        
+        # Unfiltered totals are served from the maintained team rollup
+        if not (breakdown or 'from' in request.query_params or 'to' in request.query_params):
+            return Response(team_rollups.rollup_stats(team))
         
         # Get all activities for team members
-        member_activities = Activity.objects.filter(user_id__in=team.member_ids)
+        member_activities = filter_date_range(
+            Activity.objects.filter(user_id__in=team.member_ids),
+            request.query_params
+        )
         
         stats = {
             'total_members': len(team.member_ids),
-            'total_activities': member_activities.count(),
-            'total_points': member_activities.aggregate(Sum('points'))['points__sum'] or 0,
-            'total_duration': member_activities.aggregate(Sum('duration'))['duration__sum'] or 0
+            **activity_stats(member_activities, breakdown=breakdown)
         }
         return Response(stats)
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Activity model.
     Provides CRUD operations for activities.
     """
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    pagination_class = ActivityCursorPagination
 
     def get_queryset(self):
         """Optional filtering by user_id"""
@@ -124,15 +348,69 @@ class ActivityViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        List activities newest first, or with ?q= the activities whose notes
+        best match a full-text search (at most ?limit=, unpaginated).
+        """
+        query = request.query_params.get('q')
+        if not query:
+            return super().list(request, *args, **kwargs)
+        limit = _parse_count(request.query_params.get('limit', str(SEARCH_LIMIT)), 'limit', 1, MAX_SEARCH_LIMIT)
+        matches = search.search(search.ACTIVITY, query, owner_id=request.query_params.get('user_id'))
+        return Response(_search_results(self.get_fast_serializer(), self.get_queryset(), matches, limit))
+
+    def estimate_activity_count(self):
+        """Estimated total for paginated listings"""
+        return estimate_activity_count(self.request.query_params.get('user_id'))
+
+    def perform_create(self, serializer):
+        """Save the activity and add it to the leaderboard and team rollups"""
+        activity = serializer.save()
+        with batched_invalidation():
+            for listener in ACTIVITY_LISTENERS:
+                listener.record_activity(activity)
+
+    def perform_update(self, serializer):
+        """Save the activity and apply the change to derived totals"""
+        previous = copy.copy(serializer.instance)
+        activity = serializer.save()
+        with batched_invalidation():
+            for listener in ACTIVITY_LISTENERS:
+                listener.replace_activity(previous, activity)
+
+    def perform_destroy(self, instance):
+        """Delete the activity and remove it from derived totals"""
+        instance.delete()
+        with batched_invalidation():
+            for listener in ACTIVITY_LISTENERS:
+                listener.discard_activity(instance)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many activities from an NDJSON or JSON array body.
+        Invalid items are reported by index without failing the batch.
+        """
+        report = ingest_activities(
+            request.stream,
+            request.content_type,
+            listeners=ACTIVITY_LISTENERS
+        )
+        if 'parse_error' in report:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Get recent activities (last 10)"""
-        activities = Activity.objects.all()[:10]
-        serializer = self.get_serializer(activities, many=True)
-        return Response(serializer.data)
+        fast = self.get_fast_serializer()
+        activities = fast.values(Activity.objects.all())[:10]
+        return Response(fast.to_representation(activities))
 
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+@max_staleness(30)
+class LeaderboardViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Leaderboard model.
     Provides CRUD operations for leaderboard entries.
@@ -140,26 +418,109 @@ class LeaderboardViewSet(viewsets.ModelViewSet):
     queryset = Leaderboard.objects.all()
     serializer_class = LeaderboardSerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        List the all-time board, or a period's board with ?window=&period=,
+        ?limit= entries (default 100) from ?offset= onwards
+        """
+        params = request.query_params
+        window, period = leaderboard_windows.parse_window(params)
+        if period is None:
+            return super().list(request, *args, **kwargs)
+        index = leaderboard_windows.board_for(window, period)
+        limit = _parse_count(params.get('limit', str(LEADERBOARD_LIMIT)), 'limit', 1, MAX_LEADERBOARD_LIMIT)
+        offset = _parse_count(params.get('offset', '0'), 'offset', 0, len(index))
+        return Response(_ranked_rows(
+            fast_serializer(WindowedLeaderboardSerializer),
+            WindowedLeaderboard.objects.filter(window=window, period=period),
+            index.top(limit, offset)
+        ))
+
     @action(detail=False, methods=['get'])
+    @cached_response('leaderboard')
     def top(self, request):
-        """Get top 10 users on the leaderboard"""
-        top_users = Leaderboard.objects.all()[:10]
-        serializer = self.get_serializer(top_users, many=True)
-        return Response(serializer.data)
+        """
+        Get top 10 users on the leaderboard.
+        Supports ?window=day|week|month&period= for a period's board.
+        """
+        window, period = leaderboard_windows.parse_window(request.query_params)
+        if period is None:
+            fast = self.get_fast_serializer()
+            top_users = fast.values(Leaderboard.objects.all())[:10]
+            return Response(fast.to_representation(top_users))
+        
+        return Response(_ranked_rows(
+            fast_serializer(WindowedLeaderboardSerializer),
+            WindowedLeaderboard.objects.filter(window=window, period=period),
+            leaderboard_windows.board_for(window, period).top(10)
+        ))
 
-    @action(detail=False, methods=['post'])
+    @action(detail=True, methods=['get'])
+    def rank(self, request, pk=None):
+        """
+        Get a user's exact rank and the entries directly above and below.
+        The lookup is by user_id. ?window=day|week|month&period= picks a
+        period's board and ?neighbours= how many entries around (default 5);
+        a numeric ?window= is the neighbour count on the all-time board.
+        """
+        params = request.query_params
+        if params.get('window', '').isdigit():
+            window, period = leaderboard_windows.ALL_TIME, None
+            neighbours = _parse_count(params['window'], 'window', 0, MAX_RANK_NEIGHBOURS)
+        else:
+            window, period = leaderboard_windows.parse_window(params)
+            neighbours = _parse_count(params.get('neighbours', '5'), 'neighbours', 0, MAX_RANK_NEIGHBOURS)
+        
+        if period is None:
+            index, fast, entries = board, self.get_fast_serializer(), Leaderboard.objects.all()
+        else:
+            index = leaderboard_windows.board_for(window, period)
+            fast = fast_serializer(WindowedLeaderboardSerializer)
+            entries = WindowedLeaderboard.objects.filter(window=window, period=period)
+        
+        around = index.around(pk, neighbours)
+        if around is None:
+            raise NotFound()
+        above, entry, below = around
+        rows = {row['user_id']: row for row in _ranked_rows(fast, entries, [*above, entry, *below])}
+        if entry[0] not in rows:
+            raise NotFound()
+        
+        return Response({
+            'rank': entry[2],
+            'entry': rows[entry[0]],
+            'above': [rows[user_id] for user_id, _, _ in above if user_id in rows],
+            'below': [rows[user_id] for user_id, _, _ in below if user_id in rows]
+        })
+
+    @action(detail=False, methods=['get', 'post'])
     def update_rankings(self, request):
-        """Update all rankings based on total points"""
-        leaderboard_entries = Leaderboard.objects.all().order_by('-total_points')
+        """
+        POST starts recomputing every ranking (``method`` competition or dense)
+        in the background and returns the job; GET returns the last job's
+        state and report.
+        """
+        if request.method == 'GET':
+            job = ranking.recompute_job()
+            if job is None:
+                raise NotFound()
+            return Response(job)
+        
+        method = request.data.get('method', COMPETITION)
         
-        for index, entry in enumerate(leaderboard_entries, start=1):
-            entry.rank = index
-            entry.save()
+        if method not in RANKING_METHODS:
+            return Response(
+                {'error': f"method must be one of: {', '.join(RANKING_METHODS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response({'message': 'Rankings updated successfully'})
+        job, started = ranking.start_recompute(method)
+        message = 'Ranking update started' if started else 'A ranking update is already running'
+        return Response({'message': message, **job}, status=status.HTTP_202_ACCEPTED)
 
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+@max_staleness(300)
+class WorkoutViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Workout model.
     Provides CRUD operations for workout recommendations.
@@ -181,10 +542,129 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """List workouts, or with ?q= the best matches of a full-text search (at most ?limit=)"""
+        query = request.query_params.get('q')
+        if not query:
+            return super().list(request, *args, **kwargs)
+        limit = _parse_count(request.query_params.get('limit', str(SEARCH_LIMIT)), 'limit', 1, MAX_SEARCH_LIMIT)
+        matches = search.search(search.WORKOUT, query)
+        return Response(_search_results(self.get_fast_serializer(), self.get_queryset(), matches, limit))
+
     @action(detail=False, methods=['get'])
     def recommend(self, request):
-        """Get workout recommendations based on user's fitness level"""
+        """
+        Get workout recommendations.
+        ?user_id= returns the user's precomputed picks based on their recent
+        activity; otherwise workouts matching ?fitness_level= (default beginner).
+        """
+        user_id = request.query_params.get('user_id')
+        if user_id is None:
+            return self.recommend_for_level(request)
+
+        workout_ids = recommendations.recommended_workout_ids(user_id)
+        if workout_ids is None:
+            raise NotFound()
+        fast = self.get_fast_serializer()
+        rows = {row['_id']: row for row in fast.values(Workout.objects.filter(_id__in=workout_ids))}
+        return Response(fast.to_representation([rows[pk] for pk in workout_ids if pk in rows]))
+
+    @cached_response('workouts')
+    def recommend_for_level(self, request):
+        """Get workout recommendations based on a fitness level"""
         fitness_level = request.query_params.get('fitness_level', 'beginner')
-        workouts = Workout.objects.filter(fitness_level=fitness_level)[:5]
-        serializer = self.get_serializer(workouts, many=True)
-        return Response(serializer.data)
+        fast = self.get_fast_serializer()
+        workouts = fast.values(Workout.objects.filter(fitness_level=fitness_level))[:5]
+        return Response(fast.to_representation(workouts))
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Reporting queries over the latest columnar activity snapshot, taken by
+    the snapshot_analytics command; they never reach the database.
+    """
+
+    def list(self, request):
+        """Describe the current snapshot and the labels of each group"""
+        snapshot = self.get_snapshot()
+        return Response({
+            'rows': snapshot.rows,
+            'created_at': snapshot.created_at,
+            'metrics': analytics.METRICS,
+            'groups': {group: snapshot.dictionaries[group] for group in analytics.GROUPS}
+        })
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Get the count, sum, mean, extremes and percentiles of a metric per group.
+        Supports ?by=activity_type|fitness_level|cohort, ?metric=, ?percentiles=50,90,
+        ?from=&to= and a filter per group, e.g. ?fitness_level=beginner.
+        """
+        query = analytics.parse_summary(request.query_params)
+        snapshot = self.get_snapshot()
+        return Response({
+            'snapshot': snapshot.created_at,
+            'by': query['by'],
+            'metric': query['metric'],
+            'results': snapshot.summarize(**query)
+        })
+
+    def get_snapshot(self):
+        snapshot = analytics.current_snapshot()
+        if snapshot is None:
+            raise NotFound('No analytics snapshot has been taken yet.')
+        return snapshot
+
+
+def _ranked_rows(fast, queryset, entries):
+    """
+    Represent rank index entries ``(user_id, points, rank)`` in index order,
+    with the rows of ``queryset`` and each entry's rank.
+    """
+    user_ids = [user_id for user_id, _, _ in entries]
+    rows = {row['user_id']: row for row in fast.values(queryset.filter(user_id__in=user_ids))}
+    found = [(rows[user_id], rank) for user_id, _, rank in entries if user_id in rows]
+    data = fast.to_representation([row for row, _ in found])
+    for item, (_, rank) in zip(data, found):
+        item['rank'] = rank
+    return data
+
+
+def _search_results(fast, queryset, matches, limit=None):
+    """
+    Represent the rows of ``queryset`` among search matches
+    ``(object_id, score)``, best first, with each match's score. Rows are
+    read a chunk of matches at a time until ``limit`` of them are found.
+    """
+    found = []
+    for start in range(0, len(matches), MULTI_GET_CHUNK):
+        chunk = matches[start:start + MULTI_GET_CHUNK]
+        rows = {row['_id']: row for row in fast.values(queryset.filter(_id__in=[pk for pk, _ in chunk]))}
+        found.extend((rows[pk], score) for pk, score in chunk if pk in rows)
+        if limit is not None and len(found) >= limit:
+            break
+    found = found[:limit]
+    data = fast.to_representation([row for row, _ in found])
+    for item, (_, score) in zip(data, found):
+        item['score'] = round(score, 4)
+    return data
+
+
+def _parse_team_metric(query_params):
+    """Read the team ranking ``?metric=``, total points by default"""
+    metric = query_params.get('metric', team_ranking.TOTAL)
+    if metric not in team_ranking.METRICS:
+        raise serializers.ValidationError({'metric': f"Expected one of: {', '.join(team_ranking.METRICS)}."})
+    return metric
+
+
+def _parse_count(value, name, low, high):
+    """Parse an integer query parameter between ``low`` and ``high``"""
+    try:
+        count = int(value)
+    except ValueError:
+        count = low - 1
+    if not low <= count <= high:
+        raise serializers.ValidationError({name: f'Expected an integer from {low} to {high}.'})
+    return count
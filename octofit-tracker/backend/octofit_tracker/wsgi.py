@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
 application = get_wsgi_application()
+
+# Load the leaderboard rank index now rather than on the first rank request
+from octofit_tracker.rank_index import board  # noqa: E402
+
+board.warm()